@@ -0,0 +1,190 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+from flask import request, g, has_request_context
+from collections import OrderedDict
+import threading
+import time
+import constants
+import db
+
+
+# Endpoints that scan whole collections and get their own, smaller concurrency limit
+EXPENSIVE_ENDPOINTS = {
+    ('delete_all', 'DELETE'),
+    ('bikes.bikes_get_post', 'GET'),
+    ('components.components_get_post', 'GET'),
+    ('users.users_get_all', 'GET'),
+    ('admin.admin_export', 'GET'),
+    ('admin.admin_import', 'POST'),
+    ('changes.changes_prune', 'GET'),
+    ('analytics.analytics_get', 'GET'),
+}
+
+# Endpoints that are never shed. The change feed holds requests open and has its own limit on open streams
+EXEMPT_ENDPOINTS = {'warmup', 'static', 'changes.changes_get'}
+
+
+"""
+Error raised when a request is rejected by admission control. The error handler turns it into a 429 or
+503 response with a 'Retry-After' header.
+"""
+class OverloadError(Exception):
+
+    def __init__(self, error, status_code, retry_after):
+        self.error = error
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+"""
+Limit on the number of requests that can run at the same time. Requests over the limit are rejected
+immediately instead of waiting for a slot.
+"""
+class ConcurrencyLimiter(object):
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+"""
+Concurrency limit that adapts to the observed Datastore latency. The latency of every RPC made on a request
+is folded into a moving average, and after every ADMISSION_ADJUST_EVERY samples the limit is raised by one
+while the average is below the target latency and cut by ADMISSION_BACKOFF while it is above it.
+"""
+class AdaptiveLimiter(ConcurrencyLimiter):
+
+    def __init__(self, limit, minimum, maximum, target_latency):
+        super(AdaptiveLimiter, self).__init__(limit)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.latency = None
+        self._samples = 0
+
+    def observe(self, seconds):
+        with self._lock:
+            if self.latency is None:
+                self.latency = seconds
+            else:
+                self.latency += constants.ADMISSION_LATENCY_WEIGHT * (seconds - self.latency)
+            self._samples += 1
+            if self._samples < constants.ADMISSION_ADJUST_EVERY:
+                return
+            self._samples = 0
+            if self.latency > self.target_latency:
+                self.limit = max(self.minimum, int(self.limit * constants.ADMISSION_BACKOFF))
+            else:
+                self.limit = min(self.maximum, self.limit + 1)
+
+
+"""
+Token buckets that limit the request rate of each JWT subject. Buckets for the least recently seen subjects
+are dropped once more than ADMISSION_MAX_SUBJECTS are tracked.
+"""
+class SubjectRateLimiter(object):
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, subject):
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(subject, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[subject] = (tokens, now)
+            if len(self._buckets) > constants.ADMISSION_MAX_SUBJECTS:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+global_limiter = AdaptiveLimiter(constants.ADMISSION_INITIAL_LIMIT, constants.ADMISSION_MIN_LIMIT,
+                                 constants.ADMISSION_MAX_LIMIT, constants.ADMISSION_TARGET_LATENCY)
+expensive_limiter = ConcurrencyLimiter(constants.ADMISSION_EXPENSIVE_LIMIT)
+subject_limiter = SubjectRateLimiter(constants.ADMISSION_SUBJECT_RATE, constants.ADMISSION_SUBJECT_BURST)
+
+
+"""
+Helper function to fold the latency of a Datastore RPC into the global limit. Only RPCs made while handling a
+request are counted, so the background index rebuilds, change feed polls and report refreshes don't cut the
+limit on requests.
+"""
+def _observe(seconds):
+    if has_request_context():
+        global_limiter.observe(seconds)
+
+
+db.add_latency_listener(_observe)
+
+
+"""
+Helper function called by verify_jwt once the JWT has been validated. Rejects the request with a 429 if the
+subject of the JWT has used up its request rate.
+"""
+def limit_subject(subject):
+    wait = subject_limiter.take(subject)
+    if wait:
+        raise OverloadError({"code": "Too Many Requests",
+                             "description": "Too many requests for this user, retry later"},
+                            429, int(wait) + 1)
+
+
+"""
+Helper function to admit a request before it reaches the blueprints. Rejects the request with a 503 if the
+application or the route's collection scans are already running as many requests as they are allowed to.
+"""
+def _admit():
+    if request.endpoint in EXEMPT_ENDPOINTS:
+        return
+    if not global_limiter.try_acquire():
+        raise OverloadError({"code": "Service Unavailable",
+                             "description": "The service is overloaded, retry later"},
+                            503, constants.ADMISSION_RETRY_AFTER)
+    g.admission_limiters = [global_limiter]
+
+    if (request.endpoint, request.method) in EXPENSIVE_ENDPOINTS:
+        if not expensive_limiter.try_acquire():
+            raise OverloadError({"code": "Service Unavailable",
+                                 "description": "Too many requests for this resource, retry later"},
+                                503, constants.ADMISSION_RETRY_AFTER)
+        g.admission_limiters.append(expensive_limiter)
+
+
+"""
+Helper function to free the slots held by a request once it has finished.
+"""
+def _release(exc):
+    for limiter in g.pop('admission_limiters', []):
+        limiter.release()
+
+
+"""
+Helper function to add admission control to the Flask application.
+"""
+def init_app(app):
+    app.before_request(_admit)
+    app.teardown_request(_release)
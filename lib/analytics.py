@@ -0,0 +1,255 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import logging
+import threading
+import time
+import numpy as np
+import constants
+from db import client
+
+
+_lock = threading.Lock()
+_compute_lock = threading.Lock()    # Held while a report is computed, so only one is computed at a time
+_reports = {}           # Computed reports and the time they expire, keyed by days and bucket
+_computing = {}         # Event set when the report being computed for each days and bucket is done
+_generation = 0         # Number of times the loaded data has been reset
+
+
+"""
+Columns of the rental history from 'first_ts' on. Only the events of the longest report requested so far are
+loaded, and a longer report loads the events before them. Rental events are never changed once they are
+recorded, so only the events recorded since the last load are read from Datastore and appended to the
+columns. Events are timestamped before their transaction commits, so the last DATASTORE_DEADLINE seconds are
+read again in case an event committed after a later one was loaded.
+"""
+class _RentalHistory(object):
+
+    def __init__(self):
+        self.bike_id = np.empty(0, dtype=np.int64)
+        self.ts = np.empty(0, dtype=np.float64)
+        self.rent = np.empty(0, dtype=bool)
+        self.group = np.empty(0, dtype=np.int32)
+        self.groups = {}            # Code of each (type, bike_size) pair
+        self.first_ts = None        # Time the loaded events start at
+        self.last_ts = 0.0
+        self.recent = set()         # Ids of the loaded events that are read again by the next load
+        self.fleet = None           # Columns of the current bikes and components, and the time they were loaded
+
+    def group_code(self, bike_type, bike_size):
+        return self.groups.setdefault((bike_type, bike_size), len(self.groups))
+
+    def _columns(self, events):
+        return (np.array([e['bike_id'] for e in events], dtype=np.int64),
+                np.array([e['ts'] for e in events], dtype=np.float64),
+                np.array([e['action'] == 'rent' for e in events], dtype=bool),
+                np.array([self.group_code(e['type'], e['bike_size']) for e in events], dtype=np.int32))
+
+    def _append(self, events, before=False):
+        if not events:
+            return
+        names = ('bike_id', 'ts', 'rent', 'group')
+        for name, column in zip(names, self._columns(events)):
+            parts = [column, getattr(self, name)] if before else [getattr(self, name), column]
+            setattr(self, name, np.concatenate(parts))
+
+    """
+    Loads the events from 'since' on that haven't been loaded yet.
+    """
+    def load(self, since):
+        if self.first_ts is None:
+            self.first_ts = self.last_ts = since
+        elif since < self.first_ts:
+            query = client.query(kind=constants.RENTAL_EVENTS)
+            query.add_filter('ts', '>', since)
+            query.add_filter('ts', '<=', self.first_ts)
+            query.order = ['ts']
+            self._append(list(query.fetch()), before=True)
+            self.first_ts = since
+
+        query = client.query(kind=constants.RENTAL_EVENTS)
+        query.add_filter('ts', '>', max(self.first_ts, self.last_ts - constants.DATASTORE_DEADLINE))
+        query.order = ['ts']
+        events = list(query.fetch())
+        self._append([e for e in events if e.key.id not in self.recent])
+        if events:
+            self.last_ts = events[-1]['ts']
+            self.recent = {e.key.id for e in events if e['ts'] > self.last_ts - constants.DATASTORE_DEADLINE}
+
+    """
+    Returns the rental periods as arrays of bike ids, groups, starts and ends. Each rent lasts until the
+    next event of the same bike, or until now if the bike is still rented. A bike whose first loaded event
+    is a return, and a bike of 'fleet' that is rented without any loaded event, were rented before the loaded
+    events start.
+    """
+    def periods(self, now, fleet):
+        order = np.lexsort((self.ts, self.bike_id))
+        bike_id, ts, rent, group = self.bike_id[order], self.ts[order], self.rent[order], self.group[order]
+        ends = np.full(len(ts), now)
+        ends[:-1] = np.where(bike_id[1:] == bike_id[:-1], ts[1:], now)
+        first = np.ones(len(ts), dtype=bool)
+        first[1:] = bike_id[1:] != bike_id[:-1]
+        carried = first & ~rent
+        held = fleet['rented'] & ~np.isin(fleet['bike_id'], bike_id)
+        return (np.concatenate([bike_id[rent], bike_id[carried], fleet['bike_id'][held]]),
+                np.concatenate([group[rent], group[carried], fleet['bike_group'][held]]),
+                np.concatenate([ts[rent], np.full(np.count_nonzero(carried) + np.count_nonzero(held),
+                                                  self.first_ts)]),
+                np.concatenate([ends[rent], ts[carried], np.full(np.count_nonzero(held), now)]))
+
+
+_history = _RentalHistory()
+
+
+"""
+Helper function to load the current bikes and components into columns, with the groups of 'history'. The
+fleet is loaded again once it is older than ANALYTICS_CACHE_TTL.
+"""
+def _load_fleet(history):
+    fleet = history.fleet
+    if fleet and time.monotonic() - fleet['loaded'] < constants.ANALYTICS_CACHE_TTL:
+        return fleet
+    bikes = list(client.query(kind=constants.BIKES).fetch())
+    components = list(client.query(kind=constants.COMPONENTS).fetch())
+    history.fleet = {
+        'loaded': time.monotonic(),
+        'bike_id': np.array([b.key.id for b in bikes], dtype=np.int64),
+        'bike_group': np.array([history.group_code(b['type'], b['bike_size']) for b in bikes], dtype=np.int32),
+        'rented': np.array([bool(b['rentee']) for b in bikes], dtype=bool),
+        'manufacturer': np.array([str(c['manufacturer']) for c in components], dtype=object),
+        'condition': np.array([str(c['condition']) for c in components], dtype=object),
+        'installed': np.array([bool(c['carrier']) for c in components], dtype=bool),
+    }
+    return history.fleet
+
+
+"""
+Helper function to compute the total rental time before each of the given times, for rental periods
+sorted into starts and ends. Each period adds the time between its start and the given time, and each
+period that has ended takes back the time after its end.
+"""
+def _busy_before(starts, ends, times):
+    starts = np.sort(starts)
+    ends = np.sort(ends)
+    start_sums = np.concatenate([[0.0], np.cumsum(starts)])
+    end_sums = np.concatenate([[0.0], np.cumsum(ends)])
+    started = np.searchsorted(starts, times)
+    ended = np.searchsorted(ends, times)
+    return (started * times - start_sums[started]) - (ended * times - end_sums[ended])
+
+
+"""
+Helper function to compute a utilization report over the last 'days' days, with the utilization of the
+fleet split into buckets of 'bucket' seconds.
+"""
+def _compute(days, bucket):
+    now = time.time()
+    start = now - days * 86400
+    hours = days * 24
+    history = _history
+    history.load(start)
+    fleet = _load_fleet(history)
+
+    # Rental periods clipped to the report
+    bike_id, group, starts, ends = history.periods(now, fleet)
+    starts = np.maximum(starts, start)
+    ends = np.minimum(ends, now)
+    kept = ends > starts
+    bike_id, group, starts, ends = bike_id[kept], group[kept], starts[kept], ends[kept]
+
+    # Rental hours and utilization of each type and size
+    groups = sorted(history.groups.items(), key=lambda item: item[1])
+    rental_hours = np.bincount(group, weights=(ends - starts) / 3600, minlength=len(groups))
+    fleet_size = np.bincount(fleet['bike_group'], minlength=len(groups))
+    utilization = np.divide(rental_hours, fleet_size * hours, out=np.zeros(len(groups)), where=fleet_size > 0)
+    by_type = [{'type': bike_type, 'bike_size': bike_size, 'bikes': int(fleet_size[code]),
+                'rental_hours': round(float(rental_hours[code]), 2),
+                'utilization': round(float(utilization[code]), 4)}
+               for (bike_type, bike_size), code in groups if fleet_size[code] or rental_hours[code]]
+
+    # Utilization of the whole fleet in each time bucket
+    edges = np.append(np.arange(start, now, bucket), now)
+    busy = np.diff(_busy_before(starts, ends, edges))
+    capacity = len(fleet['bike_id']) * np.diff(edges)
+    bucket_utilization = np.divide(busy, capacity, out=np.zeros(len(busy)), where=capacity > 0)
+    timeline = [{'start': float(s), 'utilization': round(float(u), 4)}
+                for s, u in zip(edges[:-1], bucket_utilization)]
+
+    # Bikes that are not rented now, and bikes that were not rented at all during the report
+    fleet_count = len(fleet['bike_id'])
+    active = np.isin(fleet['bike_id'], bike_id)
+    idle = {'bikes': fleet_count,
+            'idle_now': round(float(np.mean(~fleet['rented'])) * 100, 2) if fleet_count else 0.0,
+            'idle_all_period': round(float(np.mean(~active)) * 100, 2) if fleet_count else 0.0}
+
+    # Components of each manufacturer in each condition
+    manufacturers, manufacturer_code = np.unique(fleet['manufacturer'], return_inverse=True)
+    conditions, condition_code = np.unique(fleet['condition'], return_inverse=True)
+    pair = manufacturer_code * len(conditions) + condition_code
+    total = np.bincount(pair, minlength=len(manufacturers) * len(conditions))
+    installed = np.bincount(pair, weights=fleet['installed'], minlength=len(total))
+    wear = [{'manufacturer': manufacturers[i // len(conditions)], 'condition': conditions[i % len(conditions)],
+             'components': int(total[i]), 'installed': int(installed[i])}
+            for i in np.flatnonzero(total)]
+
+    return {'days': days, 'bucket_seconds': bucket, 'generated': now, 'rental_hours': by_type,
+            'utilization': timeline, 'idle_fleet': idle, 'component_wear': wear}
+
+
+"""
+Helper function to compute a report in the background and keep it for ANALYTICS_CACHE_TTL seconds. A report
+computed from data loaded before the last reset is dropped.
+"""
+def _refresh(key):
+    try:
+        with _compute_lock:
+            generation = _generation
+            result = _compute(*key)
+        with _lock:
+            if generation == _generation:
+                _reports[key] = (time.monotonic() + constants.ANALYTICS_CACHE_TTL, result)
+    except Exception:
+        logging.exception("Computing the utilization report failed")
+    finally:
+        with _lock:
+            _computing.pop(key).set()
+
+
+"""
+Helper function to get the utilization report over the last 'days' days in buckets of 'bucket' seconds.
+Reports are computed in a background thread, at most once every ANALYTICS_CACHE_TTL seconds and one at a time
+on an instance, so a request never reads the fleet or the rental history itself. An expired report is
+returned while it is computed again. Otherwise the request waits up to ANALYTICS_READY_WAIT seconds for the
+report and gets None if it isn't ready by then.
+"""
+def report(days, bucket):
+    key = (days, bucket)
+    with _lock:
+        cached = _reports.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        done = _computing.get(key)
+        if done is None:
+            done = _computing[key] = threading.Event()
+            threading.Thread(target=_refresh, args=(key,), daemon=True).start()
+    if cached:
+        return cached[1]
+    done.wait(constants.ANALYTICS_READY_WAIT)
+    with _lock:
+        cached = _reports.get(key)
+    return cached[1] if cached else None
+
+
+"""
+Helper function to drop the loaded rental history, fleet and reports, e.g. after every rental event has been
+deleted. The next report loads them again.
+"""
+def reset():
+    global _history, _generation
+    with _lock:
+        _history = _RentalHistory()
+        _reports.clear()
+        _generation += 1
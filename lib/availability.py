@@ -0,0 +1,97 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import random
+import constants
+from db import client, new_entity
+
+
+"""
+Helper function to get the key of one shard of the count for a bike type and size. Each count is split
+over AVAILABILITY_COUNT_SHARDS entities so that rentals of popular buckets don't all write the same entity.
+"""
+def _shard_key(bike_type, bike_size, shard):
+    return client.key(constants.BIKE_COUNTS, "%s:%s:%d" % (bike_type, bike_size, shard))
+
+
+"""
+Helper function to change the number of available and rented bikes of a type and size. When called inside
+a transaction the change is committed together with the rest of the transaction.
+"""
+def adjust(bike_type, bike_size, available=0, rented=0):
+    shard = random.randrange(constants.AVAILABILITY_COUNT_SHARDS)
+    count_key = _shard_key(bike_type, bike_size, shard)
+    count = client.get(key=count_key)
+    if not count:
+        count = new_entity(count_key)
+        count.update({'type': bike_type, 'bike_size': bike_size, 'available': 0, 'rented': 0})
+    count['available'] += available
+    count['rented'] += rented
+    client.put(count)
+
+
+"""
+Helper function to move a bike between counts when its type or size is changed.
+"""
+def move(old_bike, new_bike):
+    if (old_bike['type'], old_bike['bike_size']) == (new_bike['type'], new_bike['bike_size']):
+        return
+    rented = 1 if old_bike['rentee'] else 0
+    adjust(old_bike['type'], old_bike['bike_size'], available=rented - 1, rented=-rented)
+    adjust(new_bike['type'], new_bike['bike_size'], available=1 - rented, rented=rented)
+
+
+"""
+Helper function to list the number of available and rented bikes for every type and size, optionally
+limited to one type and/or size.
+"""
+def get_counts(bike_type=None, bike_size=None):
+    query = client.query(kind=constants.BIKE_COUNTS)
+    if bike_type:
+        query.add_filter('type', '=', bike_type)
+    if bike_size:
+        query.add_filter('bike_size', '=', bike_size)
+
+    # Add the shards of each count together
+    totals = {}
+    for shard in query.fetch():
+        bucket = (shard['type'], shard['bike_size'])
+        total = totals.setdefault(bucket, {'type': shard['type'], 'bike_size': shard['bike_size'],
+                                           'available': 0, 'rented': 0})
+        total['available'] += shard['available']
+        total['rented'] += shard['rented']
+    return [totals[bucket] for bucket in sorted(totals, key=lambda b: (str(b[0]), str(b[1])))]
+
+
+"""
+Helper function to recount every bike and replace the stored counts. Used to create the counts for bikes
+that existed before counts were kept, and to repair them if they ever drift. Returns the number of types and
+sizes counted.
+"""
+def rebuild():
+    totals = {}
+    for bike in client.query(kind=constants.BIKES).fetch():
+        total = totals.setdefault((bike['type'], bike['bike_size']), [0, 0])
+        total[1 if bike['rentee'] else 0] += 1
+
+    old_query = client.query(kind=constants.BIKE_COUNTS)
+    old_query.keys_only()
+    old_keys = [e.key for e in old_query.fetch()]
+    for i in range(0, len(old_keys), 500):
+        client.delete_multi(old_keys[i:i + 500])
+
+    counts = []
+    for (bike_type, bike_size), (available, rented) in totals.items():
+        count = new_entity(_shard_key(bike_type, bike_size, 0))
+        count.update({'type': bike_type, 'bike_size': bike_size, 'available': available, 'rented': rented})
+        counts.append(count)
+    for i in range(0, len(counts), 500):
+        client.put_multi(counts[i:i + 500])
+    return len(counts)
+
+
+if __name__ == '__main__':
+    rebuild()
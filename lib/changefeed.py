@@ -0,0 +1,270 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+from datetime import datetime, timezone
+import queue
+import threading
+import time
+import uuid
+import constants
+import uow
+from db import client, new_entity
+
+
+INSTANCE_ID = uuid.uuid4().hex          # Identifies the events published by this instance
+
+
+"""
+Subscription to the events delivered by the broker. Events that match the subscription's filters are put
+on its queue. A subscriber that falls too far behind is closed and has to resume from its last event id.
+"""
+class Subscription(object):
+
+    def __init__(self, kind=None, entity=None):
+        self.kind = kind
+        self.entity = entity
+        self.queue = queue.Queue(maxsize=constants.CHANGEFEED_QUEUE_SIZE)
+        self.closed = False
+
+    def matches(self, event):
+        if self.kind and self.kind not in event['kinds']:
+            return False
+        if self.entity and self.entity not in event['entities']:
+            return False
+        return True
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.closed = True
+
+
+"""
+In-process broker that fans events out to the subscriptions on this instance. Events published by other
+instances reach it through the cross-instance backend.
+"""
+class Broker(object):
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, kind=None, entity=None):
+        subscription = Subscription(kind, entity)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        self.backend.start(self.deliver)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event):
+        self.backend.publish(event, self.deliver)
+
+    def deliver(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.matches(event):
+                subscription.deliver(event)
+
+    def has_subscribers(self):
+        with self._lock:
+            return bool(self._subscriptions)
+
+    """
+    Returns the kinds the subscriptions on this instance follow, or None if one of them follows every kind.
+    """
+    def kinds(self):
+        with self._lock:
+            kinds = set(subscription.kind for subscription in self._subscriptions)
+        return None if None in kinds else sorted(kinds)
+
+
+"""
+Backend for a single instance. Events are only delivered to subscribers on the instance that published them.
+"""
+class LocalBackend(object):
+
+    def publish(self, event, deliver):
+        deliver(event)
+
+    def start(self, deliver):
+        pass
+
+
+"""
+Backend that shares events between instances through the change log in Datastore. Events published on this
+instance are delivered right away, and while the instance has subscribers a background thread polls the
+change log every CHANGEFEED_POLL_INTERVAL seconds for events published by other instances. Each poll only
+reads the events of the kinds that are subscribed to.
+"""
+class DatastorePollBackend(object):
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def publish(self, event, deliver):
+        deliver(event)
+
+    def start(self, deliver):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._poll, args=(deliver,), daemon=True)
+                self._thread.start()
+
+    def _poll(self, deliver):
+        window = EventWindow(time.time_ns())
+        while broker.has_subscribers():
+            time.sleep(constants.CHANGEFEED_POLL_INTERVAL)
+            window.kind = broker.kinds()
+            for event in window.read():
+                if event['instance'] != INSTANCE_ID:
+                    deliver(event)
+
+
+"""
+Helper function to create the cross-instance backend named by constants.CHANGEFEED_BACKEND.
+"""
+def make_backend(backend):
+    if backend == "datastore":
+        return DatastorePollBackend()
+    return LocalBackend()
+
+
+broker = Broker(make_backend(constants.CHANGEFEED_BACKEND))
+
+
+"""
+Helper function to convert a stored change entity to an event.
+"""
+def _to_event(entity):
+    return {'id': entity.key.name, 'ts': entity['ts'], 'action': entity['action'], 'kind': entity['kind'],
+            'entity_id': entity['entity_id'], 'kinds': list(entity['kinds']),
+            'entities': list(entity['entities']), 'time': entity['time'], 'instance': entity['instance']}
+
+
+"""
+Helper function to record a change to an entity in the change log. 'related' is a list of (kind, id) pairs
+for the other entities affected by the change, such as the component installed on a bike, and subscribers
+filtering on any of those entities receive the event too. The event is written with the other changes
+made by the request, inside the current transaction if there is one, and published to subscribers once
+the changes have been written.
+"""
+def record(action, kind, entity_id, related=()):
+    ts = time.time_ns()
+    affected = [(kind, int(entity_id))] + [(k, int(i)) for k, i in related]
+    change = new_entity(client.key(constants.CHANGES, "%020d-%s" % (ts, uuid.uuid4().hex[:8])))
+    change.update({'ts': ts, 'action': action, 'kind': kind, 'entity_id': int(entity_id),
+                   'kinds': sorted(set(k for k, i in affected)),
+                   'entities': ["%s:%d" % (k, i) for k, i in affected],
+                   'time': datetime.now(timezone.utc).isoformat(), 'instance': INSTANCE_ID})
+
+    if client.current_transaction is not None:
+        client.put(change)
+    else:
+        uow.put(change)
+    event = _to_event(change)
+    uow.after_flush(lambda: broker.publish(event))
+
+
+"""
+Helper function to parse the timestamp out of an event id. Returns None for ids that aren't valid.
+"""
+def event_ts(event_id):
+    try:
+        return int(str(event_id).split('-')[0])
+    except ValueError:
+        return None
+
+
+"""
+Helper function to read events from the change log that were recorded after a timestamp, oldest first,
+optionally limited to a kind, a list of kinds or a single entity given as 'kind:id'.
+"""
+def read_events(after_ts, kind=None, entity=None, limit=None):
+    query = client.query(kind=constants.CHANGES)
+    if entity:
+        query.add_filter('entities', '=', entity)
+    elif isinstance(kind, list):
+        if not kind:
+            return []
+        query.add_filter('kinds', 'IN', kind)
+    elif kind:
+        query.add_filter('kinds', '=', kind)
+    query.add_filter('ts', '>', after_ts)
+    query.order = ['ts']
+    return [_to_event(e) for e in query.fetch(limit=limit or constants.CHANGEFEED_PAGE_SIZE)]
+
+
+"""
+Reader of the change log that returns every event once, in the order of their timestamps. Each read returns
+the events after the newest one read so far. An event's timestamp is taken before it is written, so an event
+that commits late, or that comes from an instance whose clock is behind, can appear after events with later
+timestamps. The first read, and one read every CHANGEFEED_RESCAN_INTERVAL seconds after it, therefore read
+the last CHANGEFEED_OVERLAP seconds of the log again and skip the events already returned.
+"""
+class EventWindow(object):
+
+    def __init__(self, after_ts, kind=None, entity=None, seen=()):
+        self.last_ts = after_ts
+        self.kind = kind
+        self.entity = entity
+        self._seen = {event_id: after_ts for event_id in seen}      # Timestamp of each event returned, by id
+        self._rescan_at = 0                                         # Time of the next read of the overlap
+
+    """
+    Returns the events that haven't been returned yet, at most 'limit' of them.
+    """
+    def read(self, limit=None):
+        overlap = int(constants.CHANGEFEED_OVERLAP * 1e9)
+        after_ts = self.last_ts
+        if time.monotonic() >= self._rescan_at:
+            after_ts -= overlap
+            self._rescan_at = time.monotonic() + constants.CHANGEFEED_RESCAN_INTERVAL
+        events = []
+        page = read_events(after_ts, self.kind, self.entity)
+        while page:
+            for event in page:
+                if limit and len(events) >= limit:
+                    break
+                self.last_ts = max(self.last_ts, event['ts'])
+                if self.add(event):
+                    events.append(event)
+            if len(page) < constants.CHANGEFEED_PAGE_SIZE or (limit and len(events) >= limit):
+                break
+            page = read_events(page[-1]['ts'], self.kind, self.entity)
+        self._seen = {i: ts for i, ts in self._seen.items() if ts > self.last_ts - overlap}
+        return events
+
+    """
+    Marks an event received some other way as returned. Returns False if it already was.
+    """
+    def add(self, event):
+        if event['id'] in self._seen:
+            return False
+        self._seen[event['id']] = event['ts']
+        return True
+
+
+"""
+Helper function to delete the events older than CHANGEFEED_RETENTION seconds from the change log. Clients
+can't resume from an event that has been deleted and start again from the oldest event that is kept.
+Returns the number of events deleted.
+"""
+def prune():
+    query = client.query(kind=constants.CHANGES)
+    query.add_filter('ts', '<', time.time_ns() - int(constants.CHANGEFEED_RETENTION * 1e9))
+    query.keys_only()
+    keys = [e.key for e in query.fetch()]
+    for i in range(0, len(keys), constants.CHANGEFEED_PRUNE_BATCH):
+        client.delete_multi(keys[i:i + constants.CHANGEFEED_PRUNE_BATCH])
+    return len(keys)
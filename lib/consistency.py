@@ -0,0 +1,208 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+from flask import request, g, has_request_context, current_app
+from itsdangerous import BadSignature, TimestampSigner
+from collections import deque
+import copy
+import logging
+import queue
+import random
+import threading
+import time
+import constants
+from db import client
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+"""
+Measures the staleness of eventually consistent lookups. A sample of the lookups is read again with strong
+consistency in a background thread, and when the result served was out of date the lookup is repeated every
+STALENESS_PROBE_INTERVAL seconds until it catches up. The time from the lookup until then is the staleness of
+the sample. A sample staler than STALENESS_MAX seconds switches every route to strong reads for
+STALENESS_BACKOFF seconds, which bounds the staleness served.
+"""
+class StalenessProbe(object):
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=constants.STALENESS_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=constants.STALENESS_RECENT)     # Staleness of the recent samples in seconds
+        self._strong_until = 0
+        self.stats = {'samples': 0, 'stale': 0, 'timeouts': 0, 'backoffs': 0}
+
+    def strong_only(self):
+        return time.monotonic() < self._strong_until
+
+    def sample(self, keys, found):
+        if random.random() >= constants.STALENESS_SAMPLE_RATE:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait((time.monotonic(), keys, _snapshot(found)))
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            read_at, keys, served = self._queue.get()
+            try:
+                self._probe(read_at, keys, served)
+            except Exception:
+                logging.exception("Probing the staleness of an eventual read failed")
+
+    def _probe(self, read_at, keys, served):
+        latest = _lookup(keys, eventual=False)
+        if served == latest:
+            self._record(0.0, stale=False)
+            return
+        while time.monotonic() - read_at < constants.STALENESS_PROBE_LIMIT:
+            time.sleep(constants.STALENESS_PROBE_INTERVAL)
+            if _lookup(keys, eventual=True) == latest:
+                self._record(time.monotonic() - read_at)
+                return
+        self._record(constants.STALENESS_PROBE_LIMIT, timeout=True)
+
+    def _record(self, seconds, stale=True, timeout=False):
+        with self._lock:
+            self.stats['samples'] += 1
+            self.stats['stale'] += int(stale)
+            self.stats['timeouts'] += int(timeout)
+            self._recent.append(seconds)
+            if seconds > constants.STALENESS_MAX:
+                self._strong_until = time.monotonic() + constants.STALENESS_BACKOFF
+                self.stats['backoffs'] += 1
+
+    def summary(self):
+        with self._lock:
+            recent = sorted(self._recent)
+            stats = dict(self.stats, strong_only=self.strong_only())
+        if recent:
+            stats['staleness'] = {'p50': recent[len(recent) // 2], 'p99': recent[int(len(recent) * 0.99)],
+                                  'max': recent[-1], 'mean': sum(recent) / len(recent)}
+        return stats
+
+
+"""
+Helper functions to read entities for the staleness probe as plain dicts, keyed by key with None for keys
+that don't exist.
+"""
+def _snapshot(found):
+    return {key: copy.deepcopy(dict(entity)) if entity is not None else None for key, entity in found.items()}
+
+
+def _lookup(keys, eventual):
+    found = {key: None for key in keys}
+    for entity in client.get_multi(keys, eventual=eventual):
+        found[entity.key] = entity
+    return _snapshot(found)
+
+
+probe = StalenessProbe()
+reads = {}                  # Number of requests to each route that read with each consistency
+_reads_lock = threading.Lock()
+
+
+"""
+Helper function to create the signer of the tokens that remember a caller's last write.
+"""
+def _signer():
+    return TimestampSigner(current_app.secret_key, salt='last-write')
+
+
+"""
+Helper function to tell if the caller of the current request wrote something in the last
+READ_YOUR_WRITES_WINDOW seconds. After each write the caller is sent a signed token with the time of the
+write, as a cookie and in a response header, and sends it back with its next requests, so whichever instance
+handles a read knows about the caller's writes. Callers that don't keep cookies can send the header back.
+"""
+def _wrote_recently():
+    token = request.headers.get(constants.READ_YOUR_WRITES_HEADER) or \
+        request.cookies.get(constants.READ_YOUR_WRITES_COOKIE)
+    if not token:
+        return False
+    try:
+        _signer().unsign(token, max_age=constants.READ_YOUR_WRITES_WINDOW)
+    except BadSignature:
+        return False
+    return True
+
+
+"""
+Helper function to choose the consistency of the reads of a request. Reads are eventually consistent on the
+routes in EVENTUAL_READ_ENDPOINTS, unless the caller wrote something in the last READ_YOUR_WRITES_WINDOW
+seconds or the staleness probe has found eventual reads too stale. The time the request started is kept so
+that it only shares reads that started after it.
+"""
+def _decide():
+    g.request_started = time.monotonic()
+    if (request.endpoint, request.method) not in constants.EVENTUAL_READ_ENDPOINTS:
+        return
+    if _wrote_recently():
+        consistency = 'read_your_writes'
+    elif probe.strong_only():
+        consistency = 'bounded'
+    else:
+        consistency = 'eventual'
+        g.read_eventual = True
+    with _reads_lock:
+        counts = reads.setdefault(request.endpoint, {'eventual': 0, 'read_your_writes': 0, 'bounded': 0})
+        counts[consistency] += 1
+
+
+"""
+Helper function to send the caller of a successful write the token that remembers it.
+"""
+def _record(res):
+    if request.method not in SAFE_METHODS and res.status_code < 400:
+        token = _signer().sign('write').decode()
+        res.headers[constants.READ_YOUR_WRITES_HEADER] = token
+        res.set_cookie(constants.READ_YOUR_WRITES_COOKIE, token, max_age=constants.READ_YOUR_WRITES_WINDOW,
+                       secure=request.is_secure, httponly=True, samesite='Lax')
+    return res
+
+
+"""
+Helper function to tell if the reads of the current request may be eventually consistent. Reads outside of
+a request and reads inside a transaction are always strongly consistent.
+"""
+def eventual():
+    if not has_request_context() or not g.get('read_eventual'):
+        return False
+    return client.current_transaction is None
+
+
+"""
+Helper function to return the time the current request started, on the monotonic clock. Outside of a request
+it is the current time.
+"""
+def request_started():
+    if has_request_context() and 'request_started' in g:
+        return g.request_started
+    return time.monotonic()
+
+
+"""
+Helper function to return the read consistency metrics of this instance.
+"""
+def metrics():
+    with _reads_lock:
+        counts = {endpoint: dict(c) for endpoint, c in reads.items()}
+    return {'reads': counts, 'staleness': probe.summary()}
+
+
+"""
+Helper function to add the read consistency policy to the Flask application.
+"""
+def init_app(app):
+    app.before_request(_decide)
+    app.after_request(_record)
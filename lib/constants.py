@@ -8,6 +8,15 @@
 USERS = "users"
 BIKES = "bikes"
 COMPONENTS = "components"
+SPECS = "specs"                 # Components installed on a bike, stored as children of the bike
+RENTALS = "rentals"             # Bikes rented by a user, stored as children of the user
+CHANGES = "changes"             # Append-only log of changes to bikes, components and users
+INVENTORIES = "inventories"     # Precomputed inventory of each user, keyed by user id
+RENTAL_EVENTS = "rental_events" # History of every bike rented and returned
+RESERVATIONS = "reservations"   # Future reservations of a bike, stored as children of the bike
+BIKE_COUNTS = "bike_counts"
+SESSIONS = "sessions"
+IDEMPOTENCY_KEYS = "idempotency_keys"
 
 # Randomly generated secret key used for session dictionary access
 SECRET_KEY = ""
@@ -20,3 +29,147 @@ CLIENT_SECRET = ""
 DOMAIN = "portfolio-lohrcl.us.auth0.com"
 
 ALGORITHMS = ["RS256"]
+
+# JWT subjects allowed to use the '/admin' routes
+ADMIN_SUBS = []
+
+# Datastore connection settings shared by every instance of the application
+DATASTORE_CHANNEL_POOL_SIZE = 4             # Number of gRPC channels used by the shared client
+DATASTORE_KEEPALIVE_MS = 30000              # Interval between keepalive pings on idle channels
+DATASTORE_KEEPALIVE_TIMEOUT_MS = 10000      # Time to wait for a keepalive ping to be acknowledged
+DATASTORE_DEADLINE = 10.0                   # Deadline in seconds for each Datastore call
+TRANSACTION_MAX_GROUPS = 25                 # Most entity groups one transaction can write to
+BIKE_DELETE_BATCH = 20                      # Components detached from a bike in each transaction of a delete,
+                                            # leaving room for the bike, its rentee, count, event and change
+
+# Number of seconds the Auth0 JSON Web Key Set is cached before it is fetched again
+JWKS_CACHE_TTL = 3600
+JWKS_MIN_REFRESH = 60        # Minimum seconds between refreshes caused by an unknown key id
+
+# Most seconds the warmup request waits for each in-memory index to be built
+WARMUP_INDEX_WAIT = 30
+
+# Where login sessions are stored. None keeps the whole session in the signed cookie, "memory" or
+# "datastore" keep it on the server and put only a session id in the cookie
+SESSION_BACKEND = None
+
+# Where responses for requests with an 'Idempotency-Key' header are stored, "memory" or "datastore"
+IDEMPOTENCY_BACKEND = "datastore"
+IDEMPOTENCY_TTL = 86400                 # Seconds a stored response is replayed for retries
+IDEMPOTENCY_LOCK_TIMEOUT = 60           # Seconds a key stays claimed by a request that never finished
+
+# Admission control for incoming requests
+ADMISSION_INITIAL_LIMIT = 40            # Requests an instance runs at the same time before any latency is seen
+ADMISSION_MIN_LIMIT = 4                 # Lowest value the adaptive concurrency limit can be cut to
+ADMISSION_MAX_LIMIT = 80                # Highest value the adaptive concurrency limit can grow to
+ADMISSION_TARGET_LATENCY = 0.1          # Datastore latency in seconds above which the limit is cut
+ADMISSION_LATENCY_WEIGHT = 0.1          # Weight of each new sample in the moving average of Datastore latency
+ADMISSION_ADJUST_EVERY = 20             # Number of Datastore RPCs between adjustments of the limit
+ADMISSION_BACKOFF = 0.9                 # Factor the limit is multiplied by when latency is above the target
+ADMISSION_EXPENSIVE_LIMIT = 4           # Collection scans and '/delete' requests that can run at the same time
+ADMISSION_SUBJECT_RATE = 10.0           # Requests per second allowed for each JWT subject
+ADMISSION_SUBJECT_BURST = 20            # Requests a JWT subject can make in a burst
+ADMISSION_MAX_SUBJECTS = 10000          # Number of JWT subjects tracked by the rate limiter
+ADMISSION_RETRY_AFTER = 1               # Seconds clients are asked to wait after a 503
+
+# Number of entities each count of available and rented bikes is split over
+AVAILABILITY_COUNT_SHARDS = 8
+
+# Change feed of bikes, components and users
+CHANGEFEED_BACKEND = "datastore"        # How events reach other instances, "local" or "datastore"
+CHANGEFEED_POLL_INTERVAL = 0.5          # Seconds between polls of the change log for other instances' events
+CHANGEFEED_PAGE_SIZE = 100              # Events read from the change log at a time
+CHANGEFEED_QUEUE_SIZE = 1000            # Events buffered for each subscriber before it is disconnected
+CHANGEFEED_MAX_STREAMS = 50             # Change feeds that can be open on an instance at the same time
+CHANGEFEED_STREAM_SECONDS = 55          # Seconds an event stream stays open before the client reconnects
+CHANGEFEED_LONG_POLL_SECONDS = 25       # Longest time a long-poll request waits for a change
+CHANGEFEED_HEARTBEAT = 15               # Seconds between heartbeats on an idle event stream
+CHANGEFEED_OVERLAP = 15.0               # Seconds of the change log read again to catch events that commit late
+CHANGEFEED_RESCAN_INTERVAL = 5.0        # Seconds between reads of the overlap, other reads start at the newest event
+CHANGEFEED_RETENTION = 7 * 24 * 3600    # Seconds events are kept in the change log
+CHANGEFEED_PRUNE_BATCH = 500            # Events deleted from the change log at a time
+
+# Limits on the related resources inlined with the 'expand' query parameter
+EXPAND_MAX_DEPTH = 2                    # Levels of related resources that can be expanded
+EXPAND_MAX_ITEMS = 100                  # Resources that can be inlined in one response
+
+# Rebuilds of the precomputed inventory of each user
+INVENTORY_REBUILD_BATCH = 100           # Users whose inventories are rebuilt together
+INVENTORY_RETRY_DELAY = 5               # Seconds to wait before rebuilding inventories again after a failure
+
+# Export and import of snapshots of every collection
+SNAPSHOT_PAGE_SIZE = 500                # Entities read at a time while exporting a collection
+SNAPSHOT_IMPORT_WORKERS = 8             # Batches of entities saved at the same time while importing
+
+# Fleet utilization reports
+ANALYTICS_CACHE_TTL = 300               # Seconds a computed report is served before it is computed again
+ANALYTICS_READY_WAIT = 20               # Seconds a request waits for a report that is being computed
+ANALYTICS_DEFAULT_DAYS = 30             # Days covered by a report when no 'days' are given
+ANALYTICS_MAX_DAYS = 3650               # Most days a report can cover
+ANALYTICS_MAX_BUCKETS = 2000            # Most time buckets in the utilization of one report
+ANALYTICS_BUCKETS = {'hour': 3600, 'day': 86400, 'week': 604800}     # Seconds in each length of time bucket
+
+# Reservations of bikes for future periods
+RESERVATION_MAX_DAYS = 30               # Longest period a bike can be reserved for
+RESERVATION_HORIZON_DAYS = 365          # How far ahead a bike can be reserved
+RESERVATION_INDEX_TTL = 600             # Seconds between full reloads of the index of every bike's reservations
+RESERVATION_INDEX_RETRY = 30            # Seconds to wait before building the index again after a failure
+RESERVATION_READY_WAIT = 5              # Seconds a search for free bikes waits for the index when an instance starts
+
+# Caching of the public component catalogue at the edge
+CACHE_PURGER = None                     # Where purges are sent, "memory", "http" or None for no edge cache
+CACHE_PURGE_URL = ""                    # URL that purges the cached responses named in 'Surrogate-Key'
+CACHE_PURGE_TOKEN = ""                  # Token sent with each purge request
+CACHE_PURGE_TIMEOUT = 5                 # Seconds to wait for a purge request
+CACHE_BROWSER_MAX_AGE = 60              # Seconds browsers keep a catalogue response
+CACHE_EDGE_MAX_AGE = 86400              # Seconds the edge cache keeps a catalogue response unless it is purged
+
+# Longest time in seconds a request waits for a concurrent identical Datastore read before making it itself
+SINGLEFLIGHT_WAIT = 2.0
+
+# Tracing of requests
+TRACE_SERVICE_NAME = "portfolio"        # Name of the service in exported traces
+TRACE_EXPORTER = None                   # Where sampled traces are sent, "file", "http", "memory" or None
+TRACE_FILE = "traces.jsonl"             # File the "file" exporter appends traces to
+TRACE_COLLECTOR_URL = "http://127.0.0.1:4318/v1/traces"     # OTLP/HTTP endpoint of the "http" exporter
+TRACE_EXPORT_TIMEOUT = 5                # Seconds to wait for the collector to accept a trace
+TRACE_QUEUE_SIZE = 1000                 # Traces waiting to be exported before new ones are dropped
+TRACE_SAMPLE_RATE = 0.01                # Share of requests without a 'traceparent' header that are exported
+TRACE_SLOW_THRESHOLD = 1.0              # Seconds after which a request is written to the slow-request log
+TRACE_SLOW_SAMPLE_RATE = 1.0            # Share of slow requests written to the slow-request log
+
+# Sampling profiler
+PROFILER_INTERVAL = 0.005               # Seconds between samples of the request threads' stacks
+PROFILER_MAX_SECONDS = 300              # Longest time sampling can be started for
+PROFILER_START_SECONDS = 0              # Seconds to sample every request for when an instance starts
+PROFILER_TOKEN = ""                     # Value of the 'X-Profile' header that profiles a single request
+PROFILER_MAX_SAVED = 100                # Single-request profiles kept on each instance
+PROFILER_MAX_STACKS = 5000              # Distinct stacks kept in a profile before new ones are counted together
+
+# Search of the component catalogue
+SEARCH_PREFIX_LENGTH = 12               # Longest prefix of a word that is indexed
+SEARCH_REBUILD_INTERVAL = 900           # Seconds between rebuilds of the search index from Datastore
+SEARCH_READY_WAIT = 5                   # Seconds a search waits for the index to be built when an instance starts
+SEARCH_DEFAULT_LIMIT = 10               # Results returned by a search without a 'limit'
+SEARCH_MAX_LIMIT = 50                   # Most results returned by a search
+SEARCH_MAX_QUERY_LENGTH = 100           # Characters of a query that are searched
+SEARCH_MAX_TERMS = 8                    # Words of a query that are searched
+
+# Read consistency. Reads on the routes below are eventually consistent unless the caller wrote something in the
+# last READ_YOUR_WRITES_WINDOW seconds, as (endpoint, method) pairs. Routes whose responses are cached at the edge
+# are never listed: the edge refetches them after a purge without the caller's token, and a stale read would be
+# cached for CACHE_EDGE_MAX_AGE seconds
+EVENTUAL_READ_ENDPOINTS = {
+    ('users.users_get_all', 'GET'),
+    ('users.user_get', 'GET'),
+}
+READ_YOUR_WRITES_WINDOW = 10            # Seconds a caller's reads are strongly consistent after it writes
+READ_YOUR_WRITES_COOKIE = "last_write"  # Cookie with the signed time of a caller's last write
+READ_YOUR_WRITES_HEADER = "X-Last-Write" # Header with the same token, for callers that don't keep cookies
+STALENESS_SAMPLE_RATE = 0.01            # Share of eventual lookups whose staleness is measured
+STALENESS_PROBE_INTERVAL = 0.1          # Seconds between the lookups that wait for a stale read to catch up
+STALENESS_PROBE_LIMIT = 10              # Seconds after which a stale read is no longer waited for
+STALENESS_QUEUE_SIZE = 100              # Samples waiting to be measured before new ones are dropped
+STALENESS_RECENT = 1000                 # Recent samples the staleness percentiles are computed from
+STALENESS_MAX = 5                       # Seconds of staleness after which reads are strongly consistent again
+STALENESS_BACKOFF = 60                  # Seconds reads stay strongly consistent after a sample exceeded it
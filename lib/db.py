@@ -0,0 +1,201 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import itertools
+import threading
+import time
+from urllib.parse import urlparse
+import constants
+import tracing
+from importtime import timed_import
+
+
+"""
+Pool of gRPC channels that looks like a single channel to the Datastore transport. Every call made through
+a multi-callable is handed to the next channel in the pool, so concurrent requests from the threads of a
+worker are spread over several HTTP/2 connections instead of queueing on one.
+"""
+class _ChannelPool(object):
+
+    def __init__(self, channels):
+        self._channels = channels
+        self._next = itertools.cycle(range(len(channels)))
+        self._lock = threading.Lock()
+
+    def _pick(self, callables):
+        with self._lock:
+            index = next(self._next)
+        return callables[index]
+
+    def unary_unary(self, method, *args, **kwargs):
+        return _PooledCallable(self, [c.unary_unary(method, *args, **kwargs) for c in self._channels])
+
+    def unary_stream(self, method, *args, **kwargs):
+        return _PooledCallable(self, [c.unary_stream(method, *args, **kwargs) for c in self._channels])
+
+    def subscribe(self, callback, try_to_connect=False):
+        for channel in self._channels:
+            channel.subscribe(callback, try_to_connect=try_to_connect)
+
+    def unsubscribe(self, callback):
+        for channel in self._channels:
+            channel.unsubscribe(callback)
+
+    def close(self):
+        for channel in self._channels:
+            channel.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+
+"""
+Multi-callable that forwards each invocation to a channel chosen by the pool.
+"""
+class _PooledCallable(object):
+
+    def __init__(self, pool, callables):
+        self._pool = pool
+        self._callables = callables
+
+    def __call__(self, *args, **kwargs):
+        return self._pool._pick(self._callables)(*args, **kwargs)
+
+    def with_call(self, *args, **kwargs):
+        return self._pool._pick(self._callables).with_call(*args, **kwargs)
+
+    def future(self, *args, **kwargs):
+        return self._pool._pick(self._callables).future(*args, **kwargs)
+
+
+_latency_listeners = []         # Functions called with the duration in seconds of every Datastore RPC
+
+
+"""
+Helper function to register a function that is called with the duration of every Datastore RPC.
+"""
+def add_latency_listener(listener):
+    _latency_listeners.append(listener)
+
+
+"""
+Wrapper around the GAPIC Datastore API that applies the configured per-call deadline to every RPC that
+does not already specify its own timeout, records a tracing span for it and reports how long each RPC took
+to the latency listeners.
+"""
+class _DeadlineApi(object):
+
+    def __init__(self, api, deadline):
+        self._api = api
+        self._deadline = deadline
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+
+        def call(*args, **kwargs):
+            if kwargs.get('timeout') is None:
+                kwargs['timeout'] = self._deadline
+            start = time.perf_counter()
+            try:
+                with tracing.span('datastore.' + name, tracing.CLIENT):
+                    return attr(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                for listener in _latency_listeners:
+                    listener(elapsed)
+        return call
+
+
+"""
+Helper function to build the gRPC channel options used for every channel in the pool.
+"""
+def _channel_options():
+    return [
+        ("grpc.keepalive_time_ms", constants.DATASTORE_KEEPALIVE_MS),
+        ("grpc.keepalive_timeout_ms", constants.DATASTORE_KEEPALIVE_TIMEOUT_MS),
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.http2.max_pings_without_data", 0),
+        # Give every channel in the pool its own subchannel so they open separate connections
+        ("grpc.use_local_subchannel_pool", 1),
+    ]
+
+
+"""
+Helper function to create the Datastore API for a client using a pool of tuned gRPC channels.
+"""
+def _make_datastore_api(ds_client):
+    import grpc
+    from google.cloud._helpers import make_secure_channel
+    from google.cloud._http import DEFAULT_USER_AGENT
+    from google.cloud.datastore_v1.services.datastore import client as datastore_client
+    from google.cloud.datastore_v1.services.datastore.transports import grpc as datastore_grpc
+
+    parse_result = urlparse(ds_client._base_url)
+    host = parse_result.netloc
+    options = _channel_options()
+
+    channels = []
+    for i in range(max(1, constants.DATASTORE_CHANNEL_POOL_SIZE)):
+        if parse_result.scheme == "https":
+            channels.append(make_secure_channel(ds_client._credentials, DEFAULT_USER_AGENT, host,
+                                                extra_options=options))
+        else:
+            channels.append(grpc.insecure_channel(host, options=options))
+
+    channel = channels[0] if len(channels) == 1 else _ChannelPool(channels)
+    transport = datastore_grpc.DatastoreGrpcTransport(channel=channel)
+    api = datastore_client.DatastoreClient(transport=transport, client_info=ds_client._client_info)
+    return _DeadlineApi(api, constants.DATASTORE_DEADLINE)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+"""
+Helper function to return the Datastore client shared by every module of the application. The client,
+its credentials and its channels are created on first use rather than at import time, and the lock makes
+the creation safe when the first requests arrive on several threads at once.
+"""
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                datastore = timed_import('google.cloud.datastore')
+                ds_client = datastore.Client()
+                if ds_client._use_grpc:
+                    ds_client._datastore_api_internal = _make_datastore_api(ds_client)
+                _client = ds_client
+    return _client
+
+
+"""
+Stand-in for the Datastore client that the route modules bind at import time. Attribute access is
+forwarded to the shared client, which is only created the first time it is actually used.
+"""
+class _LazyClient(object):
+
+    def __getattr__(self, name):
+        return getattr(get_client(), name)
+
+
+client = _LazyClient()      # Shared client used by the application and all blueprints
+
+
+"""
+Helper function to create a new, unsaved entity. The Datastore library is only imported the first time an
+entity is created so that importing the route modules stays cheap on a cold instance.
+"""
+def new_entity(key):
+    datastore = timed_import('google.cloud.datastore')
+    return datastore.entity.Entity(key=key)
@@ -0,0 +1,159 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+from flask import request, g, make_response
+from six.moves.urllib.request import urlopen, Request
+import logging
+import threading
+import time
+import constants
+import tracing
+import uow
+
+
+ALL_COMPONENTS = "components-all"       # Surrogate key of every cached catalogue response
+COMPONENT_PAGES = "components-list"     # Surrogate key of every cached page of the '/components' collection
+
+
+"""
+Helper functions to name the surrogate keys of a component and of a page of the '/components' collection.
+"""
+def component_key(component_id):
+    return "component-%s" % component_id
+
+
+def page_key(offset, limit):
+    return "components-page-%d-%d" % (offset, limit)
+
+
+"""
+HTTP cache kept in the memory of the instance, which stands in for the edge cache in local development and
+testing. Responses with a 'Surrogate-Key' header are stored for the 'max-age' of their 'Surrogate-Control'
+header and served to later GET requests for the same URL until they expire or one of their keys is purged.
+"""
+class MemoryCache(object):
+
+    def __init__(self):
+        self._entries = {}          # Stored response and its surrogate keys and expiry time, by URL
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry and entry['expires'] <= time.monotonic():
+                del self._entries[url]
+                entry = None
+        return entry
+
+    def store(self, url, res):
+        max_age = 0
+        for directive in res.headers.get('Surrogate-Control', '').split(','):
+            name, _, value = directive.strip().partition('=')
+            if name == 'max-age' and value.isdigit():
+                max_age = int(value)
+        if not max_age:
+            return
+        entry = {'body': res.get_data(), 'status': res.status_code, 'headers': list(res.headers.items()),
+                 'keys': set(res.headers['Surrogate-Key'].split()), 'expires': time.monotonic() + max_age}
+        with self._lock:
+            self._entries[url] = entry
+
+    def purge(self, keys):
+        keys = set(keys)
+        with self._lock:
+            for url in [url for url, entry in self._entries.items() if entry['keys'] & keys]:
+                del self._entries[url]
+
+
+"""
+Purger for an edge cache that accepts purge requests by surrogate key, e.g. a CDN in front of the
+application. The keys are sent together in the 'Surrogate-Key' header of a POST to CACHE_PURGE_URL.
+"""
+class HttpPurger(object):
+
+    def __init__(self, url, token):
+        self.url = url
+        self.token = token
+
+    def purge(self, keys):
+        headers = dict(tracing.headers(), **{'Surrogate-Key': " ".join(sorted(keys))})
+        if self.token:
+            headers['Authorization'] = "Bearer " + self.token
+        try:
+            urlopen(Request(self.url, headers=headers, method='POST'), timeout=constants.CACHE_PURGE_TIMEOUT)
+        except Exception:
+            # The cached responses expire by themselves, so a failed purge only delays the update
+            logging.exception("Purging %s from the edge cache failed", headers['Surrogate-Key'])
+
+
+"""
+Helper function to create the purger named by constants.CACHE_PURGER.
+"""
+def make_purger(backend):
+    if backend == "memory":
+        return MemoryCache()
+    if backend == "http":
+        return HttpPurger(constants.CACHE_PURGE_URL, constants.CACHE_PURGE_TOKEN)
+    return None
+
+
+purger = make_purger(constants.CACHE_PURGER)
+
+
+"""
+Helper function to mark a catalogue response as cacheable. Browsers keep it for CACHE_BROWSER_MAX_AGE
+seconds and the edge cache for CACHE_EDGE_MAX_AGE seconds, or until one of its surrogate keys is purged.
+"""
+def cacheable(res, keys):
+    res.headers['Cache-Control'] = "public, max-age=%d" % constants.CACHE_BROWSER_MAX_AGE
+    res.headers['Surrogate-Control'] = "max-age=%d" % constants.CACHE_EDGE_MAX_AGE
+    res.headers['Surrogate-Key'] = " ".join([ALL_COMPONENTS] + list(keys))
+    return res
+
+
+"""
+Helper function to purge the cached responses with the given surrogate keys. The keys of a request are
+purged together once the request's changes have been written, so no edge can cache the old version again.
+"""
+def purge(*keys):
+    if purger is None:
+        return
+    if 'purge_keys' not in g:
+        g.purge_keys = set()
+        uow.after_flush(lambda: purger.purge(g.pop('purge_keys', set())))
+    g.purge_keys.update(keys)
+
+
+"""
+Helper functions to serve GET requests from the in-memory cache and store cacheable responses in it.
+"""
+def _serve():
+    if request.method != 'GET':
+        return None
+    entry = purger.get(request.full_path)
+    if entry is None:
+        return None
+    res = make_response(entry['body'], entry['status'], entry['headers'])
+    res.headers['X-Cache'] = "HIT"
+    return res
+
+
+def _store(res):
+    if request.method == 'GET' and res.status_code == 200 and 'Surrogate-Key' in res.headers \
+            and 'X-Cache' not in res.headers:
+        purger.store(request.full_path, res)
+        res.headers['X-Cache'] = "MISS"
+    return res
+
+
+"""
+Helper function to put the in-memory cache in front of the Flask application when it is the configured
+purger.
+"""
+def init_app(app):
+    if isinstance(purger, MemoryCache):
+        app.before_request(_serve)
+        app.after_request(_store)
@@ -0,0 +1,160 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import constants
+import relations
+import uow
+from db import client
+from models import Bike, Component, User
+
+# Related resources that can be expanded on each kind of resource
+EXPANDABLE = {
+    constants.BIKES: {'specs': constants.COMPONENTS, 'rentee': constants.USERS},
+    constants.USERS: {'rental': constants.BIKES},
+    constants.COMPONENTS: {},
+}
+
+
+"""
+Error raised when the 'expand' query parameter is invalid or would inline too many resources.
+"""
+class ExpandError(Exception):
+
+    def __init__(self, error, status_code):
+        self.error = error
+        self.status_code = status_code
+
+
+"""
+Count of the resources that can still be inlined in a response.
+"""
+class _Budget(object):
+
+    def __init__(self, limit):
+        self.remaining = limit
+
+    def take(self, count):
+        self.remaining -= count
+        if self.remaining < 0:
+            raise ExpandError({"code": "Bad Request",
+                               "description": "Too many resources to expand, at most %d can be inlined"
+                                             % constants.EXPAND_MAX_ITEMS}, 400)
+
+
+"""
+Helper function to parse the 'expand' query parameter for a kind of resource into a tree of the related
+resources to inline, e.g. 'specs,rentee.rental' becomes {'specs': {}, 'rentee': {'rental': {}}}.
+"""
+def parse(value, kind):
+    tree = {}
+    for path in filter(None, (p.strip() for p in (value or '').split(','))):
+        fields = path.split('.')
+        if len(fields) > constants.EXPAND_MAX_DEPTH:
+            raise ExpandError({"code": "Bad Request",
+                               "description": "Resources can be expanded at most %d levels deep"
+                                             % constants.EXPAND_MAX_DEPTH}, 400)
+        node = tree
+        node_kind = kind
+        for field in fields:
+            if field not in EXPANDABLE[node_kind]:
+                raise ExpandError({"code": "Bad Request",
+                                   "description": "'%s' cannot be expanded on %s" % (field, node_kind)}, 400)
+            node = node.setdefault(field, {})
+            node_kind = EXPANDABLE[node_kind][field]
+    return tree
+
+
+"""
+Helper functions to read entities into the models their own routes return.
+"""
+def component_data(component):
+    return Component.from_entity(component)
+
+
+def user_data(user, rental):
+    return User.from_entity(user, rental=rental)
+
+
+def bike_data(bike, specs):
+    return Bike.from_entity(bike, specs=specs)
+
+
+"""
+Helper function to inline the related resources of bike models. The related entities of every bike are
+read together with one get_multi.
+"""
+def _expand_bikes(bikes, tree, budget, sub):
+    keys = []
+    if 'specs' in tree:
+        keys += [client.key(constants.COMPONENTS, int(i.id)) for bike in bikes for i in bike.specs]
+    if 'rentee' in tree:
+        keys += [client.key(constants.USERS, int(bike.rentee)) for bike in bikes if bike.rentee]
+    budget.take(len(set(keys)))
+    entities = dict(zip(keys, uow.get_multi(keys)))
+
+    if 'specs' in tree:
+        components = []
+        for bike in bikes:
+            for i, spec in enumerate(bike.specs):
+                component = entities[client.key(constants.COMPONENTS, int(spec.id))]
+                if component:
+                    bike.specs[i] = component_data(component)
+                    components.append(bike.specs[i])
+        _expand(constants.COMPONENTS, components, tree['specs'], budget, sub)
+
+    if 'rentee' in tree:
+        users = [entities[client.key(constants.USERS, int(bike.rentee))] for bike in bikes if bike.rentee]
+        rentals = relations.get_rentals([u.key.id for u in users if u])
+        rentees = []
+        for bike in bikes:
+            user = entities[client.key(constants.USERS, int(bike.rentee))] if bike.rentee else None
+            if user:
+                bike.rentee = user_data(user, rentals[user.key.id])
+                rentees.append(bike.rentee)
+        _expand(constants.USERS, rentees, tree['rentee'], budget, sub)
+
+
+"""
+Helper function to inline the bikes rented by user models. Bikes are only inlined for the user the
+JWT was issued to, since a bike can only be viewed by the user renting it.
+"""
+def _expand_users(users, tree, budget, sub):
+    if 'rental' not in tree:
+        return
+    owned = [user for user in users if sub is not None and str(user.renter_id) == str(sub)]
+    keys = [client.key(constants.BIKES, int(i.id)) for user in owned for i in user.rental]
+    budget.take(len(set(keys)))
+    entities = dict(zip(keys, uow.get_multi(keys)))
+    specs = relations.get_specs([key.id for key, bike in entities.items() if bike])
+
+    bikes = []
+    for user in owned:
+        for i, rental in enumerate(user.rental):
+            bike = entities[client.key(constants.BIKES, int(rental.id))]
+            if bike:
+                user.rental[i] = bike_data(bike, specs[bike.key.id])
+                bikes.append(user.rental[i])
+    _expand(constants.BIKES, bikes, tree['rental'], budget, sub)
+
+
+def _expand(kind, items, tree, budget, sub):
+    if not items or not tree:
+        return
+    if kind == constants.BIKES:
+        _expand_bikes(items, tree, budget, sub)
+    elif kind == constants.USERS:
+        _expand_users(items, tree, budget, sub)
+
+
+"""
+Helper function to inline the related resources named in the 'expand' query parameter into the models of
+a kind. 'sub' is the subject of the caller's JWT, used to decide which resources the caller
+may see. At most EXPAND_MAX_ITEMS resources are inlined in one response.
+"""
+def expand(kind, items, value, sub=None):
+    tree = parse(value, kind)
+    _expand(kind, items, tree, _Budget(constants.EXPAND_MAX_ITEMS), sub)
+    return items
@@ -0,0 +1,216 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+from flask import request, g, make_response
+from functools import wraps
+import hashlib
+import threading
+import time
+import json
+import constants
+import uow
+from db import client, new_entity
+from importtime import timed_import
+from validate import create_response
+
+
+"""
+Idempotency store that keeps records in the memory of the instance. Used for local development and
+testing, records are not shared between instances.
+"""
+class MemoryIdempotencyStore(object):
+
+    def __init__(self):
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key, fingerprint):
+        now = time.time()
+        with self._lock:
+            record = self._records.get(key)
+            if record and record['expires'] > now:
+                return dict(record)
+            self._records[key] = {'state': 'in_progress', 'fingerprint': fingerprint,
+                                  'expires': now + constants.IDEMPOTENCY_LOCK_TIMEOUT}
+        return None
+
+    def complete(self, key, fingerprint, status, headers, body):
+        with self._lock:
+            self._records[key] = {'state': 'done', 'fingerprint': fingerprint, 'status': status,
+                                  'headers': headers, 'body': body,
+                                  'expires': time.time() + constants.IDEMPOTENCY_TTL}
+
+    def complete_with_changes(self, key, fingerprint, status, headers, body):
+        uow.after_flush(lambda: self.complete(key, fingerprint, status, headers, body))
+
+    def complete_in_transaction(self, key, fingerprint, status, headers, body):
+        self.complete(key, fingerprint, status, headers, body)
+
+    def release(self, key):
+        with self._lock:
+            self._records.pop(key, None)
+
+
+"""
+Idempotency store that keeps records in the 'idempotency_keys' collection in Datastore. Claiming a key is
+done in a transaction so that only one of several concurrent requests with the same key can run, and a
+request that loses the transaction to another one is treated as a retry of a request still in progress.
+The record of a successful request is written in the same commit as the request's changes, either with the
+unit of work or in the transaction of a handler that commits its changes itself, and a completed record is
+never released.
+"""
+class DatastoreIdempotencyStore(object):
+
+    def begin(self, key, fingerprint):
+        record_key = client.key(constants.IDEMPOTENCY_KEYS, key)
+        now = time.time()
+        exceptions = timed_import('google.api_core.exceptions')
+        try:
+            with client.transaction():
+                record = client.get(key=record_key)
+                if record and record['expires'] > now:
+                    return {'state': record['state'], 'fingerprint': record['fingerprint'],
+                            'status': record.get('status'), 'headers': json.loads(record.get('headers') or '[]'),
+                            'body': record.get('body')}
+                record = new_entity(record_key)
+                record.update({'state': 'in_progress', 'fingerprint': fingerprint,
+                               'expires': now + constants.IDEMPOTENCY_LOCK_TIMEOUT})
+                client.put(record)
+        except exceptions.Conflict:
+            return {'state': 'in_progress', 'fingerprint': fingerprint}
+        return None
+
+    def _record(self, key, fingerprint, status, headers, body):
+        record = new_entity(client.key(constants.IDEMPOTENCY_KEYS, key))
+        record.exclude_from_indexes.update(['headers', 'body'])
+        record.update({'state': 'done', 'fingerprint': fingerprint, 'status': status,
+                       'headers': json.dumps(headers), 'body': body,
+                       'expires': time.time() + constants.IDEMPOTENCY_TTL})
+        return record
+
+    def complete(self, key, fingerprint, status, headers, body):
+        client.put(self._record(key, fingerprint, status, headers, body))
+
+    def complete_with_changes(self, key, fingerprint, status, headers, body):
+        uow.put(self._record(key, fingerprint, status, headers, body))
+
+    def complete_in_transaction(self, key, fingerprint, status, headers, body):
+        client.put(self._record(key, fingerprint, status, headers, body))
+
+    def release(self, key):
+        record_key = client.key(constants.IDEMPOTENCY_KEYS, key)
+        with client.transaction():
+            record = client.get(key=record_key)
+            if record and record['state'] != 'done':
+                client.delete(record_key)
+
+
+"""
+Helper function to create the idempotency store for the backend named by constants.IDEMPOTENCY_BACKEND.
+"""
+def make_store(backend):
+    if backend == "datastore":
+        return DatastoreIdempotencyStore()
+    return MemoryIdempotencyStore()
+
+
+store = make_store(constants.IDEMPOTENCY_BACKEND)
+
+
+"""
+Helper function to list the headers of a response that are stored with it and replayed.
+"""
+def _stored_headers(res):
+    return [(name, value) for name, value in res.headers.items() if name in ('Content-Type', 'Location')]
+
+
+"""
+Helper function for handlers that commit their changes in a transaction of their own. Writes the record of
+the response 'res' for the request's Idempotency-Key in the current transaction, so the key is completed in
+the same commit as the changes and a retry can't make them again even if the rest of the request fails.
+Does nothing for requests without a key. Returns the response.
+"""
+def complete_in_transaction(res):
+    claim = g.get('idempotency_claim')
+    if claim is not None:
+        store.complete_in_transaction(claim[0], claim[1], res.status_code, _stored_headers(res),
+                                      res.get_data(as_text=True))
+        g.idempotency_completed = True
+    return res
+
+
+"""
+Decorator for routes that accept an 'Idempotency-Key' header on the given request methods. The first
+response for a key is stored and replayed for retries of the same request within IDEMPOTENCY_TTL seconds.
+A retry that arrives while the first request is still running gets a 409 response instead of running the
+handler a second time. Keys are scoped to the request method, path and Authorization header, and reusing
+a key with a different request body is rejected.
+"""
+def idempotent(methods):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            idempotency_key = request.headers.get('Idempotency-Key')
+            if request.method not in methods or not idempotency_key:
+                return view(*args, **kwargs)
+
+            message = {}
+            scope = "\n".join([request.method, request.path, request.headers.get('Authorization', ''),
+                               idempotency_key])
+            key = hashlib.sha256(scope.encode()).hexdigest()
+            fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+            # Claim the key or get the record of the request that already claimed it
+            record = store.begin(key, fingerprint)
+            if record:
+                if record['fingerprint'] != fingerprint:
+                    message["code"] = "Unprocessable Entity"
+                    message["description"] = "This Idempotency-Key was already used for a different request"
+                    return create_response(message, 422)
+                if record['state'] != 'done':
+                    message["code"] = "Conflict"
+                    message["description"] = "A request with this Idempotency-Key is still being processed"
+                    res = create_response(message, 409)
+                    res.headers['Retry-After'] = '1'
+                    return res
+
+                # Replay the stored response
+                res = make_response(record['body'], record['status'])
+                for name, value in record['headers']:
+                    res.headers[name] = value
+                res.headers['Idempotent-Replayed'] = 'true'
+                return res
+
+            g.idempotency_claim = (key, fingerprint)
+            completed = False
+            try:
+                res = make_response(view(*args, **kwargs))
+                completed = g.pop('idempotency_completed', False)
+                headers = _stored_headers(res)
+
+                # Save the request's changes before its response is sent, with the record of the response in the
+                # same commit so that the key is completed exactly when the changes are saved. Handlers that
+                # commit their own transaction have already written the record with their changes.
+                if res.status_code < 400:
+                    if not completed:
+                        store.complete_with_changes(key, fingerprint, res.status_code, headers,
+                                                    res.get_data(as_text=True))
+                    uow.flush()
+
+                # Server errors are not stored so that the request can be retried
+                elif res.status_code >= 500:
+                    store.release(key)
+                else:
+                    store.complete(key, fingerprint, res.status_code, headers, res.get_data(as_text=True))
+            except Exception:
+                # A record saved with the handler's changes is kept, so a retry replays the response instead
+                # of making the changes again
+                if not completed:
+                    store.release(key)
+                raise
+            return res
+        return wrapper
+    return decorator
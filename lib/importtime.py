@@ -0,0 +1,37 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import importlib
+import sys
+import threading
+import time
+
+
+IMPORT_TIMES = {}                   # Seconds spent importing each measured module on this instance
+_lock = threading.Lock()
+
+
+"""
+Helper function to import a module and record how long the import took. Modules that are already loaded
+are returned without being measured again.
+"""
+def timed_import(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    with _lock:
+        IMPORT_TIMES.setdefault(name, time.perf_counter() - start)
+    return module
+
+
+"""
+Helper function to return the measured import times in milliseconds, slowest first.
+"""
+def report():
+    with _lock:
+        items = sorted(IMPORT_TIMES.items(), key=lambda item: item[1], reverse=True)
+    return [{'module': name, 'ms': round(seconds * 1000, 2)} for name, seconds in items]
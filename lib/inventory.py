@@ -0,0 +1,180 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+from flask import g
+from datetime import datetime, timezone
+import json
+import logging
+import threading
+import time
+import constants
+import models
+import relations
+import uow
+from db import client, new_entity
+from expand import user_data, bike_data, component_data
+
+
+BATCH_SIZE = 500        # Largest number of entities Datastore accepts in a single batch
+
+
+"""
+Helper function to read entities in batches, skipping keys that don't exist.
+"""
+def _get_all(keys):
+    entities = {}
+    keys = list(set(keys))
+    for i in range(0, len(keys), BATCH_SIZE):
+        for entity in client.get_multi(keys[i:i + BATCH_SIZE]):
+            entities[entity.key] = entity
+    return entities
+
+
+"""
+Helper function to save inventory documents unless a newer version of them is already saved. Each document's
+'updated' time is when the rebuild that built it started reading, so a rebuild that started later read data
+at least as new. The documents are compared and saved in transactions of up to TRANSACTION_MAX_GROUPS
+documents, so two rebuilds of the same user on different instances can't both save theirs.
+"""
+def _save(entities):
+    for i in range(0, len(entities), constants.TRANSACTION_MAX_GROUPS):
+        batch = entities[i:i + constants.TRANSACTION_MAX_GROUPS]
+        with client.transaction():
+            saved = {e.key: e.get('updated') for e in client.get_multi([e.key for e in batch])}
+            client.put_multi([e for e in batch if saved.get(e.key) is None or saved[e.key] < e['updated']])
+
+
+"""
+Helper function to build the inventory documents of several users and save them in the 'inventories'
+collection, keyed by user id. Each document holds the user, every bike the user rents and every component
+installed on those bikes, formatted the way their own routes return them. Returns the documents built as
+JSON text, keyed by user id. Users that don't exist are skipped.
+"""
+def rebuild(user_ids):
+    updated = datetime.now(timezone.utc)
+    user_ids = [int(user_id) for user_id in user_ids]
+    users = _get_all([client.key(constants.USERS, user_id) for user_id in user_ids])
+    rentals = relations.get_rentals([key.id for key in users])
+
+    bikes = _get_all([client.key(constants.BIKES, int(i.id)) for r in rentals.values() for i in r])
+    specs = relations.get_specs([key.id for key in bikes])
+    components = _get_all([client.key(constants.COMPONENTS, int(i.id)) for s in specs.values() for i in s])
+
+    documents = {}
+    entities = []
+    for user_key, user in users.items():
+        garage = []
+        for rental in rentals[user_key.id]:
+            bike = bikes.get(client.key(constants.BIKES, int(rental.id)))
+            if not bike:
+                continue
+            bike_doc = bike_data(bike, specs[bike.key.id]).to_json()
+            bike_doc['components'] = [component_data(components[key]) for key in
+                                      [client.key(constants.COMPONENTS, int(i.id)) for i in specs[bike.key.id]]
+                                      if key in components]
+            garage.append(bike_doc)
+
+        documents[user_key.id] = json.dumps({'user': user_data(user, rentals[user_key.id]), 'bikes': garage},
+                                            default=models.to_json)
+        entity = new_entity(client.key(constants.INVENTORIES, user_key.id))
+        entity.exclude_from_indexes.add('data')
+        entity.update({'renter_id': user['renter_id'], 'data': documents[user_key.id], 'updated': updated})
+        entities.append(entity)
+
+    _save(entities)
+    return documents
+
+
+"""
+Rebuilds the inventories of the users touched by requests in a background thread, so requests don't wait
+for them. Users touched again while waiting are rebuilt once, up to INVENTORY_REBUILD_BATCH users at a
+time, and a batch that fails is queued again after INVENTORY_RETRY_DELAY seconds.
+"""
+class Rebuilder(object):
+
+    def __init__(self):
+        self._pending = set()       # Ids of the users waiting to be rebuilt
+        self._thread = None
+        self._ready = threading.Condition()
+
+    def add(self, user_ids):
+        with self._ready:
+            self._pending.update(user_ids)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._ready.notify()
+
+    def _run(self):
+        while True:
+            with self._ready:
+                while not self._pending:
+                    self._ready.wait()
+                batch = [self._pending.pop() for _ in range(min(len(self._pending),
+                                                                constants.INVENTORY_REBUILD_BATCH))]
+            try:
+                rebuild(batch)
+            except Exception:
+                logging.exception("Rebuilding inventories failed")
+                time.sleep(constants.INVENTORY_RETRY_DELAY)
+                self.add(batch)
+
+
+rebuilder = Rebuilder()
+
+
+"""
+Helper function to get the inventory document of a user as JSON text with a single key lookup, together with
+the 'sub' of the user it belongs to. The document is built if the user doesn't have one yet. Returns
+(None, None) if the user doesn't exist.
+"""
+def get(user_id):
+    entity = client.get(key=client.key(constants.INVENTORIES, int(user_id)))
+    if entity:
+        return entity['data'], entity['renter_id']
+    document = rebuild([user_id]).get(int(user_id))
+    if document is None:
+        return None, None
+    return document, json.loads(document)['user']['renter_id']
+
+
+"""
+Helper function to mark the inventory of a user as changed by the current request. The inventories of all
+users touched by a request are queued for a rebuild in the background once the request's changes have been
+written.
+"""
+def touch(user_id):
+    if not user_id:
+        return
+    if 'inventory_users' not in g:
+        g.inventory_users = set()
+        uow.after_flush(lambda: rebuilder.add(g.pop('inventory_users', set())))
+    g.inventory_users.add(int(user_id))
+
+
+"""
+Helper function to mark the inventory of the user renting a bike as changed.
+"""
+def touch_bike(bike):
+    if bike and bike.get('rentee'):
+        touch(bike['rentee'])
+
+
+"""
+Helper function to rebuild the inventory of every user. Used to create the inventories of existing users and
+to recover them if they ever drift.
+"""
+def rebuild_all():
+    query = client.query(kind=constants.USERS)
+    query.keys_only()
+    user_ids = [e.key.id for e in query.fetch()]
+    for i in range(0, len(user_ids), constants.INVENTORY_REBUILD_BATCH):
+        rebuild(user_ids[i:i + constants.INVENTORY_REBUILD_BATCH])
+    print("%s: rebuilt %d inventories" % (constants.INVENTORIES, len(user_ids)))
+
+
+if __name__ == '__main__':
+    rebuild_all()
@@ -0,0 +1,139 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import sys
+import constants
+import availability
+import relations
+from db import client
+
+
+BATCH_SIZE = 500        # Largest number of entities Datastore accepts in a single batch
+PAGE_SIZE = 500         # Entities read at a time, so a migration never holds a whole collection in memory
+
+
+"""
+Helper function to save entities in batches.
+"""
+def _put_all(entities):
+    for i in range(0, len(entities), BATCH_SIZE):
+        client.put_multi(entities[i:i + BATCH_SIZE])
+
+
+"""
+Helper function to read the entities of a kind one page of PAGE_SIZE entities at a time.
+"""
+def _pages(kind):
+    query = client.query(kind=kind)
+    cursor = None
+    while True:
+        iterator = query.fetch(limit=PAGE_SIZE, start_cursor=cursor)
+        page = list(next(iterator.pages))
+        if page:
+            yield page
+        cursor = iterator.next_page_token
+        if not cursor or len(page) < PAGE_SIZE:
+            return
+
+
+"""
+Migration that moves the 'specs' arrays embedded in bikes and the 'rental' arrays embedded in users into
+'specs' and 'rentals' child entities, and removes the arrays from the parents. The position of each item in
+its array is stored as the time it was added, so the children keep the order of the array. Parents are read
+and migrated one page at a time, and parents that have already been migrated are skipped, so the migration
+can be run again if it is interrupted.
+"""
+def split_embedded_relations():
+    for kind, prop, to_child in [
+            (constants.BIKES, 'specs', lambda parent, item, added: relations.new_spec(
+                parent.key.id, item['id'], item['description'], added)),
+            (constants.USERS, 'rental', lambda parent, item, added: relations.new_rental(
+                parent.key.id, item['id'], added))]:
+        moved = 0
+        migrated = 0
+        for page in _pages(kind):
+            children = []
+            parents = []
+            for parent in page:
+                if prop not in parent:
+                    continue
+                items = parent.pop(prop) or []
+                if isinstance(items, dict):
+                    items = [items]
+                children.extend(to_child(parent, item, float(i)) for i, item in enumerate(items))
+                parents.append(parent)
+
+            # Save the children before removing the arrays from their parents
+            _put_all(children)
+            _put_all(parents)
+            moved += len(children)
+            migrated += len(parents)
+        print("%s: moved %d '%s' items out of %d entities" % (kind, moved, prop, migrated))
+
+
+"""
+Migration that stores the time each 'specs' and 'rentals' entity was added on the entities created before it
+was stored, so that they are listed in order. Their time is unknown, so they are listed first, by id, and
+the entities added since then follow in the order they were added.
+"""
+def backfill_relation_order():
+    for kind in (constants.SPECS, constants.RENTALS):
+        updated = 0
+        for page in _pages(kind):
+            children = [child for child in page if 'added' not in child]
+            for child in children:
+                child['added'] = 0.0
+            _put_all(children)
+            updated += len(children)
+        print("%s: stored 'added' on %d entities" % (kind, updated))
+
+
+"""
+Migration that stores the 'sub' of the renting user as 'rentee_sub' on bikes that were rented before
+'rentee_sub' was added to the rental of a bike.
+"""
+def backfill_rentee_sub():
+    count = 0
+    for page in _pages(constants.BIKES):
+        bikes = [bike for bike in page if bike['rentee'] and not bike.get('rentee_sub')]
+
+        # Read the users renting the bikes of the page with one lookup
+        user_keys = list({client.key(constants.USERS, int(bike['rentee'])) for bike in bikes})
+        users = {user.key.id: user for user in client.get_multi(user_keys)} if user_keys else {}
+
+        updated = []
+        for bike in bikes:
+            user = users.get(int(bike['rentee']))
+            if user:
+                bike['rentee_sub'] = user['renter_id']
+                bike.exclude_from_indexes.add('rentee_sub')
+                updated.append(bike)
+        _put_all(updated)
+        count += len(updated)
+    print("%s: stored 'rentee_sub' on %d entities" % (constants.BIKES, count))
+
+
+"""
+Migration that counts the available and rented bikes of every type and size for bikes that were created before
+the counts were kept. Run it once when deploying the counts, before '/bikes/available' is used.
+"""
+def backfill_availability_counts():
+    counted = availability.rebuild()
+    print("%s: counted %d types and sizes" % (constants.BIKE_COUNTS, counted))
+
+
+MIGRATIONS = {
+    'split_embedded_relations': split_embedded_relations,
+    'backfill_rentee_sub': backfill_rentee_sub,
+    'backfill_relation_order': backfill_relation_order,
+    'backfill_availability_counts': backfill_availability_counts,
+}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] not in MIGRATIONS:
+        sys.exit("usage: python lib/migrations.py {%s}" % ",".join(MIGRATIONS))
+    MIGRATIONS[sys.argv[1]]()
@@ -0,0 +1,181 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+from db import new_entity
+
+# app_url = "http://127.0.0.1:8080"                                     URL for Local self link
+app_url = "https://portfolio-lohrcl.uc.r.appspot.com"                 # URL for GCP self link
+
+_orders = {}        # Interned property orders, shared by every model stored with the same properties
+
+
+"""
+Helper function to intern the order of a model's properties. Entities of a kind are almost always stored with
+their properties in the same order, so the models read from them share one tuple.
+"""
+def _intern(names):
+    names = tuple(names)
+    return _orders.setdefault(names, names)
+
+
+"""
+Record of a component in the 'specs' of a bike.
+"""
+class Spec(object):
+    __slots__ = ('id', 'description')
+
+    def __init__(self, component_id, description):
+        self.id = component_id
+        self.description = description
+
+    def to_json(self):
+        return {'id': self.id, 'description': self.description,
+                'self': app_url + "/components/" + str(self.id)}
+
+
+"""
+Record of a bike in the 'rental' of a user.
+"""
+class Rental(object):
+    __slots__ = ('id',)
+
+    def __init__(self, bike_id):
+        self.id = bike_id
+
+    def to_json(self):
+        return {'id': self.id, 'self': app_url + "/bikes/" + str(self.id)}
+
+
+"""
+Base of the models the routes read entities into. The stored properties of a model are kept in slots, except
+for properties added with PATCH, which are kept in '_extra'. A model remembers the order its properties were
+stored in and is serialized with its keys in that order followed by its response-only fields in 'tail', so
+responses are the same as those built from the entity itself. Response-only fields are never written back to
+an entity, and properties in 'hidden' are never returned.
+"""
+class Model(object):
+    __slots__ = ('_order', '_extra', '_tail')
+    fields = ()         # Stored properties kept in slots
+    hidden = ()         # Stored properties that are never returned
+    tail = ()           # Response-only fields returned after the stored properties
+    owned = ()          # Properties only the server sets, which requests can't change
+    path = None         # Collection the model's 'self' link points into
+
+    def __init__(self, properties, tail=None, **fields):
+        self._order = _intern(properties)
+        self._extra = None
+        self._tail = tail or self.tail
+        for name in self.__slots__:
+            setattr(self, name, None)
+        for name, value in properties.items():
+            if name in self.fields:
+                setattr(self, name, value)
+            else:
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[name] = value
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    """
+    Creates a model from an entity, with the id of its key and the response-only fields in 'fields'.
+    """
+    @classmethod
+    def from_entity(cls, entity, tail=None, **fields):
+        return cls(entity, tail, id=entity.key.id, **fields)
+
+    def get(self, name, default=None):
+        if name in self.fields:
+            return getattr(self, name)
+        return self._extra.get(name, default) if self._extra else default
+
+    """
+    Returns the stored properties of the model, with nested models converted to their stored form.
+    """
+    def properties(self):
+        data = {}
+        for name in self._order:
+            value = self.get(name)
+            data[name] = value.properties() if isinstance(value, Model) else value
+        return data
+
+    def to_entity(self, key):
+        entity = new_entity(key)
+        entity.update(self.properties())
+        return entity
+
+    def link(self):
+        return app_url + self.path + str(self.id)
+
+    def to_json(self):
+        data = {}
+        for name in self._order:
+            if name not in self.hidden:
+                data[name] = self.get(name)
+        # A stored property with the name of a response-only field keeps its place but not its value
+        for name in self._tail:
+            data[name] = self.link() if name == 'self' else getattr(self, name)
+        return data
+
+
+"""
+Bike a component is installed on, as stored in the 'carrier' of the component.
+"""
+class Carrier(Model):
+    __slots__ = ('id', 'manufacturer')
+    fields = ('id', 'manufacturer')
+    tail = ('self',)
+    path = "/bikes/"
+
+
+"""
+Component with the bike it is installed on as its 'carrier'.
+"""
+class Component(Model):
+    __slots__ = ('manufacturer', 'description', 'condition', 'carrier', 'id')
+    fields = ('manufacturer', 'description', 'condition', 'carrier')
+    tail = ('id', 'self')
+    owned = ('carrier', 'id', 'self')
+    path = "/components/"
+
+    def __init__(self, properties, tail=None, **fields):
+        Model.__init__(self, properties, tail, **fields)
+        if isinstance(self.carrier, dict) and self.carrier:
+            self.carrier = Carrier(self.carrier)
+
+
+"""
+Bike with its 'specs'. The 'sub' of the user renting the bike is stored as 'rentee_sub' but never returned.
+Listings return 'specs' after the bike's id and self link.
+"""
+class Bike(Model):
+    __slots__ = ('manufacturer', 'type', 'model_year', 'bike_size', 'rentee', 'rentee_sub', 'id', 'specs')
+    fields = ('manufacturer', 'type', 'model_year', 'bike_size', 'rentee', 'rentee_sub')
+    hidden = ('rentee_sub',)
+    tail = ('specs', 'id', 'self')
+    LIST_TAIL = ('id', 'self', 'specs')
+    owned = ('rentee', 'rentee_sub', 'specs', 'id', 'self')
+    path = "/bikes/"
+
+
+"""
+User with the bikes in its 'rental'.
+"""
+class User(Model):
+    __slots__ = ('nickname', 'email', 'verified', 'renter_id', 'id', 'rental')
+    fields = ('nickname', 'email', 'verified', 'renter_id')
+    tail = ('rental', 'id', 'self')
+    path = "/users/"
+
+
+"""
+Helper function to serialize models in a JSON response, passed as 'default' to json.dumps. Each model is
+converted to a dict only when it is written, so a page of models is never held as dicts all at once.
+"""
+def to_json(value):
+    if isinstance(value, (Model, Spec, Rental)):
+        return value.to_json()
+    raise TypeError("Object of type %s is not JSON serializable" % type(value).__name__)
@@ -0,0 +1,227 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+from flask import request, g
+from collections import Counter, OrderedDict
+import hmac
+import os
+import secrets
+import sys
+import threading
+import time
+import constants
+
+
+OTHER_STACKS = "[other stacks]"     # Stack that samples are counted under once the limit of stacks is reached
+
+
+"""
+Sampling profiler for the threads that handle requests. While it is running, a background thread takes the
+stack of every thread that is handling a request every PROFILER_INTERVAL seconds and counts each distinct
+stack under the route being handled. The sampler only runs while a profile is being taken, so the only cost
+when it is idle is recording which route each thread is handling. At most PROFILER_MAX_STACKS distinct stacks
+are kept in the profile and in each single-request profile, and later samples of new stacks are counted under
+OTHER_STACKS, so a long profile of varied code can't use unbounded memory.
+"""
+class Profiler(object):
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._routes = {}               # Route handled by each thread, by thread id
+        self._stacks = {}               # Count of each stack sampled in each route
+        self._distinct = 0              # Number of distinct stacks in '_stacks'
+        self._watched = {}              # Stacks sampled in single requests being profiled, by thread id
+        self._saved = OrderedDict()     # Finished single-request profiles, by profile id
+        self._names = {}                # Frame name of each code object
+        self._until = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _frame_name(self, code):
+        name = self._names.get(code)
+        if name is None:
+            name = self._names[code] = "%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename),
+                                                       code.co_firstlineno)
+        return name
+
+    def _collapse(self, frame):
+        names = []
+        while frame is not None:
+            names.append(self._frame_name(frame.f_code))
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _active(self):
+        return time.monotonic() < self._until or bool(self._watched)
+
+    def _ensure_running(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._active():
+                    self._thread = None
+                    return
+            time.sleep(self.interval)
+            self._sample()
+
+    def _sample(self):
+        frames = sys._current_frames()
+        with self._lock:
+            sampling_all = time.monotonic() < self._until
+            for ident, route in self._routes.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = self._collapse(frame)
+                if sampling_all:
+                    counts = self._stacks.setdefault(route, Counter())
+                    counted = stack
+                    if counted not in counts and self._distinct >= constants.PROFILER_MAX_STACKS:
+                        counted = OTHER_STACKS
+                    if counted not in counts:
+                        self._distinct += 1
+                    counts[counted] += 1
+                if ident in self._watched:
+                    counts = self._watched[ident][1]
+                    if stack not in counts and len(counts) >= constants.PROFILER_MAX_STACKS:
+                        stack = OTHER_STACKS
+                    counts[stack] += 1
+
+    """
+    Starts sampling every request for 'seconds' seconds.
+    """
+    def start(self, seconds):
+        with self._lock:
+            self._until = time.monotonic() + seconds
+            self._ensure_running()
+
+    def stop(self):
+        with self._lock:
+            self._until = 0
+
+    def clear(self):
+        with self._lock:
+            self._stacks = {}
+            self._distinct = 0
+
+    def stacks(self, route=None):
+        with self._lock:
+            if route:
+                return {route: Counter(self._stacks.get(route, {}))}
+            return {r: Counter(s) for r, s in self._stacks.items()}
+
+    """
+    Records the route handled by a thread, and starts profiling the request if 'watch' is set. Returns the
+    id of the request's profile, or None.
+    """
+    def begin(self, ident, route, watch=False):
+        with self._lock:
+            self._routes[ident] = route
+            if not watch:
+                return None
+            profile_id = secrets.token_hex(8)
+            self._watched[ident] = (profile_id, Counter())
+            self._ensure_running()
+            return profile_id
+
+    def end(self, ident):
+        with self._lock:
+            route = self._routes.pop(ident, None)
+            watched = self._watched.pop(ident, None)
+            if watched:
+                profile_id, stacks = watched
+                self._saved[profile_id] = (route, stacks)
+                while len(self._saved) > constants.PROFILER_MAX_SAVED:
+                    self._saved.popitem(last=False)
+
+    def saved(self, profile_id):
+        with self._lock:
+            return self._saved.get(profile_id)
+
+
+profiler = Profiler(constants.PROFILER_INTERVAL)
+
+
+"""
+Helper function to name the route of the current request, as used to group samples.
+"""
+def request_route():
+    return "%s %s" % (request.method, request.url_rule.rule if request.url_rule else request.path)
+
+
+"""
+Helper function to format sampled stacks in the collapsed format read by flame graph tools, one stack per
+line with the route as the outermost frame.
+"""
+def collapsed(stacks):
+    lines = []
+    for route, counts in sorted(stacks.items()):
+        for stack, count in counts.most_common():
+            lines.append("%s;%s %d" % (route, stack, count))
+    return "\n".join(lines) + "\n"
+
+
+"""
+Helper function to format sampled stacks as a speedscope profile with one sampled profile per route.
+"""
+def speedscope(stacks, interval):
+    frames = []
+    index = {}
+    profiles = []
+    for route, counts in sorted(stacks.items()):
+        samples = []
+        weights = []
+        for stack, count in counts.items():
+            ids = []
+            for name in stack.split(";"):
+                if name not in index:
+                    index[name] = len(frames)
+                    frames.append({'name': name})
+                ids.append(index[name])
+            samples.append(ids)
+            weights.append(count * interval)
+        profiles.append({'type': 'sampled', 'name': route, 'unit': 'seconds', 'startValue': 0,
+                         'endValue': sum(weights), 'samples': samples, 'weights': weights})
+    return {'$schema': 'https://www.speedscope.app/file-format-schema.json', 'shared': {'frames': frames},
+            'profiles': profiles, 'name': 'portfolio', 'exporter': 'profiler'}
+
+
+"""
+Helper functions to record the route handled by each request thread, and to profile single requests that
+send the PROFILER_TOKEN in their 'X-Profile' header. The id of a request's profile is returned in its
+'X-Profile-Id' header.
+"""
+def _begin():
+    token = request.headers.get('X-Profile')
+    watch = bool(constants.PROFILER_TOKEN and token
+                 and hmac.compare_digest(token.encode(), constants.PROFILER_TOKEN.encode()))
+    g.profile_id = profiler.begin(threading.get_ident(), request_route(), watch)
+
+
+def _respond(res):
+    if g.get('profile_id'):
+        res.headers['X-Profile-Id'] = g.profile_id
+    return res
+
+
+def _end(exc):
+    profiler.end(threading.get_ident())
+
+
+"""
+Helper function to add the profiler to the Flask application. Sampling starts right away for
+PROFILER_START_SECONDS seconds when it is set.
+"""
+def init_app(app):
+    app.before_request(_begin)
+    app.after_request(_respond)
+    app.teardown_request(_end)
+    if constants.PROFILER_START_SECONDS:
+        profiler.start(constants.PROFILER_START_SECONDS)
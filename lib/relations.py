@@ -0,0 +1,161 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import time
+import constants
+import consistency
+import singleflight
+from db import client, new_entity
+from models import Spec, Rental
+
+
+IN_LIMIT = 30           # Largest number of values Datastore accepts in an 'IN' filter
+
+
+"""
+Helper function to get the key of the 'specs' entity recording that a component is installed on a bike.
+Spec entities are children of the bike, with the id of the installed component.
+"""
+def spec_key(bike_id, component_id):
+    return client.key(constants.BIKES, int(bike_id), constants.SPECS, int(component_id))
+
+
+"""
+Helper function to create the 'specs' entity for a component installed on a bike. 'added' is the time the
+component was installed, which orders the bike's 'specs'.
+"""
+def new_spec(bike_id, component_id, description, added=None):
+    spec = new_entity(spec_key(bike_id, component_id))
+    spec.update({'bike_id': int(bike_id), 'description': description,
+                 'added': time.time() if added is None else added})
+    return spec
+
+
+"""
+Helper function to get the key of the 'rentals' entity recording that a bike is rented by a user. Rental
+entities are children of the user, with the id of the rented bike.
+"""
+def rental_key(user_id, bike_id):
+    return client.key(constants.USERS, int(user_id), constants.RENTALS, int(bike_id))
+
+
+"""
+Helper function to create the 'rentals' entity for a bike rented by a user. 'added' is the time the bike was
+rented, which orders the user's 'rental'.
+"""
+def new_rental(user_id, bike_id, added=None):
+    rental = new_entity(rental_key(user_id, bike_id))
+    rental.update({'user_id': int(user_id), 'added': time.time() if added is None else added})
+    return rental
+
+
+"""
+Helper function to create the entry in the rental history recording that a bike was rented or returned.
+The type and size of the bike are copied so that the history can be reported on after the bike is deleted.
+"""
+def new_rental_event(action, bike, user_id):
+    event = new_entity(client.key(constants.RENTAL_EVENTS))
+    event.update({'action': action, 'bike_id': bike.key.id, 'user_id': int(user_id), 'type': bike['type'],
+                  'bike_size': bike['bike_size'], 'ts': time.time()})
+    event.exclude_from_indexes.update(['action', 'bike_id', 'user_id', 'type', 'bike_size'])
+    return event
+
+
+"""
+Helper function to read a 'specs' entity into the record that appears in the 'specs' array of a bike.
+"""
+def spec_data(spec):
+    return Spec(spec.key.id, spec['description'])
+
+
+"""
+Helper function to read a 'rentals' entity into the record that appears in the 'rental' array of a user.
+"""
+def rental_data(rental):
+    return Rental(rental.key.id)
+
+
+"""
+Helper function to sort children in the order they were added to their parent. Children added at the same
+time are sorted by id.
+"""
+def _added_order(children):
+    return sorted(children, key=lambda c: (c.get('added', 0), c.key.id))
+
+
+"""
+Helper function to fetch the children of many parents with as few queries as possible, grouped by the id
+of the parent, in the order they were added.
+"""
+def _group_children(kind, parent_property, parent_ids, to_data):
+    grouped = {int(parent_id): [] for parent_id in parent_ids}
+    ids = list(grouped)
+    for i in range(0, len(ids), IN_LIMIT):
+        query = client.query(kind=kind)
+        query.add_filter(parent_property, 'IN', ids[i:i + IN_LIMIT])
+        for child in query.fetch(eventual=consistency.eventual()):
+            grouped[child[parent_property]].append(child)
+    return {parent_id: [to_data(c) for c in _added_order(children)]
+            for parent_id, children in grouped.items()}
+
+
+"""
+Helper function to get the 'specs' arrays of several bikes, keyed by bike id.
+"""
+def get_specs(bike_ids):
+    return _group_children(constants.SPECS, 'bike_id', bike_ids, spec_data)
+
+
+"""
+Helper function to get the 'rental' arrays of several users, keyed by user id. Without user ids the
+rentals of every user are fetched with a single query.
+"""
+def get_rentals(user_ids=None):
+    if user_ids is not None:
+        return _group_children(constants.RENTALS, 'user_id', user_ids, rental_data)
+    grouped = {}
+    for rental in client.query(kind=constants.RENTALS).fetch(eventual=consistency.eventual()):
+        grouped.setdefault(rental['user_id'], []).append(rental)
+    return {user_id: [rental_data(r) for r in _added_order(rentals)] for user_id, rentals in grouped.items()}
+
+
+"""
+Helper function to list the children of a parent one page at a time, in the order they were added. Returns
+the page and the cursor for the next page, or None if this is the last page. Without a limit every child is
+returned. Concurrent requests for the same page share one query.
+"""
+def _page_children(kind, parent_key, to_data, limit=None, cursor=None):
+    return singleflight.group.do(('children', kind, parent_key.flat_path, limit, cursor),
+                                 lambda: _query_children(kind, parent_key, to_data, limit, cursor))
+
+
+def _query_children(kind, parent_key, to_data, limit, cursor):
+    query = client.query(kind=kind, ancestor=parent_key)
+    query.order = ['added']
+    if limit is None:
+        return [to_data(c) for c in query.fetch(eventual=consistency.eventual())], None
+    iterator = query.fetch(limit=limit, start_cursor=cursor.encode() if cursor else None,
+                           eventual=consistency.eventual())
+    page = [to_data(c) for c in next(iterator.pages)]
+    next_cursor = None
+    if iterator.next_page_token and len(page) == limit:
+        next_cursor = iterator.next_page_token.decode()
+    return page, next_cursor
+
+
+"""
+Helper function to list the components installed on a bike one page at a time.
+"""
+def page_specs(bike_id, limit=None, cursor=None):
+    return _page_children(constants.SPECS, client.key(constants.BIKES, int(bike_id)), spec_data, limit, cursor)
+
+
+"""
+Helper function to list the bikes rented by a user one page at a time.
+"""
+def page_rentals(user_id, limit=None, cursor=None):
+    return _page_children(constants.RENTALS, client.key(constants.USERS, int(user_id)), rental_data,
+                          limit, cursor)
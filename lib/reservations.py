@@ -0,0 +1,237 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+from flask import g
+from bisect import bisect_left
+from datetime import datetime, timezone
+import logging
+import threading
+import time
+import constants
+import uow
+from db import client, new_entity
+
+
+"""
+Helper function to get the key of a reservation of a bike. Reservations are children of the bike they
+reserve, so the reservations of a bike can be read together in the transaction that books a new one.
+"""
+def reservation_key(bike_id, reservation_id=None):
+    if reservation_id is None:
+        return client.key(constants.BIKES, int(bike_id), constants.RESERVATIONS)
+    return client.key(constants.BIKES, int(bike_id), constants.RESERVATIONS, int(reservation_id))
+
+
+"""
+Helper function to create a reservation of a bike for the user with 'sub' from 'start' to 'end', given in
+seconds since the epoch. Its id is allocated right away, so it can be returned before it is saved.
+"""
+def new_reservation(bike, sub, start, end):
+    reservation = new_entity(client.allocate_ids(reservation_key(bike.key.id), 1)[0])
+    reservation.update({'renter_id': sub, 'start': start, 'end': end})
+    reservation.exclude_from_indexes.add('renter_id')
+    return reservation
+
+
+"""
+Helper function to read an ISO 8601 time as seconds since the epoch. Times without a time zone are UTC.
+Returns None if the time can't be read.
+"""
+def parse_time(value):
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+"""
+Helper function to format seconds since the epoch as an ISO 8601 time in UTC.
+"""
+def format_time(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+"""
+Reservations of one bike as sorted arrays of starts and ends. Reservations of a bike never overlap, so the
+ends are sorted as well and a new period can be checked against every reservation with one binary search:
+only the last reservation starting before the new period ends can overlap it.
+"""
+class Schedule(object):
+
+    def __init__(self, reservations=()):
+        periods = sorted((r['start'], r['end']) for r in reservations)
+        self.starts = [p[0] for p in periods]
+        self.ends = [p[1] for p in periods]
+
+    def overlaps(self, start, end):
+        i = bisect_left(self.starts, end) - 1
+        return i >= 0 and self.ends[i] > start
+
+
+"""
+Helper function to read the upcoming reservations of a bike. Inside a transaction the reservations are read
+as part of the transaction, so a booking that would overlap a reservation made at the same time fails.
+"""
+def get_reservations(bike_id):
+    now = time.time()
+    query = client.query(kind=constants.RESERVATIONS, ancestor=client.key(constants.BIKES, int(bike_id)))
+    return sorted((r for r in query.fetch() if r['end'] > now), key=lambda r: r['start'])
+
+
+"""
+Type, size and rentee of each bike, the ids of the bikes of each type and size and the schedule of each bike
+with upcoming reservations.
+"""
+class _Fleet(object):
+
+    def __init__(self):
+        self.bikes = {}             # Type, size and rentee of each bike
+        self.groups = {}            # Ids of the bikes of each type and size
+        self.schedules = {}         # Schedule of each bike with upcoming reservations
+
+    def set_bike(self, bike_id, bike, reservations):
+        old = self.bikes.pop(bike_id, None)
+        if old:
+            self.groups[old[:2]].discard(bike_id)
+        self.schedules.pop(bike_id, None)
+        if bike:
+            self.bikes[bike_id] = (bike['type'], bike['bike_size'], bike['rentee'])
+            self.groups.setdefault((bike['type'], bike['bike_size']), set()).add(bike_id)
+            if reservations:
+                self.schedules[bike_id] = Schedule(reservations)
+
+    def free(self, bike_type, bike_size, start, end, now):
+        free = []
+        for bike_id in self.groups.get((bike_type, bike_size), ()):
+            schedule = self.schedules.get(bike_id)
+            if schedule and schedule.overlaps(start, end):
+                continue
+            if start <= now and self.bikes[bike_id][2]:
+                continue
+            free.append(bike_id)
+        return sorted(free)
+
+
+"""
+Index of the bikes of each type and size and the schedule of each bike, used to find the bikes that are free
+for a period across the whole fleet without reading any reservations. The index is built in a background
+thread when the instance is warmed up or first searched and rebuilt every RESERVATION_INDEX_TTL seconds. In
+between, the bikes changed by requests on this instance are read again as soon as the changes are written,
+and changes made on other instances are picked up by the next rebuild.
+Datastore is only read by the background thread, and the lock is only held to swap in a new index or apply a
+change already read.
+Bookings are always checked again in a transaction, so a result that is a moment out of date can't cause a
+double reservation.
+"""
+class FleetIndex(object):
+
+    def __init__(self):
+        self._fleet = _Fleet()
+        self._changed = set()       # Ids of the bikes changed on this instance that haven't been read again
+        self._reload = False        # Whether the index is rebuilt without waiting for RESERVATION_INDEX_TTL
+        self._thread = None
+        self._lock = threading.Condition()
+        self.ready = threading.Event()
+
+    """
+    Builds a new index from a scan of every bike and upcoming reservation and replaces the current index
+    with it. Bikes changed during the scan stay marked as changed, so they are read again afterwards.
+    """
+    def _load(self):
+        with self._lock:
+            self._changed = set()
+            self._reload = False
+
+        fleet = _Fleet()
+        query = client.query(kind=constants.RESERVATIONS)
+        query.add_filter('end', '>', time.time())
+        reservations = {}
+        for reservation in query.fetch():
+            reservations.setdefault(reservation.key.parent.id, []).append(reservation)
+        for bike in client.query(kind=constants.BIKES).fetch():
+            fleet.set_bike(bike.key.id, bike, reservations.get(bike.key.id))
+        with self._lock:
+            self._fleet = fleet
+        self.ready.set()
+
+    """
+    Reads the bikes changed on this instance again until the index is due to be rebuilt. The bikes are read
+    before the lock is taken to apply them.
+    """
+    def _follow(self):
+        rebuild_at = time.monotonic() + constants.RESERVATION_INDEX_TTL
+        while True:
+            with self._lock:
+                while not self._changed and not self._reload:
+                    timeout = rebuild_at - time.monotonic()
+                    if timeout <= 0:
+                        return
+                    self._lock.wait(timeout)
+                if self._reload:
+                    return
+                bike_ids, self._changed = self._changed, set()
+            changes = [(bike_id, client.get(key=client.key(constants.BIKES, bike_id)), get_reservations(bike_id))
+                       for bike_id in bike_ids]
+            with self._lock:
+                for change in changes:
+                    self._fleet.set_bike(*change)
+
+    def _run(self):
+        while True:
+            try:
+                self._load()
+                self._follow()
+            except Exception:
+                logging.exception("Building the reservation index failed")
+                time.sleep(constants.RESERVATION_INDEX_RETRY)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    """
+    Marks bikes as changed, so they are read again. Does nothing until the index is started.
+    """
+    def invalidate(self, bike_ids):
+        with self._lock:
+            if self._thread is not None:
+                self._changed.update(bike_ids)
+                self._lock.notify()
+
+    """
+    Rebuilds the index without waiting for RESERVATION_INDEX_TTL, e.g. after every bike has been deleted.
+    """
+    def reload(self):
+        with self._lock:
+            self._reload = True
+            self._lock.notify()
+
+    """
+    Returns the ids of the bikes of a type and size that have no reservation overlapping [start, end). Bikes
+    that are rented now are only free for periods that start later.
+    """
+    def free(self, bike_type, bike_size, start, end):
+        with self._lock:
+            return self._fleet.free(bike_type, bike_size, start, end, time.time())
+
+
+fleet = FleetIndex()
+
+
+"""
+Helper function to mark a bike as changed by the current request. The index reads the bikes changed by a
+request again once the request's changes have been written.
+"""
+def touch(bike_id):
+    if 'fleet_bikes' not in g:
+        g.fleet_bikes = set()
+        uow.after_flush(lambda: fleet.invalidate(g.pop('fleet_bikes', set())))
+    g.fleet_bikes.add(int(bike_id))
@@ -0,0 +1,201 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import heapq
+import logging
+import re
+import threading
+import time
+import constants
+import uow
+from db import client
+
+
+TOKEN = re.compile(r'[0-9a-z]+')
+
+# Properties of a component that are searched and the score of a match in each. A match of a whole word scores
+# one more than a match of the start of a word.
+FIELDS = (('manufacturer', 2), ('description', 1))
+
+
+"""
+Helper function to split a text into the lower case words it is searched by.
+"""
+def tokenize(text):
+    return TOKEN.findall(str(text).lower()) if text is not None else []
+
+
+"""
+Helper function to list the prefixes a component can be found by, with the best score of each.
+"""
+def _prefixes(manufacturer, description):
+    scores = {}
+    for (_, weight), text in zip(FIELDS, (manufacturer, description)):
+        for token in tokenize(text):
+            for n in range(1, min(len(token), constants.SEARCH_PREFIX_LENGTH) + 1):
+                score = weight + (1 if n == len(token) else 0)
+                if scores.get(token[:n], 0) < score:
+                    scores[token[:n]] = score
+    return scores
+
+
+"""
+Searched text of the components and the components that start a word with each prefix of up to
+SEARCH_PREFIX_LENGTH characters, with the score of the match.
+"""
+class _Tables(object):
+
+    def __init__(self):
+        self.docs = {}              # Manufacturer and description of each component, by id
+        self.prefixes = {}          # Score of each component that has a word starting with each prefix
+
+    def put(self, component_id, manufacturer, description):
+        self.remove(component_id)
+        self.docs[component_id] = (manufacturer, description)
+        for prefix, score in _prefixes(manufacturer, description).items():
+            self.prefixes.setdefault(prefix, {})[component_id] = score
+
+    def remove(self, component_id):
+        doc = self.docs.pop(component_id, None)
+        if doc is None:
+            return
+        for prefix in _prefixes(*doc):
+            postings = self.prefixes[prefix]
+            del postings[component_id]
+            if not postings:
+                del self.prefixes[prefix]
+
+
+"""
+In-memory index of the manufacturer and description of every component, used to search the catalogue as the
+user types. A component matches when every word of the query starts one of its words, and matches on the
+manufacturer and on whole words rank first. The index is built from a scan of the '/components' collection
+when the instance is warmed up or first searched and rebuilt every SEARCH_REBUILD_INTERVAL seconds, and the
+changes made by this instance are applied as soon as they are written. Changes made during a rebuild are
+applied again to the new index, so none are lost when it replaces the old one. A rebuild that is running when
+the index is cleared is discarded, so it can't bring back the components it read before they were deleted.
+"""
+class SearchIndex(object):
+
+    def __init__(self):
+        self._tables = _Tables()
+        self._pending = None        # Changes made during a rebuild, applied again once it finishes
+        self._generation = 0        # Number of times the index has been cleared
+        self._thread = None
+        self._lock = threading.Lock()
+        self.ready = threading.Event()
+
+    def _change(self, change):
+        with self._lock:
+            self._apply(self._tables, change)
+            if self._pending is not None:
+                self._pending.append(change)
+
+    @staticmethod
+    def _apply(tables, change):
+        if change[0] == 'put':
+            tables.put(*change[1:])
+        else:
+            tables.remove(change[1])
+
+    def put(self, component_id, manufacturer, description):
+        self._change(('put', int(component_id), manufacturer, description))
+
+    def remove(self, component_id):
+        self._change(('remove', int(component_id)))
+
+    def clear(self):
+        with self._lock:
+            self._tables = _Tables()
+            self._generation += 1
+            if self._pending is not None:
+                self._pending = []
+
+    """
+    Builds a new index from a scan of the '/components' collection, read one page at a time, and replaces
+    the current index with it.
+    """
+    def rebuild(self):
+        with self._lock:
+            self._pending = []
+            generation = self._generation
+        try:
+            tables = _Tables()
+            for component in client.query(kind=constants.COMPONENTS).fetch():
+                tables.put(component.key.id, component.get('manufacturer'), component.get('description'))
+            with self._lock:
+                if self._generation == generation:
+                    for change in self._pending:
+                        self._apply(tables, change)
+                    self._tables = tables
+        finally:
+            with self._lock:
+                self._pending = None
+        self.ready.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.rebuild()
+            except Exception:
+                logging.exception("Building the component search index failed")
+            time.sleep(constants.SEARCH_REBUILD_INTERVAL)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    """
+    Returns up to 'limit' (score, id, manufacturer, description) tuples of the components matching the query,
+    best first.
+    """
+    def search(self, query, limit):
+        terms = tokenize(query[:constants.SEARCH_MAX_QUERY_LENGTH])[:constants.SEARCH_MAX_TERMS]
+        if not terms:
+            return []
+        with self._lock:
+            tables = self._tables
+            postings = sorted((tables.prefixes.get(term[:constants.SEARCH_PREFIX_LENGTH], {}) for term in terms),
+                              key=len)
+            long_terms = [term for term in terms if len(term) > constants.SEARCH_PREFIX_LENGTH]
+            if len(postings) == 1 and not long_terms:
+                scores = postings[0]
+            else:
+                scores = {}
+                for component_id, score in postings[0].items():
+                    for other in postings[1:]:
+                        if component_id not in other:
+                            break
+                        score += other[component_id]
+                    else:
+                        scores[component_id] = score
+
+            # Words longer than the indexed prefixes are checked against the text of the matching components
+            if long_terms:
+                for component_id in list(scores):
+                    words = tokenize(" ".join(str(text) for text in tables.docs[component_id] if text is not None))
+                    if not all(any(w.startswith(term) for w in words) for term in long_terms):
+                        del scores[component_id]
+
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+            return [(score, component_id) + tables.docs[component_id] for component_id, score in best]
+
+
+index = SearchIndex()
+
+
+"""
+Helper functions to update the index once the changes of the current request have been written.
+"""
+def put(component_id, component):
+    uow.after_flush(lambda: index.put(component_id, component.get('manufacturer'), component.get('description')))
+
+
+def remove(component_id):
+    uow.after_flush(lambda: index.remove(component_id))
+
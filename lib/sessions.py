@@ -0,0 +1,156 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import Signer, BadSignature
+from werkzeug.datastructures import CallbackDict
+from datetime import datetime, timezone
+import secrets
+import threading
+import time
+import json
+import constants
+from db import client, new_entity
+
+
+"""
+Session object whose contents are kept in a session store. Only the session id is sent to the browser.
+"""
+class ServerSession(CallbackDict, SessionMixin):
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super(ServerSession, self).__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+"""
+Session store that keeps sessions in the memory of the instance. Used for local development and testing,
+sessions are lost when the instance shuts down and are not shared between instances.
+"""
+class MemorySessionStore(object):
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry and entry[1] <= time.time():
+                del self._sessions[sid]
+                entry = None
+        return entry[0] if entry else None
+
+    def set(self, sid, data, expires_at):
+        with self._lock:
+            self._sessions[sid] = (data, expires_at)
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+
+"""
+Session store that keeps sessions in the 'sessions' collection in Datastore, keyed by session id. The
+'expires' property can be used as the field of a Datastore TTL policy so that abandoned sessions are
+removed automatically.
+"""
+class DatastoreSessionStore(object):
+
+    def get(self, sid):
+        session_key = client.key(constants.SESSIONS, sid)
+        entity = client.get(key=session_key)
+        if not entity:
+            return None
+        if entity['expires'].timestamp() <= time.time():
+            client.delete(session_key)
+            return None
+        return json.loads(entity['data'])
+
+    def set(self, sid, data, expires_at):
+        entity = new_entity(client.key(constants.SESSIONS, sid))
+        entity.exclude_from_indexes.add('data')
+        entity.update({'data': json.dumps(data),
+                       'expires': datetime.fromtimestamp(expires_at, tz=timezone.utc)})
+        client.put(entity)
+
+    def delete(self, sid):
+        client.delete(client.key(constants.SESSIONS, sid))
+
+
+"""
+Flask session interface that stores the session in a session store and keeps only a signed session id in
+the session cookie. A session expires when the OAuth token saved in it expires, or after the
+application's permanent session lifetime if it holds no token.
+"""
+class ServerSessionInterface(SessionInterface):
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-session')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                data = self.store.get(sid)
+                if data is not None:
+                    return ServerSession(data, sid=sid)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        # Remove the stored session and the cookie once the session has been cleared
+        if not session:
+            if session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        expires_at = _expires_at(app, session)
+        self.store.set(session.sid, dict(session), expires_at)
+        response.set_cookie(name, self._signer(app).sign(session.sid).decode(),
+                            expires=expires_at if session.permanent else None,
+                            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+
+
+"""
+Helper function to get the time at which a session expires, as seconds since the epoch.
+"""
+def _expires_at(app, session):
+    token = session.get('user')
+    if isinstance(token, dict) and token.get('expires_at'):
+        return float(token['expires_at'])
+    return time.time() + app.permanent_session_lifetime.total_seconds()
+
+
+"""
+Helper function to create the session interface for the backend named by constants.SESSION_BACKEND.
+Returns None when server-side sessions are disabled and Flask's cookie sessions should be used.
+"""
+def make_session_interface(backend):
+    if backend == "memory":
+        return ServerSessionInterface(MemorySessionStore())
+    if backend == "datastore":
+        return ServerSessionInterface(DatastoreSessionStore())
+    return None
@@ -0,0 +1,149 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import copy
+import threading
+import time
+import constants
+import consistency
+from db import client
+
+
+"""
+Datastore call that is in flight. Requests that need the same result while it is in flight wait for it
+instead of making the same call again.
+"""
+class _Call(object):
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+"""
+Coalesces concurrent identical Datastore reads on an instance. The first request to make a read runs it and
+requests that make the same read while it is in flight share its result. Each waiter receives its own copy,
+so requests can change the entities they get back. A request only joins reads that started after the request
+itself did, so it never gets a result read before a write that finished before it began, such as the
+caller's own last write. A waiter stops waiting after SINGLEFLIGHT_WAIT seconds and makes the read itself.
+Reads inside a transaction are never shared.
+"""
+class Group(object):
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'shared': 0, 'timeouts': 0}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.stats[name] += n
+
+    def _join(self, flight_keys):
+        # Returns the calls this request leads and the calls of other requests it waits for. A call that
+        # started before this request is left to its own waiters and replaced by a new one.
+        since = consistency.request_started()
+        lead, follow = {}, {}
+        with self._lock:
+            for flight_key in flight_keys:
+                call = self._calls.get(flight_key)
+                if call and call.started >= since:
+                    call.waiters += 1
+                    follow[flight_key] = call
+                else:
+                    lead[flight_key] = self._calls[flight_key] = _Call()
+            self.stats['calls'] += len(lead)
+        return lead, follow
+
+    def _finish(self, flight_key, call, result=None, error=None):
+        # No request can join the call once it is removed, so its waiters are known
+        with self._lock:
+            if self._calls.get(flight_key) is call:
+                del self._calls[flight_key]
+        call.result = copy.deepcopy(result) if call.waiters else result
+        call.error = error
+        call.done.set()
+
+    def _wait(self, call):
+        if not call.done.wait(constants.SINGLEFLIGHT_WAIT):
+            self._count('timeouts')
+            return False, None
+        if call.error:
+            raise call.error
+        self._count('shared')
+        return True, copy.deepcopy(call.result)
+
+    """
+    Returns the result of fn(), sharing it with the concurrent requests that ask for the same 'flight_key'.
+    Eventually consistent reads are only shared with each other.
+    """
+    def do(self, flight_key, fn):
+        if client.current_transaction is not None:
+            return fn()
+        flight_key = (flight_key, consistency.eventual())
+        lead, follow = self._join([flight_key])
+        if follow:
+            shared, result = self._wait(follow[flight_key])
+            return result if shared else fn()
+        try:
+            result = fn()
+        except Exception as error:
+            self._finish(flight_key, lead[flight_key], error=error)
+            raise
+        self._finish(flight_key, lead[flight_key], result)
+        return result
+
+    """
+    Returns the entities with the given keys, keyed by key, with None for keys that don't exist. Keys that
+    are already being read by other requests are shared, and the rest are read with one get_multi.
+    """
+    def get_multi(self, keys):
+        if client.current_transaction is not None:
+            return _get_multi(keys)
+        eventual = consistency.eventual()
+        lead, follow = self._join([(key, eventual) for key in keys])
+        found = {}
+        if lead:
+            try:
+                found = _get_multi([key for key, _ in lead], eventual)
+            except Exception as error:
+                for flight_key, call in lead.items():
+                    self._finish(flight_key, call, error=error)
+                raise
+            for flight_key, call in lead.items():
+                self._finish(flight_key, call, found[flight_key[0]])
+
+        # Read the keys whose calls took too long again
+        retry = []
+        for (key, _), call in follow.items():
+            shared, entity = self._wait(call)
+            if shared:
+                found[key] = entity
+            else:
+                retry.append(key)
+        if retry:
+            found.update(_get_multi(retry, eventual))
+        return found
+
+
+"""
+Helper function to read entities with one get_multi, keyed by key with None for keys that don't exist. A
+sample of the eventually consistent reads is passed to the staleness probe.
+"""
+def _get_multi(keys, eventual=False):
+    missing = []
+    found = {key: None for key in keys}
+    for entity in client.get_multi(keys, missing=missing, eventual=eventual):
+        found[entity.key] = entity
+    if eventual:
+        consistency.probe.sample(keys, found)
+    return found
+
+
+group = Group()
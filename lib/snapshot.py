@@ -0,0 +1,182 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+import gzip
+import json
+import sys
+import zlib
+import constants
+import availability
+import inventory
+import migrations
+from db import client, new_entity
+
+
+BATCH_SIZE = 500        # Largest number of entities Datastore accepts in a single batch
+
+# Kinds included in a snapshot. Bike counts and inventories are derived from these and rebuilt on import
+KINDS = [constants.USERS, constants.BIKES, constants.COMPONENTS, constants.SPECS, constants.RENTALS,
+         constants.RENTAL_EVENTS, constants.RESERVATIONS]
+
+
+"""
+Helper functions to convert property values that JSON has no type for, which are only datetimes here.
+"""
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    raise TypeError("%r cannot be exported" % (value,))
+
+
+def _decode(value):
+    if '__datetime__' in value:
+        return datetime.fromisoformat(value['__datetime__'])
+    return value
+
+
+"""
+Helper function to format an entity as one line of NDJSON. The full key path is kept so that ids and the
+parents of 'specs' and 'rentals' children are restored exactly.
+"""
+def to_line(entity):
+    return json.dumps({'key': list(entity.key.flat_path), 'exclude': sorted(entity.exclude_from_indexes),
+                       'properties': dict(entity)}, default=_encode) + "\n"
+
+
+"""
+Helper function to create an entity from one line of NDJSON, given as text or bytes.
+"""
+def from_line(line):
+    data = json.loads(line, object_hook=_decode)
+    entity = new_entity(client.key(*data['key']))
+    entity.exclude_from_indexes.update(data.get('exclude', []))
+    entity.update(data['properties'])
+    return entity
+
+
+"""
+Helper function to export every entity of the given kinds as lines of NDJSON. Each kind is read a page at a
+time with query cursors, so only one page of entities is held in memory however large the kind is.
+"""
+def export(kinds=None):
+    for kind in kinds or KINDS:
+        cursor = None
+        while True:
+            query = client.query(kind=kind)
+            results = query.fetch(limit=constants.SNAPSHOT_PAGE_SIZE, start_cursor=cursor)
+            page = list(next(results.pages))
+            for entity in page:
+                yield to_line(entity)
+            cursor = results.next_page_token
+            if not page or not cursor:
+                break
+
+
+"""
+Helper function to gzip a stream of NDJSON lines, yielding the compressed bytes as they are produced.
+"""
+def compress(lines):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for line in lines:
+        chunk = compressor.compress(line.encode('utf-8'))
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+"""
+Helper function to save one batch of imported entities. Their ids are reserved first so that Datastore
+never allocates them to new entities.
+"""
+def _save_batch(entities):
+    reserved = [e.key for e in entities if e.key.id is not None]
+    if reserved:
+        client.reserve_ids_multi(reserved)
+    client.put_multi(entities)
+
+
+"""
+Helper function to import lines of NDJSON created by export(). Entities keep their ids and are saved in
+batches of BATCH_SIZE, with up to SNAPSHOT_IMPORT_WORKERS batches being saved at the same time. Only a few
+batches are held in memory at once, so snapshots of any size can be imported.
+
+Once every entity is saved the bike counts and inventories are rebuilt. Snapshots taken before relationships
+were stored as child entities are migrated as well. Returns the number of entities imported of each kind.
+"""
+def load(lines):
+    counts = {}
+    embedded = False
+    missing_sub = False
+    unordered = False
+    batch = []
+    pending = set()
+
+    with ThreadPoolExecutor(max_workers=constants.SNAPSHOT_IMPORT_WORKERS) as executor:
+        def submit(entities):
+            # Wait for a batch to finish before queuing more than two batches per worker
+            while len(pending) >= 2 * constants.SNAPSHOT_IMPORT_WORKERS:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    future.result()
+            pending.add(executor.submit(_save_batch, entities))
+
+        for line in lines:
+            if not line.strip():
+                continue
+            entity = from_line(line)
+            kind = entity.key.kind
+            counts[kind] = counts.get(kind, 0) + 1
+            embedded = embedded or 'specs' in entity or 'rental' in entity
+            missing_sub = missing_sub or (kind == constants.BIKES and bool(entity.get('rentee'))
+                                          and not entity.get('rentee_sub'))
+            unordered = unordered or (kind in (constants.SPECS, constants.RENTALS) and 'added' not in entity)
+            batch.append(entity)
+            if len(batch) == BATCH_SIZE:
+                submit(batch)
+                batch = []
+        if batch:
+            submit(batch)
+        for future in pending:
+            future.result()
+
+    # Rebuild the relationships and the data derived from the imported entities
+    if embedded:
+        migrations.split_embedded_relations()
+    if missing_sub:
+        migrations.backfill_rentee_sub()
+    if unordered:
+        migrations.backfill_relation_order()
+    availability.rebuild()
+    inventory.rebuild_all()
+    return counts
+
+
+"""
+Helper function to open a snapshot file, gzipped if its name ends with '.gz'. '-' is standard input or
+output.
+"""
+def _open(path, mode):
+    if path == '-':
+        return sys.stdout if 'w' in mode else sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] not in ('export', 'import'):
+        sys.exit("usage: python lib/snapshot.py export <file> [kind ...]\n"
+                 "       python lib/snapshot.py import <file>")
+    if sys.argv[1] == 'export':
+        with _open(sys.argv[2], 'w') as f:
+            f.writelines(export(sys.argv[3:]))
+    else:
+        with _open(sys.argv[2], 'r') as f:
+            for kind, count in load(f).items():
+                print("%s: imported %d entities" % (kind, count))
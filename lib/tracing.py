@@ -0,0 +1,303 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+from flask import request, g
+from six.moves.urllib.request import urlopen, Request
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+import constants
+
+
+# Span kinds of the OpenTelemetry protocol
+INTERNAL = 1
+SERVER = 2
+CLIENT = 3
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_current = contextvars.ContextVar('span', default=None)      # Span of the code that is running
+
+
+"""
+Spans recorded for one request. The trace id and the sampling decision come from the incoming
+'traceparent' header when there is one.
+"""
+class Trace(object):
+
+    def __init__(self, trace_id, sampled):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans = []
+
+
+"""
+Timed stage of a request. Spans are used as context managers, and spans started inside another span are
+recorded as its children.
+"""
+class Span(object):
+
+    def __init__(self, trace, name, parent_id, kind=INTERNAL, attributes=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.error = None
+        self.start = time.time_ns()
+        self.end = None
+        self._token = None
+        trace.spans.append(self)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.time_ns()
+        if exc is not None:
+            self.error = repr(exc)
+        _current.reset(self._token)
+        return False
+
+    def traceparent(self):
+        return "00-%s-%s-%s" % (self.trace.trace_id, self.span_id, "01" if self.trace.sampled else "00")
+
+
+"""
+Helper function to start a span named 'name' as a child of the running span. Outside of a traced request
+nothing is recorded.
+"""
+def span(name, kind=INTERNAL, **attributes):
+    parent = _current.get()
+    if parent is None:
+        return contextlib.nullcontext()
+    return Span(parent.trace, name, parent.span_id, kind, attributes)
+
+
+"""
+Decorator that records every call of a function as a span named 'name'.
+"""
+def traced(name, kind=INTERNAL):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, kind):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+"""
+Helper function to return the headers that continue the running trace in a request to another service.
+"""
+def headers():
+    current = _current.get()
+    return {'traceparent': current.traceparent()} if current else {}
+
+
+"""
+Helper functions to convert a trace to the JSON encoding of the OpenTelemetry protocol.
+"""
+def _value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(trace):
+    spans = []
+    for s in trace.spans:
+        data = {'traceId': trace.trace_id, 'spanId': s.span_id, 'name': s.name, 'kind': s.kind,
+                'startTimeUnixNano': str(s.start), 'endTimeUnixNano': str(s.end or s.start),
+                'attributes': [{'key': k, 'value': _value(v)} for k, v in s.attributes.items()],
+                'status': {'code': 2, 'message': s.error} if s.error else {'code': 0}}
+        if s.parent_id:
+            data['parentSpanId'] = s.parent_id
+        spans.append(data)
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name',
+                                     'value': _value(constants.TRACE_SERVICE_NAME)}]},
+        'scopeSpans': [{'scope': {'name': 'tracing'}, 'spans': spans}],
+    }]}
+
+
+"""
+Helper function to arrange the spans of a trace into a tree with the duration of each span, as written to
+the slow-request log.
+"""
+def to_tree(trace):
+    nodes = {}
+    roots = []
+    for s in trace.spans:
+        nodes[s.span_id] = {'name': s.name, 'ms': round(((s.end or s.start) - s.start) / 1e6, 2),
+                            'attributes': s.attributes, 'children': []}
+        if s.error:
+            nodes[s.span_id]['error'] = s.error
+    for s in trace.spans:
+        parent = nodes.get(s.parent_id)
+        (parent['children'] if parent else roots).append(nodes[s.span_id])
+    return roots[0] if len(roots) == 1 else roots
+
+
+"""
+Exporters that receive each sampled trace in the JSON encoding of the OpenTelemetry protocol. The file
+exporter appends one trace per line to TRACE_FILE, the HTTP exporter posts each trace to an OTLP/HTTP
+collector at TRACE_COLLECTOR_URL and the memory exporter keeps the most recent traces for testing.
+"""
+class FileExporter(object):
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, data):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(data) + "\n")
+
+
+class HttpExporter(object):
+
+    def __init__(self, url):
+        self.url = url
+
+    def export(self, data):
+        urlopen(Request(self.url, data=json.dumps(data).encode('utf-8'), method='POST',
+                        headers={'Content-Type': 'application/json'}), timeout=constants.TRACE_EXPORT_TIMEOUT)
+
+
+class MemoryExporter(object):
+
+    def __init__(self):
+        self.traces = []
+
+    def export(self, data):
+        self.traces = self.traces[-(constants.TRACE_QUEUE_SIZE - 1):] + [data]
+
+
+"""
+Sends traces to an exporter from a background thread, so requests never wait for an export. Traces are
+dropped when more than TRACE_QUEUE_SIZE are waiting.
+"""
+class BackgroundExporter(object):
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+        self._queue = queue.Queue(maxsize=constants.TRACE_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def export(self, data):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            data = self._queue.get()
+            try:
+                self.exporter.export(data)
+            except Exception:
+                logging.exception("Exporting a trace failed")
+
+
+"""
+Helper function to create the exporter named by constants.TRACE_EXPORTER.
+"""
+def make_exporter(backend):
+    if backend == "file":
+        return BackgroundExporter(FileExporter(constants.TRACE_FILE))
+    if backend == "http":
+        return BackgroundExporter(HttpExporter(constants.TRACE_COLLECTOR_URL))
+    if backend == "memory":
+        return MemoryExporter()
+    return None
+
+
+exporter = make_exporter(constants.TRACE_EXPORTER)
+
+
+"""
+Helper function to start the trace of a request with a span for the whole request. The trace continues
+the trace in the 'traceparent' header, and is sampled if the caller sampled it or, without a header, with
+probability TRACE_SAMPLE_RATE.
+"""
+def _start():
+    match = TRACEPARENT.match(request.headers.get('traceparent', ''))
+    if match and match.group(1) != '0' * 32:
+        trace = Trace(match.group(1), bool(int(match.group(3), 16) & 1))
+        parent_id = match.group(2)
+    else:
+        trace = Trace(secrets.token_hex(16), random.random() < constants.TRACE_SAMPLE_RATE)
+        parent_id = None
+    name = "%s %s" % (request.method, request.url_rule.rule if request.url_rule else request.path)
+    root = Span(trace, name, parent_id, SERVER, {'http.method': request.method, 'http.target': request.path})
+    g.trace_token = _current.set(root)
+    g.trace_root = root
+
+
+"""
+Helper function to return the trace context to the caller in the response.
+"""
+def _respond(res):
+    root = g.get('trace_root')
+    if root:
+        root.attributes['http.status_code'] = res.status_code
+        res.headers['traceparent'] = root.traceparent()
+    return res
+
+
+"""
+Helper function to finish the trace of a request. Sampled traces are exported, and requests slower than
+TRACE_SLOW_THRESHOLD seconds are written to the slow-request log with their full span tree with probability
+TRACE_SLOW_SAMPLE_RATE.
+"""
+def _finish(exc):
+    root = g.pop('trace_root', None)
+    if root is None:
+        return
+    root.end = time.time_ns()
+    if exc is not None:
+        root.error = repr(exc)
+    try:
+        _current.reset(g.pop('trace_token'))
+    except ValueError:
+        # Streamed responses finish in a different context from the one the request started in
+        _current.set(None)
+
+    if root.trace.sampled and exporter:
+        exporter.export(to_otlp(root.trace))
+    seconds = (root.end - root.start) / 1e9
+    if seconds > constants.TRACE_SLOW_THRESHOLD and random.random() < constants.TRACE_SLOW_SAMPLE_RATE:
+        logging.warning("Slow request %s took %.0f ms (trace %s): %s", root.name, seconds * 1000,
+                        root.trace.trace_id, json.dumps(to_tree(root.trace), default=str))
+
+
+"""
+Helper function to trace every request to the Flask application. Registered before the other request
+hooks so that the time they take is part of the request's span.
+"""
+def init_app(app):
+    app.before_request(_start)
+    app.after_request(_respond)
+    app.teardown_request(_finish)
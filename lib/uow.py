@@ -0,0 +1,163 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+from flask import g
+import logging
+import constants
+from db import client
+from validate import create_response
+import singleflight
+
+
+BATCH_SIZE = 500        # Largest number of entities Datastore accepts in a single batch
+
+
+"""
+Unit of work for a single request. Entities read through it are kept in an identity map, so reading the
+same key twice costs one RPC, and keys waiting to be read are fetched together with one get_multi. Entities
+saved or deleted through it are only written when the unit of work is flushed at the end of the request,
+with one put_multi and one delete_multi no matter how many times each entity was changed. When the changes
+fit in one commit they are written in one transaction, so either all of them are saved or none are.
+"""
+class UnitOfWork(object):
+
+    def __init__(self):
+        self._entities = {}         # Entities read or written in this request, None for keys that don't exist
+        self._pending = {}          # Keys to read with the next batch
+        self._dirty = {}            # Entities to save, by key
+        self._deleted = {}          # Keys to delete
+        self._on_flush = []         # Functions to call once the changes have been written
+
+    def prefetch(self, keys):
+        for key in keys:
+            if key not in self._entities and key not in self._pending:
+                self._pending[key] = True
+
+    def _load(self):
+        keys = list(self._pending)
+        self._pending = {}
+        for i in range(0, len(keys), BATCH_SIZE):
+            self._entities.update(singleflight.group.get_multi(keys[i:i + BATCH_SIZE]))
+
+    def get_multi(self, keys):
+        self.prefetch(keys)
+        if self._pending:
+            self._load()
+        return [self._entities[key] for key in keys]
+
+    def get(self, key):
+        return self.get_multi([key])[0]
+
+    def put(self, entity):
+        self._entities[entity.key] = entity
+        self._deleted.pop(entity.key, None)
+        self._dirty[entity.key] = entity
+
+    def delete(self, key):
+        self._entities[key] = None
+        self._dirty.pop(key, None)
+        self._deleted[key] = True
+
+    def after_flush(self, callback):
+        self._on_flush.append(callback)
+
+    def flush(self):
+        dirty = list(self._dirty.values())
+        deleted = list(self._deleted)
+        callbacks = self._on_flush
+        self._dirty = {}
+        self._deleted = {}
+        self._on_flush = []
+        groups = set(_group(e.key) for e in dirty) | set(_group(key) for key in deleted)
+        if len(dirty) + len(deleted) <= BATCH_SIZE and len(groups) <= constants.TRANSACTION_MAX_GROUPS:
+            if dirty or deleted:
+                with client.transaction():
+                    client.put_multi(dirty)
+                    client.delete_multi(deleted)
+        else:
+            for i in range(0, len(dirty), BATCH_SIZE):
+                client.put_multi(dirty[i:i + BATCH_SIZE])
+            for i in range(0, len(deleted), BATCH_SIZE):
+                client.delete_multi(deleted[i:i + BATCH_SIZE])
+
+        # The changes are saved by now, so a callback that fails is logged rather than failing the request
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                logging.exception("A callback after writing the changes of the request failed")
+
+
+"""
+Helper function to get the entity group of a key, which is the kind and id of its root ancestor.
+"""
+def _group(key):
+    return tuple(key.flat_path[:2])
+
+
+"""
+Helper function to get the unit of work for the current request, creating it on first use.
+"""
+def current():
+    if 'uow' not in g:
+        g.uow = UnitOfWork()
+    return g.uow
+
+
+def get(key):
+    return current().get(key)
+
+
+def get_multi(keys):
+    return current().get_multi(keys)
+
+
+def prefetch(keys):
+    current().prefetch(keys)
+
+
+def put(entity):
+    current().put(entity)
+
+
+def delete(key):
+    current().delete(key)
+
+
+def after_flush(callback):
+    current().after_flush(callback)
+
+
+"""
+Helper function to write the changes made in the current request. Called once the response has been
+created, and by any code that needs the changes saved before the response is sent.
+"""
+def flush():
+    if 'uow' in g:
+        g.uow.flush()
+
+
+"""
+Helper function to flush the unit of work after every successful request. Changes made by requests that
+end in an error response are dropped. If the changes can't be written the response is replaced with an
+error, so the caller never gets a success for changes that were rolled back.
+"""
+def _flush_response(response):
+    if response.status_code < 400:
+        try:
+            flush()
+        except Exception:
+            logging.exception("Writing the changes of the request failed")
+            message = {"code": "Internal Server Error", "description": "The changes could not be saved"}
+            return create_response(message, 500)
+    return response
+
+
+"""
+Helper function to add the per-request unit of work to the Flask application.
+"""
+def init_app(app):
+    app.after_request(_flush_response)
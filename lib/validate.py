@@ -5,10 +5,20 @@
 
 
 from flask import make_response, request
-from six.moves.urllib.request import urlopen
-from jose import jwt
+from six.moves.urllib.request import urlopen, Request
 import json
+import threading
+import time
 import constants
+import models
+import tracing
+from admission import limit_subject
+from importtime import timed_import
+
+
+_jwks = None                # JSON Web Key Set fetched from Auth0
+_jwks_fetched = 0           # Time the key set was last fetched
+_jwks_lock = threading.Lock()
 
 
 # This code is adapted from https://auth0.com/docs/quickstart/backend/python/01-authorization?_ga =
@@ -20,8 +30,30 @@ class AuthError(Exception):
         self.status_code = status_code
 
 
+"""
+Helper function to return the JSON Web Key Set for the Auth0 domain. The key set is cached for
+JWKS_CACHE_TTL seconds so that verifying a JWT does not require a network round trip on every request.
+Passing refresh=True fetches the key set again, which is used when a token names a key that is not cached.
+Forced refreshes are limited to one every JWKS_MIN_REFRESH seconds.
+"""
+def get_jwks(refresh=False):
+    global _jwks, _jwks_fetched
+    with _jwks_lock:
+        age = time.monotonic() - _jwks_fetched
+        if _jwks is None or age > constants.JWKS_CACHE_TTL or (refresh and age > constants.JWKS_MIN_REFRESH):
+            with tracing.span('jwks.fetch', tracing.CLIENT):
+                jsonurl = urlopen(Request("https://" + constants.DOMAIN + "/.well-known/jwks.json",
+                                          headers=tracing.headers()))
+                _jwks = json.loads(jsonurl.read())
+            _jwks_fetched = time.monotonic()
+        return _jwks
+
+
 # Verify the JWT in the request's Authorization header
+@tracing.traced('verify_jwt')
 def verify_jwt(request):
+    # The JWT library is only imported when the first request is verified, to keep it out of the cold start
+    jwt = timed_import('jose.jwt')
     if 'Authorization' in request.headers:
         auth_header = request.headers['Authorization'].split()
         token = auth_header[1]
@@ -30,8 +62,7 @@ def verify_jwt(request):
                         "description":
                         "Authorization header is missing"}, 401)
 
-    jsonurl = urlopen("https://" + constants.DOMAIN + "/.well-known/jwks.json")
-    jwks = json.loads(jsonurl.read())
+    jwks = get_jwks()
     try:
         unverified_header = jwt.get_unverified_header(token)
     except jwt.JWTError:
@@ -44,6 +75,10 @@ def verify_jwt(request):
                         "Invalid header. "
                         "Use an RS256 signed JWT Access Token"}, 401)
 
+    # Fetch the key set again if the token was signed with a key that has been rotated in
+    if not any(key["kid"] == unverified_header.get("kid") for key in jwks["keys"]):
+        jwks = get_jwks(refresh=True)
+
     rsa_key = {}
     for key in jwks["keys"]:
         if key["kid"] == unverified_header["kid"]:
@@ -76,6 +111,9 @@ def verify_jwt(request):
                              "description":
                                  "Unable to parse authentication"
                                  " token."}, 401)
+
+        # Limit the request rate of the user the JWT was issued to
+        limit_subject(payload['sub'])
         return payload
     else:
         raise AuthError({"code": "no_rsa_key",
@@ -84,10 +122,24 @@ def verify_jwt(request):
 
 
 """
-Helper function to create an error message if an error has occurred.
+Helper function to verify the JWT in the request and check that it was issued to one of the administrators
+in ADMIN_SUBS. Returns the payload of the JWT.
 """
+def verify_admin(request):
+    payload = verify_jwt(request)
+    if payload['sub'] not in constants.ADMIN_SUBS:
+        raise AuthError({"code": "Forbidden",
+                         "description": "This route can only be used by administrators"}, 403)
+    return payload
+
+
+"""
+Helper function to create an error message if an error has occurred. Models in the message are serialized
+as they are written.
+"""
+@tracing.traced('create_response')
 def create_response(message, status_code):
-    res = make_response(json.dumps(message))
+    res = make_response(json.dumps(message, default=models.to_json))
     res.mimetype = 'application/json'
     res.status_code = status_code
     return res
@@ -108,3 +160,15 @@ def check_content_type(message):
         message["description"] = "The chosen media type is not supported for this request"
     return message
 
+
+"""
+Helper function to check that a request object doesn't set any property that only the server sets, such as
+the 'rentee' of a bike or the 'carrier' of a component. Returns the error message naming them, or None.
+"""
+def check_owned(content, model, message):
+    owned = sorted(str(key) for key in content if key in model.owned)
+    if owned:
+        message["code"] = "Bad Request"
+        message["description"] = "The request object can't set " + ", ".join("'%s'" % key for key in owned)
+        return message
+    return None
@@ -4,41 +4,90 @@
 # Assignment: Portfolio - Final Project
 
 
-from google.cloud import datastore
+import time
+_import_start = time.perf_counter()         # Start of the application import, used for cold start timing
+
 from flask import Flask, redirect, render_template, session, url_for, request, jsonify
-import bikes
-import components
-import users
-import constants
-from validate import verify_jwt, AuthError
+import threading
+import logging
 import json
-from authlib.integrations.flask_client import OAuth
+import constants
+from importtime import timed_import, report, IMPORT_TIMES
+from sessions import make_session_interface
+import tracing
+import profiler
+import admission
+import consistency
+import uow
+import changefeed
+import edgecache
+import search
+import reservations
+from expand import ExpandError
+bikes = timed_import('bikes')
+components = timed_import('components')
+users = timed_import('users')
+changes = timed_import('changes')
+admin = timed_import('admin')
+reports = timed_import('reports')
+bookings = timed_import('bookings')
+from db import client, new_entity
+from validate import verify_jwt, get_jwks, AuthError
 from six.moves.urllib.parse import urlencode, quote_plus
 
 app = Flask(__name__)                   # Create an application using Flask
 app.register_blueprint(users.bp)        # Register the users blueprint
 app.register_blueprint(bikes.bp)        # Register the bikes blueprint
 app.register_blueprint(components.bp)   # Register the components blueprint
+app.register_blueprint(changes.bp)      # Register the change feed blueprint
+app.register_blueprint(admin.bp)        # Register the administrator blueprint
+app.register_blueprint(reports.bp)      # Register the fleet reports blueprint
+app.register_blueprint(bookings.bp)     # Register the reservations blueprint
 app.secret_key = constants.SECRET_KEY   # Set secret key for session dictionary access
+tracing.init_app(app)                   # Record a trace of every request, around all the other request hooks
+profiler.init_app(app)                  # Record the route each thread handles for the sampling profiler
+admission.init_app(app)                 # Reject requests over the concurrency limits before they are handled
+consistency.init_app(app)               # Choose the read consistency of each request and remember each caller's writes
+uow.init_app(app)                       # Write the changes made by each request when it finishes
+edgecache.init_app(app)                 # Serve catalogue pages from memory when no edge cache is configured
+
+# Keep sessions on the server when a session backend is configured
+session_interface = make_session_interface(constants.SESSION_BACKEND)
+if session_interface:
+    app.session_interface = session_interface
 
-client = datastore.Client()             # Create a client to access Datastore
+IMPORT_TIMES['main'] = time.perf_counter() - _import_start
 
-# Create OAuth for the Flask application
-oauth = OAuth(app)
+_oauth = None                           # OAuth client, created the first time a user logs in
+_oauth_lock = threading.Lock()
 
-# Register application for OAuth client
-auth0 = oauth.register(
-    'auth0',
-    client_id=constants.CLIENT_ID,
-    client_secret=constants.CLIENT_SECRET,
-    api_base_url="https://" + constants.DOMAIN,
-    access_token_url="https://" + constants.DOMAIN + "/oauth/token",
-    authorize_url="https://" + constants.DOMAIN + "/authorize",
-    client_kwargs={
-        'scope': 'openid profile email',
-    },
-    server_metadata_url="https://" + constants.DOMAIN + "/.well-known/openid-configuration"
-)
+
+"""
+Helper function to create the OAuth client for the Flask application and register the application with
+Auth0. The login flow is rarely used compared to the API, so authlib is only imported and the client only
+registered when the first login or callback request arrives.
+"""
+def get_oauth():
+    global _oauth
+    if _oauth is None:
+        with _oauth_lock:
+            if _oauth is None:
+                flask_client = timed_import('authlib.integrations.flask_client')
+                oauth = flask_client.OAuth(app)
+                oauth.register(
+                    'auth0',
+                    client_id=constants.CLIENT_ID,
+                    client_secret=constants.CLIENT_SECRET,
+                    api_base_url="https://" + constants.DOMAIN,
+                    access_token_url="https://" + constants.DOMAIN + "/oauth/token",
+                    authorize_url="https://" + constants.DOMAIN + "/authorize",
+                    client_kwargs={
+                        'scope': 'openid profile email',
+                    },
+                    server_metadata_url="https://" + constants.DOMAIN + "/.well-known/openid-configuration"
+                )
+                _oauth = oauth
+    return _oauth
 
 
 """
@@ -66,7 +115,7 @@ Route that redirects users to the Auth0 login page to generate a JWT.
 """
 @app.route("/login")
 def login():
-    return oauth.auth0.authorize_redirect(
+    return get_oauth().auth0.authorize_redirect(
         redirect_uri=url_for("callback", _external=True)
     )
 
@@ -84,7 +133,7 @@ information in Datastore.
 """
 @app.route("/callback", methods=["GET", "POST"])
 def callback():
-    token = oauth.auth0.authorize_access_token()
+    token = get_oauth().auth0.authorize_access_token()
     create_user(token)
     session["user"] = token
     return redirect("/")
@@ -121,6 +170,27 @@ def decode_jwt():
     return payload
 
 
+"""
+Route called by App Engine before a new instance receives traffic. Fetches the JWKS used to verify JWTs,
+imports the JWT library, opens the Datastore channels with a keys-only query, builds the component search
+and reservation indexes and logs how long each module took to import, so the first real requests to the
+instance don't pay for any of this.
+"""
+@app.route('/_ah/warmup')
+def warmup():
+    get_jwks()
+    timed_import('jose.jwt')
+    query = client.query(kind=constants.USERS)
+    query.keys_only()
+    list(query.fetch(limit=1))
+    search.index.start()
+    reservations.fleet.start()
+    search.index.ready.wait(constants.WARMUP_INDEX_WAIT)
+    reservations.fleet.ready.wait(constants.WARMUP_INDEX_WAIT)
+    logging.info("Import times: %s", json.dumps(report()))
+    return ('', 200)
+
+
 """
 Error handler route to form the JSON error message response.
 """
@@ -131,6 +201,27 @@ def handle_auth_error(ex):
     return response
 
 
+"""
+Error handler route to form the JSON error message response for invalid 'expand' query parameters.
+"""
+@app.errorhandler(ExpandError)
+def handle_expand_error(ex):
+    response = jsonify(ex.error)
+    response.status_code = ex.status_code
+    return response
+
+
+"""
+Error handler route to form the JSON error message response for requests rejected by admission control.
+"""
+@app.errorhandler(admission.OverloadError)
+def handle_overload_error(ex):
+    response = jsonify(ex.error)
+    response.status_code = ex.status_code
+    response.headers['Retry-After'] = str(ex.retry_after)
+    return response
+
+
 """
 Helper function to create a new user entity with the information provided by the JWT. User entities
  are stored in Datastore.
@@ -143,10 +234,11 @@ def create_user(user_token):
         if str(i['renter_id']) == str(user_info['sub']):
             return
 
-    new_user = datastore.entity.Entity(key=client.key(constants.USERS))
+    new_user = new_entity(client.key(constants.USERS))
     new_user.update({'nickname': user_info['nickname'], 'email': user_info['email'],
-                     'verified': user_info['email_verified'], 'renter_id': user_info['sub'], 'rental': []})
+                     'verified': user_info['email_verified'], 'renter_id': user_info['sub']})
     client.put(new_user)
+    changefeed.record('create', constants.USERS, new_user.key.id)
 
 
 """
@@ -155,12 +247,21 @@ Route to delete all entities in all collections currently stored in Datastore. C
 """
 @app.route('/delete', methods=['DELETE'])
 def delete_all():
-    comps_query = client.query(kind=constants.COMPONENTS)
-    bikes_query = client.query(kind=constants.BIKES)
-    users_query = client.query(kind=constants.USERS)
-    results = list(comps_query.fetch()) + list(bikes_query.fetch()) + list(users_query.fetch())
-    for i in results:
-        client.delete(i)
+    for kind in [constants.SPECS, constants.RENTALS, constants.INVENTORIES, constants.RENTAL_EVENTS,
+                 constants.RESERVATIONS, constants.COMPONENTS, constants.BIKES, constants.USERS]:
+        query = client.query(kind=kind)
+        query.keys_only()
+
+        # Queue the deletes so they are sent in batches when the request finishes, and record the deletes of
+        # bikes, components and users in the change log
+        for i in query.fetch():
+            uow.delete(i.key)
+            if kind in (constants.COMPONENTS, constants.BIKES, constants.USERS):
+                changefeed.record('delete', kind, i.key.id)
+    edgecache.purge(edgecache.ALL_COMPONENTS)
+    uow.after_flush(search.index.clear)
+    uow.after_flush(reservations.fleet.reload)
+    uow.after_flush(timed_import('analytics').reset)
     return ('', 204)
 
 
@@ -0,0 +1,162 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+from flask import request, Blueprint, Response, stream_with_context, make_response
+import gzip
+import constants
+from validate import verify_admin, create_response
+import snapshot
+import singleflight
+import consistency
+from profiler import profiler, collapsed, speedscope
+
+bp = Blueprint('admin', __name__, url_prefix='/admin')     # Create a blueprint for administrator routes
+
+
+"""
+Route to handle exporting a snapshot of every collection as NDJSON, one entity per line. The collections to
+export can be chosen with one or more 'kind' query parameters. The snapshot is streamed as it is read and is
+gzipped when the client accepts gzip.
+"""
+@bp.route('/export', methods=['GET'])
+def admin_export():
+
+    # Create dictionary object for response message
+    message = {}
+
+    # Validate JWT
+    verify_admin(request)
+
+    kinds = request.args.getlist('kind')
+    for kind in kinds:
+        if kind not in snapshot.KINDS:
+            message["code"] = "Bad Request"
+            message["description"] = "'kind' must be one of %s" % ", ".join(snapshot.KINDS)
+            return create_response(message, 400)
+
+    lines = snapshot.export(kinds)
+    if 'gzip' in request.accept_encodings:
+        res = Response(stream_with_context(snapshot.compress(lines)), mimetype='application/x-ndjson')
+        res.headers['Content-Encoding'] = 'gzip'
+    else:
+        res = Response(stream_with_context(lines), mimetype='application/x-ndjson')
+    res.headers['Content-Disposition'] = 'attachment; filename=snapshot.ndjson'
+    return res
+
+
+"""
+Route to handle importing a snapshot created by '/admin/export'. The request body is NDJSON, gzipped if the
+request has a 'Content-Encoding: gzip' header, and is read as it arrives. Entities keep their ids and
+replace any stored entity with the same key. Large snapshots should be imported with
+'python lib/snapshot.py import', which isn't limited by the request timeout.
+"""
+@bp.route('/import', methods=['POST'])
+def admin_import():
+
+    # Validate JWT
+    verify_admin(request)
+
+    body = request.stream
+    if request.headers.get('Content-Encoding') == 'gzip':
+        body = gzip.GzipFile(fileobj=body, mode='rb')
+    counts = snapshot.load(body)
+    return create_response({"imported": counts}, 200)
+
+
+"""
+Route to handle getting the number of Datastore reads made on this instance and the number of reads that
+were shared with a concurrent request instead of being made again.
+"""
+@bp.route('/singleflight', methods=['GET'])
+def admin_singleflight():
+
+    # Validate JWT
+    verify_admin(request)
+
+    return create_response(dict(singleflight.group.stats), 200)
+
+
+"""
+Route to handle getting the read consistency metrics of this instance: the number of requests to each route
+that read with eventual consistency or with strong consistency for read-your-writes or to bound the
+staleness, and the staleness measured on a sample of the eventually consistent reads.
+"""
+@bp.route('/consistency', methods=['GET'])
+def admin_consistency():
+
+    # Validate JWT
+    verify_admin(request)
+
+    return create_response(consistency.metrics(), 200)
+
+
+"""
+Helper function to return sampled stacks in the format named by the 'format' query parameter: 'collapsed'
+for flame graph tools, or 'speedscope'.
+"""
+def profile_response(stacks):
+    if request.args.get('format', 'collapsed') == 'speedscope':
+        return create_response(speedscope(stacks, profiler.interval), 200)
+    res = make_response(collapsed(stacks))
+    res.mimetype = 'text/plain'
+    return res
+
+
+"""
+Route to handle the sampling profiler of this instance. POST starts sampling every request for 'seconds'
+seconds, GET returns the stacks sampled so far, optionally for one 'route' such as 'GET /bikes/<bike_id>',
+and DELETE stops sampling and discards the samples.
+"""
+@bp.route('/profiler', methods=['POST', 'GET', 'DELETE'])
+def admin_profiler():
+
+    # Create dictionary object for response message
+    message = {}
+
+    # Validate JWT
+    verify_admin(request)
+
+    if request.method == 'POST':
+        try:
+            seconds = float(request.args.get('seconds', constants.PROFILER_MAX_SECONDS))
+        except ValueError:
+            seconds = 0
+        if not 0 < seconds <= constants.PROFILER_MAX_SECONDS:
+            message["code"] = "Bad Request"
+            message["description"] = "'seconds' must be between 0 and %d" % constants.PROFILER_MAX_SECONDS
+            return create_response(message, 400)
+        profiler.start(seconds)
+        return create_response({"seconds": seconds, "interval": profiler.interval}, 202)
+
+    elif request.method == 'GET':
+        return profile_response(profiler.stacks(request.args.get('route')))
+
+    else:
+        profiler.stop()
+        profiler.clear()
+        return ('', 204)
+
+
+"""
+Route to handle getting the profile of a single request, made with the PROFILER_TOKEN in its 'X-Profile'
+header. The profile id is returned in the request's 'X-Profile-Id' header.
+"""
+@bp.route('/profiler/<profile_id>', methods=['GET'])
+def admin_profile_get(profile_id):
+
+    # Create dictionary object for response message
+    message = {}
+
+    # Validate JWT
+    verify_admin(request)
+
+    saved = profiler.saved(profile_id)
+    if saved is None:
+        message["code"] = "Not Found"
+        message["description"] = "No profile with this profile_id exists on this instance"
+        return create_response(message, 404)
+    route, stacks = saved
+    return profile_response({route: stacks})
@@ -4,17 +4,55 @@
 # Assignment: Portfolio - Final Project
 
 
-from google.cloud import datastore
 from flask import request, Blueprint
+from six.moves.urllib.parse import urlencode
 import constants
-from validate import verify_jwt, create_response, check_content_type
+import idempotency
+from idempotency import idempotent
+from db import client
+import availability
+import uow
+import relations
+import changefeed
+from expand import expand
+from models import Bike, Component
+import inventory
+import reservations
+import edgecache
+from validate import verify_jwt, create_response, check_content_type, check_owned
 
-
-client = datastore.Client()                                # Create a client to access Datastore
 bp = Blueprint('bikes', __name__, url_prefix='/bikes')     # Create a blueprint for the bikes entity
 
-# app_url = "http://127.0.0.1:8080"                                     URL for Local self link
-app_url = "https://portfolio-lohrcl.uc.r.appspot.com"                 # URL for GCP self link
+
+"""
+Helper function to read a bike again inside the transaction that changes it, so that the change and the
+availability counts are based on the bike as it is committed rather than the copy read before the
+transaction. Returns the bike, or None with the error in 'message' and its status code if the bike was
+deleted or returned by 'rentee_id' in the meantime.
+"""
+def _read_rented_bike(bike_key, rentee_id, message):
+    bike = client.get(key=bike_key)
+    if not bike:
+        message['code'] = "Not Found"
+        message['description'] = "No bike with this bike_id exists"
+        return None, 404
+    if bike['rentee'] != rentee_id:
+        message['code'] = "Forbidden"
+        message['description'] = "You are no longer renting this bike"
+        return None, 403
+    return bike, None
+
+
+"""
+Helper function to detach the components with 'component_ids' from a bike inside the current transaction:
+their 'carrier' is cleared and their records are removed from the bike's 'specs' in the same commit.
+"""
+def _detach_components(bike_id, component_ids):
+    components = client.get_multi([client.key(constants.COMPONENTS, int(i)) for i in component_ids])
+    for component in components:
+        component['carrier'] = None
+    client.put_multi(components)
+    client.delete_multi([relations.spec_key(bike_id, i) for i in component_ids])
 
 
 """
@@ -22,6 +60,7 @@ Route to handle creating a bike entity and listing all bike entities belonging t
 in the '/bikes' collection.
 """
 @bp.route('', methods=['POST', 'GET'])
+@idempotent(methods=['POST'])
 def bikes_get_post():
 
     # Validate JWT
@@ -50,21 +89,27 @@ def bikes_get_post():
             message["description"] = "The request object is missing at least one of the required attributes"
             return create_response(message, 400)
 
-        # Create new bike entity and update its attributes
-        new_bike = datastore.entity.Entity(key=client.key(constants.BIKES))
-        new_bike.update({'manufacturer': content['manufacturer'], 'type': content['type'],
-                         'model_year': content['model_year'], 'bike_size': content['bike_size']})
+        # Create new bike with its attributes, empty 'specs' and an empty 'rentee'. The response keeps 'specs'
+        # before 'rentee', where it was when bikes stored their 'specs', but 'specs' isn't stored on the bike
+        new_bike = Bike({'manufacturer': content['manufacturer'], 'type': content['type'],
+                         'model_year': content['model_year'], 'bike_size': content['bike_size'], 'specs': [],
+                         'rentee': None}, specs=[])
+        entity = new_bike.to_entity(client.allocate_ids(client.key(constants.BIKES), 1)[0])
+        del entity['specs']
 
-        # Add 'specs' and 'rentee' attributes to the bike entity
-        new_bike['specs'] = []
-        new_bike['rentee'] = None
-        client.put(new_bike)
+        # Add the id to the response body
+        new_bike.id = entity.key.id
+        res = create_response(new_bike, 201)
 
-        # Add id and self link to the response body
-        new_bike["id"] = new_bike.key.id
-        new_bike["self"] = app_url + "/bikes/" + str(new_bike.key.id)
+        # Save the bike, count it as available and complete the request's Idempotency-Key in the same commit
+        with client.transaction():
+            client.put(entity)
+            availability.adjust(new_bike.type, new_bike.bike_size, available=1)
+            changefeed.record('create', constants.BIKES, entity.key.id)
+            idempotency.complete_in_transaction(res)
+        reservations.touch(entity.key.id)
 
-        return create_response(new_bike, 201)
+        return res
 
     # List all bike entities belonging to the authorized user
     elif request.method == 'GET':
@@ -72,23 +117,24 @@ def bikes_get_post():
         # Get the value representing the owner for the JWT
         owner = payload['sub']
         rentee_id = None
-        bike_arr = []
-
 
         # Fetch all bike entities from the '/bikes' collection
         query = client.query(kind=constants.BIKES)
-        bike_list = list(query.fetch())
+        bike_list = [Bike.from_entity(e) for e in query.fetch()]
+
+        # Read the users renting the bikes together in one batch
+        uow.prefetch([client.key(constants.USERS, int(i.rentee)) for i in bike_list if i.rentee])
 
         # Iterate through all bikes in the /bikes collection
         for i in bike_list:
-            if i['rentee']:
-                user_key = client.key(constants.USERS, int(i['rentee']))
-                user = client.get(key=user_key)
+            if i.rentee:
+                user_key = client.key(constants.USERS, int(i.rentee))
+                user = uow.get(user_key)
                 user_id = user['renter_id']
 
                 # Save the 'rentee id' if the user id matches the JWT owner
                 if str(user_id) == str(owner):
-                    rentee_id = int(i['rentee'])
+                    rentee_id = int(i.rentee)
                     break
 
         # Return empty array if no bikes match the rentee_id
@@ -104,7 +150,7 @@ def bikes_get_post():
         q_offset = int(request.args.get('offset', '0'))
         l_iterator = query.fetch(limit=q_limit, offset=q_offset)
         pages = l_iterator.pages
-        results = list(next(pages))
+        results = [Bike.from_entity(e, Bike.LIST_TAIL) for e in next(pages)]
 
         # Create a 'next' link by adding the limit to the current offset
         if l_iterator.next_page_token:
@@ -113,15 +159,13 @@ def bikes_get_post():
         else:
             next_url = None
 
-        # Add bike entity id and self link to response body
+        # Add the components installed on the bikes in the page to the response body
+        specs = relations.get_specs([e.id for e in results])
         for e in results:
-            e["id"] = e.key.id
-            e["self"] = app_url + "/bikes/" + str(e.key.id)
+            e.specs = specs[e.id]
 
-            # Add component entity id and self link to the response body
-            for i in e['specs']:
-                component_id = i['id']
-                i['self'] = app_url + "/components/" + str(component_id)
+        # Inline the related resources requested with 'expand'
+        expand(constants.BIKES, results, request.args.get('expand'), owner)
 
         # Create a dictionary object to hold the list of bikes
         output = {"bikes": results}
@@ -142,6 +186,75 @@ def bikes_get_post():
         return create_response(message, 405)
 
 
+"""
+Route to handle listing the bikes that are not rented by any user, filtered by 'type', 'bike_size' and a
+'min_year'/'max_year' range of 'model_year'. The results are paged with a cursor and the response includes
+the number of available and rented bikes for each matching type and size.
+"""
+@bp.route('/available', methods=['GET'])
+def bikes_available():
+
+    # Create dictionary object for response message
+    message = {}
+
+    # Validate JWT
+    verify_jwt(request)
+
+    bike_type = request.args.get('type')
+    bike_size = request.args.get('bike_size')
+
+    # Filter the '/bikes' collection to bikes without a rentee and the requested attributes
+    query = client.query(kind=constants.BIKES)
+    query.add_filter('rentee', '=', None)
+    if bike_type:
+        query.add_filter('type', '=', bike_type)
+    if bike_size:
+        query.add_filter('bike_size', '=', bike_size)
+    try:
+        if request.args.get('min_year'):
+            query.add_filter('model_year', '>=', int(request.args['min_year']))
+        if request.args.get('max_year'):
+            query.add_filter('model_year', '<=', int(request.args['max_year']))
+        q_limit = max(1, min(int(request.args.get('limit', '5')), 100))
+    except ValueError:
+        message["code"] = "Bad Request"
+        message["description"] = "'min_year', 'max_year' and 'limit' must be integers"
+        return create_response(message, 400)
+
+    # Fetch one page of results starting at the cursor from the previous page
+    cursor = request.args.get('cursor')
+    l_iterator = query.fetch(limit=q_limit, start_cursor=cursor.encode() if cursor else None)
+    results = [Bike.from_entity(e, Bike.LIST_TAIL) for e in next(l_iterator.pages)]
+
+    # Add installed components to response body
+    specs = relations.get_specs([e.id for e in results])
+    for e in results:
+        e.specs = specs[e.id]
+
+    output = {"bikes": results, "total_items": len(results),
+              "counts": availability.get_counts(bike_type, bike_size)}
+
+    # Create a 'next' link from the cursor at the end of this page
+    if l_iterator.next_page_token and len(results) == q_limit:
+        output["next"] = (request.base_url + "?" + urlencode(
+            dict(request.args, cursor=l_iterator.next_page_token.decode(), limit=q_limit)))
+
+    return create_response(output, 200)
+
+
+"""
+Route to handle listing the number of available and rented bikes for each type and size.
+"""
+@bp.route('/available/counts', methods=['GET'])
+def bikes_available_counts():
+
+    # Validate JWT
+    verify_jwt(request)
+
+    counts = availability.get_counts(request.args.get('type'), request.args.get('bike_size'))
+    return create_response({"counts": counts}, 200)
+
+
 """
 Route to handle modifying, deleting, and listing an existing bike entity belonging to the authorized user
  in the '/bikes' collection given a bike_id.
@@ -154,7 +267,7 @@ def bikes_put_patch_delete_get(bike_id):
 
     # Get bike entity with 'bike_id' from database
     bike_key = client.key(constants.BIKES, int(bike_id))
-    bike = client.get(key=bike_key)
+    bike = uow.get(bike_key)
 
     # Call error handler if bike does not exist
     if not bike:
@@ -175,10 +288,14 @@ def bikes_put_patch_delete_get(bike_id):
         message['description'] = "You must rent this bike before making any requests"
         return create_response(message, 401)
 
-    # Get the user currently renting the bike with bike_id
-    rentee_key = client.key(constants.USERS, int(rentee_id))
-    rentee = client.get(key=rentee_key)
-    rentee_jwt = str(rentee['renter_id'])
+    # Get the 'sub' of the user currently renting the bike with bike_id, which is stored on the bike when it
+    # is rented. Bikes rented before it was stored fall back to reading the user.
+    rentee_jwt = bike.get('rentee_sub')
+    if rentee_jwt is None:
+        rentee_key = client.key(constants.USERS, int(rentee_id))
+        rentee = uow.get(rentee_key)
+        rentee_jwt = rentee['renter_id']
+    rentee_jwt = str(rentee_jwt)
 
     # Modify a bike entity
     if request.method == 'PUT':
@@ -201,6 +318,10 @@ def bikes_put_patch_delete_get(bike_id):
             return create_response(content_error, 406)
         content = request.get_json()
 
+        # Call error handler if the request object sets a property only the server sets
+        if check_owned(content, Bike, message):
+            return create_response(message, 400)
+
         # Check that the request object includes the required attributes
         if len(content) != 4:
 
@@ -209,10 +330,19 @@ def bikes_put_patch_delete_get(bike_id):
             message["description"] = "The request object is missing at least one of the required attributes"
             return create_response(message, 400)
 
-        # Update bike attributes
-        bike.update({'manufacturer': content['manufacturer'], 'type': content['type'],
-                    'model_year': content['model_year'], 'bike_size': content['bike_size']})
-        client.put(bike)
+        # Update the bike's attributes and move it to the count for its new type and size in the same commit
+        with client.transaction():
+            bike, error = _read_rented_bike(bike_key, rentee_id, message)
+            if error:
+                return create_response(message, error)
+            old_bike = dict(bike)
+            bike.update({'manufacturer': content['manufacturer'], 'type': content['type'],
+                        'model_year': content['model_year'], 'bike_size': content['bike_size']})
+            client.put(bike)
+            availability.move(old_bike, bike)
+            changefeed.record('update', constants.BIKES, bike_id)
+        inventory.touch_bike(bike)
+        reservations.touch(bike_id)
 
         return ('', 204)
 
@@ -235,10 +365,23 @@ def bikes_put_patch_delete_get(bike_id):
             return create_response(content_error, 406)
         content = request.get_json()
 
-        # Checks if the requested attributes to modify are valid
-        for key in content:
-            bike.update({str(key): content[str(key)]})
-        client.put(bike)
+        # Call error handler if the request object sets a property only the server sets
+        if check_owned(content, Bike, message):
+            return create_response(message, 400)
+
+        # Update the bike's attributes and move it to the count for its new type and size in the same commit
+        with client.transaction():
+            bike, error = _read_rented_bike(bike_key, rentee_id, message)
+            if error:
+                return create_response(message, error)
+            old_bike = dict(bike)
+            for key in content:
+                bike.update({str(key): content[str(key)]})
+            client.put(bike)
+            availability.move(old_bike, bike)
+            changefeed.record('update', constants.BIKES, bike_id)
+        inventory.touch_bike(bike)
+        reservations.touch(bike_id)
 
         return ('', 204)
 
@@ -251,26 +394,44 @@ def bikes_put_patch_delete_get(bike_id):
             message['description'] = "You cannot remove a bike that you aren't renting"
             return create_response(message, 403)
 
-        # Fetch all components from the '/components' collection and update its 'carrier' status
-        for i in bike['specs']:
-            component_id = i['id']
-            component_key = client.key(constants.COMPONENTS, int(component_id))
-            component = client.get(key=component_key)
-            component['carrier'] = None
-            client.put(component)
-
-        # Check if the bike is currently being rented by a user and update the 'rental' and 'rentee' status
-        if bike['rentee']:
-            user_id = bike['rentee']
-            user_key = client.key(constants.USERS, int(user_id))
-            rentee = client.get(key=user_key)
-
-            for item in rentee['rental']:
-                if int(item['id']) == int(bike_id):
-                    rentee['rental'].remove(item)
-                    client.put(rentee)
-                    break
-        client.delete(bike_key)
+        # Detach the bike's components in batches, each in a transaction of its own, so that no transaction
+        # writes to more entity groups than Datastore allows. The transaction that detaches the last batch also
+        # deletes the bike, its rental and its reservations and removes it from the count for its type and size.
+        # A request that fails part way leaves the bike with the components that weren't detached yet, and
+        # repeating it finishes the delete.
+        component_ids = []
+        while True:
+            with client.transaction():
+                bike, error = _read_rented_bike(bike_key, rentee_id, message)
+                if error:
+                    return create_response(message, error)
+                specs, _ = relations.page_specs(bike_id)
+                batch = [i.id for i in specs[:constants.BIKE_DELETE_BATCH]]
+                _detach_components(bike_id, batch)
+                component_ids.extend(batch)
+                if len(specs) > len(batch):
+                    continue
+
+                if bike['rentee']:
+                    client.delete(relations.rental_key(bike['rentee'], bike_id))
+                query = client.query(kind=constants.RESERVATIONS, ancestor=bike_key)
+                query.keys_only()
+                client.delete_multi([i.key for i in query.fetch()])
+                rented = 1 if bike['rentee'] else 0
+                client.delete(bike_key)
+                availability.adjust(bike['type'], bike['bike_size'], available=rented - 1, rented=-rented)
+
+                # End the rental in the rental history
+                if bike['rentee']:
+                    client.put(relations.new_rental_event('return', bike, bike['rentee']))
+                related = [(constants.COMPONENTS, i) for i in component_ids]
+                if bike['rentee']:
+                    related.append((constants.USERS, bike['rentee']))
+                changefeed.record('delete', constants.BIKES, bike_id, related)
+                break
+        inventory.touch_bike(bike)
+        reservations.touch(bike_id)
+        edgecache.purge(*[edgecache.component_key(i) for i in component_ids])
 
         return ('', 204)
 
@@ -283,14 +444,12 @@ def bikes_put_patch_delete_get(bike_id):
             message['description'] = "You cannot view a bike that you aren't renting"
             return create_response(message, 403)
 
-        # Add self link for components to response body
-        for i in bike['specs']:
-            components_id = i['id']
-            i['self'] = app_url + "/components/" + str(components_id)
+        # Add components to response body
+        specs, _ = relations.page_specs(bike_id)
+        bike = Bike.from_entity(bike, specs=specs)
 
-        # Add id and self link to the response body
-        bike["id"] = bike.key.id
-        bike["self"] = app_url + "/bikes/" + str(bike.key.id)
+        # Inline the related resources requested with 'expand'
+        expand(constants.BIKES, [bike], request.args.get('expand'), user_jwt)
         return create_response(bike, 200)
 
     # Invalid request method
@@ -312,13 +471,10 @@ def add_delete_bike_components(bike_id, component_id):
     # Validate JWT
     payload = verify_jwt(request)
 
-    # Get bike entity with 'bike_id' from database
+    # Get bike entity with 'bike_id' and components entity with 'components_id' from database
     bike_key = client.key(constants.BIKES, int(bike_id))
-    bike = client.get(key=bike_key)
-
-    # Get components entity with 'components_id' from database
     component_key = client.key(constants.COMPONENTS, int(component_id))
-    component = client.get(key=component_key)
+    bike, component = uow.get_multi([bike_key, component_key])
 
     # Call error handler if bike or component does not exist
     if not component or not bike:
@@ -335,44 +491,37 @@ def add_delete_bike_components(bike_id, component_id):
             message['description'] = "The components is already installed on another bike"
             return create_response(message, 403)
 
-        # Create components data for bike entity
-        component_data = {'id': component.id, 'description': component['description']}
-
         # Create bike data for components entity
         bike_data = {'id': bike.id, 'manufacturer': bike['manufacturer']}
 
-        # Add components to bike already carrying components
-        if 'specs' in bike.keys():
-            bike['specs'].append(component_data)
-
-        # Add components to empty bike
-        else:
-            bike['specs'] = component_data
-        client.put(bike)
+        # Add the component to the bike's 'specs'
+        uow.put(relations.new_spec(bike.id, component.id, component['description']))
 
         # Update 'carrier' attribute value for component with components_id
         component['carrier'] = bike_data
-        client.put(component)
+        uow.put(component)
+        changefeed.record('install', constants.BIKES, bike.id, [(constants.COMPONENTS, component.id)])
+        inventory.touch_bike(bike)
+        edgecache.purge(edgecache.component_key(component.id))
 
         return ('', 204)
 
     # Remove a components from a bike
     elif request.method == 'DELETE':
 
-        # Check that bike is carrying a component
-        if 'specs' in bike.keys():
-
-            # Iterate through all components on bike and remove components with matching component_id
-            for i in bike['specs']:
-                if i['id'] == component.id:
-                    bike['specs'].remove(i)
-                    client.put(bike)
+        # Check that bike is carrying the component and remove it from the bike's 'specs'
+        spec_key = relations.spec_key(bike.id, component.id)
+        if uow.get(spec_key):
+            uow.delete(spec_key)
 
-                    # Update 'carrier' attribute value for components with component_id
-                    component['carrier'] = None
-                    client.put(component)
+            # Update 'carrier' attribute value for components with component_id
+            component['carrier'] = None
+            uow.put(component)
+            changefeed.record('uninstall', constants.BIKES, bike.id, [(constants.COMPONENTS, component.id)])
+            inventory.touch_bike(bike)
+            edgecache.purge(edgecache.component_key(component.id))
 
-                    return ('', 204)
+            return ('', 204)
 
         # Call error handler if bike with bike_id is not carrying components with components_id
         message['code'] = "Not Found"
@@ -388,6 +537,8 @@ def add_delete_bike_components(bike_id, component_id):
 
 """
 Route to handle listing all components being carried by the bike rented by the authorized user with bike_id.
+The components can be paged with 'limit' and 'cursor', in which case the link to the next page is returned
+in the 'Link' header.
 """
 @bp.route('/<bike_id>/components', methods=['GET'])
 def get_components(bike_id):
@@ -400,7 +551,7 @@ def get_components(bike_id):
 
     # Get bike entity with 'bike_id' from database
     bike_key = client.key(constants.BIKES, int(bike_id))
-    bike = client.get(key=bike_key)
+    bike = uow.get(bike_key)
 
     # Call error handler if bike does not exist
     if not bike:
@@ -411,32 +562,28 @@ def get_components(bike_id):
     # List all components currently assigned to a bike
     if request.method == 'GET':
 
-        # Create an array to hold components elements
-        component_arr = []
-
-        # Iterate through each component on the bike
-        for i in bike['specs']:
-
-            # Get the id of the components being carried by the bike
-            component_id = i['id']
+        # Get a page of the components carried by the bike, or all of them if no limit is given
+        q_limit = request.args.get('limit')
+        specs, next_cursor = relations.page_specs(bike_id, int(q_limit) if q_limit else None,
+                                                  request.args.get('cursor'))
 
-            # Get components entity with 'components_id' from database
-            components_key = client.key(constants.COMPONENTS, int(component_id))
-            component = client.get(key=components_key)
+        # Read all components carried by the bike together in one batch
+        uow.prefetch([client.key(constants.COMPONENTS, int(i.id)) for i in specs])
 
-            # Add the component id and self link to the response body
-            component['id'] = component_id
-            component['self'] = app_url + "/components/" + str(component_id)
+        # Get each component on the bike from the batch
+        components = [Component.from_entity(uow.get(client.key(constants.COMPONENTS, int(i.id)))) for i in specs]
 
-            # Add the bike id and self link to the response body
-            carrier = component['carrier']
-            carrier['id'] = int(bike_id)
-            carrier['self'] = app_url + "/bikes/" + str(bike_id)
+        # Add the bike id to the response body of each component
+        for component in components:
+            component.carrier.id = int(bike_id)
 
-            # Add the component entity to the components array
-            component_arr.append(component)
+        res = create_response(components, 200)
 
-        return create_response(component_arr, 200)
+        # Add a link to the next page of components
+        if next_cursor:
+            res.headers['Link'] = '<%s?%s>; rel="next"' % (
+                request.base_url, urlencode({'limit': q_limit, 'cursor': next_cursor}))
+        return res
 
     # Invalid request method
     else:
@@ -0,0 +1,204 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+from flask import request, Blueprint
+import time
+import constants
+import idempotency
+from idempotency import idempotent
+from db import client
+import changefeed
+import reservations
+from models import app_url
+from validate import verify_jwt, create_response, check_content_type
+
+bp = Blueprint('reservations', __name__, url_prefix='/bikes')     # Create a blueprint for reservations
+
+
+"""
+Helper function to format a reservation for a response.
+"""
+def reservation_data(reservation, sub):
+    bike_id = reservation.key.parent.id
+    return {'id': reservation.key.id, 'bike': {'id': bike_id, 'self': app_url + "/bikes/" + str(bike_id)},
+            'start': reservations.format_time(reservation['start']),
+            'end': reservations.format_time(reservation['end']),
+            'mine': str(reservation['renter_id']) == str(sub),
+            'self': app_url + "/bikes/" + str(bike_id) + "/reservations/" + str(reservation.key.id)}
+
+
+"""
+Helper function to read the 'start' and 'end' of a period from a dictionary. Returns the period in seconds
+since the epoch, or None and an error message.
+"""
+def read_period(values, message):
+    start = reservations.parse_time(values.get('start'))
+    end = reservations.parse_time(values.get('end'))
+    if start is None or end is None:
+        message["code"] = "Bad Request"
+        message["description"] = "'start' and 'end' must be ISO 8601 times"
+    elif end <= start:
+        message["code"] = "Bad Request"
+        message["description"] = "'end' must be after 'start'"
+    elif end - start > constants.RESERVATION_MAX_DAYS * 86400:
+        message["code"] = "Bad Request"
+        message["description"] = "A reservation can be at most %d days long" % constants.RESERVATION_MAX_DAYS
+    elif end > time.time() + constants.RESERVATION_HORIZON_DAYS * 86400:
+        message["code"] = "Bad Request"
+        message["description"] = "Bikes can be reserved at most %d days ahead" % constants.RESERVATION_HORIZON_DAYS
+    else:
+        return start, end
+    return None
+
+
+"""
+Route to handle listing the bikes of a type and size that are free for a period. 'type', 'bike_size',
+'start' and 'end' are required. The bikes are found in an index of every bike's reservations kept on each
+instance, so the search doesn't read any reservations from Datastore.
+"""
+@bp.route('/free', methods=['GET'])
+def bikes_free():
+
+    # Create dictionary object for response message
+    message = {}
+
+    # Validate JWT
+    verify_jwt(request)
+
+    bike_type = request.args.get('type')
+    bike_size = request.args.get('bike_size')
+    if not bike_type or not bike_size:
+        message["code"] = "Bad Request"
+        message["description"] = "'type' and 'bike_size' are required"
+        return create_response(message, 400)
+    period = read_period(request.args, message)
+    if period is None:
+        return create_response(message, 400)
+
+    # Call error handler if the instance is still building its index
+    reservations.fleet.start()
+    if not reservations.fleet.ready.wait(constants.RESERVATION_READY_WAIT):
+        message["code"] = "Service Unavailable"
+        message["description"] = "The search for free bikes is not ready yet, retry later"
+        return create_response(message, 503)
+
+    bike_ids = reservations.fleet.free(bike_type, bike_size, *period)
+    output = {"bikes": [{'id': i, 'self': app_url + "/bikes/" + str(i)} for i in bike_ids],
+              "total_items": len(bike_ids)}
+    return create_response(output, 200)
+
+
+"""
+Route to handle reserving the bike with bike_id for a future period and listing the bike's upcoming
+reservations. A reservation is booked in a transaction that reads every reservation of the bike, so two
+overlapping reservations of the same bike can't both succeed.
+"""
+@bp.route('/<bike_id>/reservations', methods=['POST', 'GET'])
+@idempotent(methods=['POST'])
+def reservations_get_post(bike_id):
+
+    # Create dictionary object for response message
+    message = {}
+
+    # Validate JWT
+    payload = verify_jwt(request)
+
+    bike_key = client.key(constants.BIKES, int(bike_id))
+
+    # Reserve the bike
+    if request.method == 'POST':
+        content_error = check_content_type(message)
+        if content_error:
+            if content_error['code'] == 415:
+                content_error['code'] = "Unsupported Media Type"
+                return create_response(content_error, 415)
+            content_error['code'] = "Not Acceptable"
+            return create_response(content_error, 406)
+
+        period = read_period(request.get_json(), message)
+        if period is None:
+            return create_response(message, 400)
+        start, end = period
+        if start < time.time():
+            message["code"] = "Bad Request"
+            message["description"] = "A reservation can't start in the past"
+            return create_response(message, 400)
+
+        with client.transaction():
+            bike = client.get(key=bike_key)
+
+            # Call error handler if bike does not exist
+            if not bike:
+                message['code'] = "Not Found"
+                message['description'] = "No bike with this bike_id exists"
+                return create_response(message, 404)
+
+            # Call error handler if the period overlaps another reservation of the bike
+            if reservations.Schedule(reservations.get_reservations(bike_id)).overlaps(start, end):
+                message['code'] = "Conflict"
+                message['description'] = "The bike is already reserved for part of this period"
+                return create_response(message, 409)
+
+            # Save the reservation and complete the request's Idempotency-Key in the same commit
+            reservation = reservations.new_reservation(bike, payload['sub'], start, end)
+            res = create_response(reservation_data(reservation, payload['sub']), 201)
+            client.put(reservation)
+            changefeed.record('reserve', constants.BIKES, bike_id)
+            idempotency.complete_in_transaction(res)
+        reservations.touch(bike_id)
+
+        return res
+
+    # List the upcoming reservations of the bike
+    elif request.method == 'GET':
+        if not client.get(key=bike_key):
+            message['code'] = "Not Found"
+            message['description'] = "No bike with this bike_id exists"
+            return create_response(message, 404)
+
+        output = {"reservations": [reservation_data(r, payload['sub'])
+                                   for r in reservations.get_reservations(bike_id)]}
+        return create_response(output, 200)
+
+    else:
+        message["code"] = "Method Not Allowed"
+        message["description"] = "Invalid Request Method"
+        return create_response(message, 405)
+
+
+"""
+Route to handle cancelling a reservation. Only the user who made the reservation can cancel it.
+"""
+@bp.route('/<bike_id>/reservations/<reservation_id>', methods=['DELETE'])
+def reservations_delete(bike_id, reservation_id):
+
+    # Create dictionary object for response message
+    message = {}
+
+    # Validate JWT
+    payload = verify_jwt(request)
+
+    with client.transaction():
+        reservation_key = reservations.reservation_key(bike_id, reservation_id)
+        reservation = client.get(key=reservation_key)
+
+        # Call error handler if reservation does not exist
+        if not reservation:
+            message['code'] = "Not Found"
+            message['description'] = "No reservation with this reservation_id exists for this bike"
+            return create_response(message, 404)
+
+        # Call error handler if the reservation was made by another user
+        if str(reservation['renter_id']) != str(payload['sub']):
+            message['code'] = "Forbidden"
+            message['description'] = "You cannot cancel a reservation made by another user"
+            return create_response(message, 403)
+
+        client.delete(reservation_key)
+        changefeed.record('cancel', constants.BIKES, bike_id)
+    reservations.touch(bike_id)
+
+    return ('', 204)
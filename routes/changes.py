@@ -0,0 +1,173 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+from flask import request, Blueprint, Response, stream_with_context
+import queue
+import json
+import time
+import threading
+from validate import verify_jwt, verify_admin, create_response
+import constants
+import changefeed
+
+bp = Blueprint('changes', __name__, url_prefix='/changes')     # Create a blueprint for the change feed
+
+_streams = threading.BoundedSemaphore(constants.CHANGEFEED_MAX_STREAMS)    # Open streams on this instance
+
+
+"""
+Helper function to format an event as a Server-Sent Event.
+"""
+def _sse(event):
+    return "id: %s\nevent: %s\ndata: %s\n\n" % (event['id'], event['action'], json.dumps(event))
+
+
+"""
+Route to handle following the changes made to bikes, components and users. Changes can be filtered with
+'kind' ('bikes', 'components' or 'users') and with 'entity_id' together with 'kind'. Clients resume from
+the last event they received with the 'Last-Event-ID' header or 'last_event_id' query parameter.
+
+Requests that accept 'text/event-stream' receive the changes as Server-Sent Events for up to
+CHANGEFEED_STREAM_SECONDS, after which the client reconnects. Other requests are long-polled: the response
+is sent as soon as there is at least one change, or after 'timeout' seconds with an empty list.
+"""
+@bp.route('', methods=['GET'])
+def changes_get():
+
+    # Create dictionary object for response message
+    message = {}
+
+    # Validate JWT
+    verify_jwt(request)
+
+    kind = request.args.get('kind')
+    entity_id = request.args.get('entity_id')
+    if entity_id and not kind:
+        message["code"] = "Bad Request"
+        message["description"] = "'entity_id' can only be used together with 'kind'"
+        return create_response(message, 400)
+    entity = "%s:%s" % (kind, entity_id) if entity_id else None
+
+    # Start after the last event the client received, or at the current time for new clients
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    last_ts = changefeed.event_ts(last_event_id) if last_event_id else None
+    resumed = last_ts is not None
+    if not resumed:
+        last_ts = time.time_ns()
+
+    try:
+        timeout = min(float(request.args.get('timeout', constants.CHANGEFEED_LONG_POLL_SECONDS)),
+                      constants.CHANGEFEED_LONG_POLL_SECONDS)
+    except ValueError:
+        message["code"] = "Bad Request"
+        message["description"] = "'timeout' must be a number"
+        return create_response(message, 400)
+
+    if not _streams.acquire(blocking=False):
+        message["code"] = "Service Unavailable"
+        message["description"] = "Too many open change feeds, retry later"
+        res = create_response(message, 503)
+        res.headers['Retry-After'] = str(constants.ADMISSION_RETRY_AFTER)
+        return res
+
+    # Subscribe before reading the log so that no change is missed in between. A resumed feed sends the
+    # events in the overlap of the change log before the last event again, except the last event itself, since
+    # some of them may have been written after the client read past them. A new feed only sends the events
+    # written from now on.
+    subscription = changefeed.broker.subscribe(kind, entity)
+    try:
+        window = changefeed.EventWindow(last_ts, kind, entity, [last_event_id] if resumed else ())
+        backlog = window.read(constants.CHANGEFEED_PAGE_SIZE)
+        while not resumed and len(backlog) == constants.CHANGEFEED_PAGE_SIZE:
+            backlog = window.read(constants.CHANGEFEED_PAGE_SIZE)
+        if not resumed:
+            backlog = []
+    except Exception:
+        changefeed.broker.unsubscribe(subscription)
+        _streams.release()
+        raise
+
+    def events(deadline):
+        page = backlog
+        while page:
+            for event in page:
+                yield event
+            page = window.read(constants.CHANGEFEED_PAGE_SIZE) if len(page) == constants.CHANGEFEED_PAGE_SIZE else []
+        while not subscription.closed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                event = subscription.queue.get(timeout=min(remaining, constants.CHANGEFEED_HEARTBEAT))
+            except queue.Empty:
+                yield None
+                continue
+            if window.add(event):
+                yield event
+
+    closed = []
+
+    def close():
+        if not closed:
+            closed.append(True)
+            changefeed.broker.unsubscribe(subscription)
+            _streams.release()
+
+    # Stream the changes as Server-Sent Events
+    if 'text/event-stream' in request.accept_mimetypes:
+        def stream():
+            try:
+                yield "retry: %d\n\n" % (constants.ADMISSION_RETRY_AFTER * 1000)
+                for event in events(time.monotonic() + constants.CHANGEFEED_STREAM_SECONDS):
+                    yield _sse(event) if event else ": heartbeat\n\n"
+            finally:
+                close()
+
+        res = Response(stream_with_context(stream()), mimetype='text/event-stream')
+        res.call_on_close(close)
+        res.headers['Cache-Control'] = 'no-cache'
+        res.headers['X-Accel-Buffering'] = 'no'
+        return res
+
+    # Long-poll until there is at least one change or the timeout has passed, dropping the changes that are
+    # already in the backlog
+    try:
+        events_out = list(backlog)
+        deadline = time.monotonic() + timeout
+        while not events_out and not subscription.closed and time.monotonic() < deadline:
+            try:
+                event = subscription.queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if window.add(event):
+                events_out.append(event)
+
+        # Include the other changes that arrived while waiting
+        while not subscription.queue.empty():
+            event = subscription.queue.get_nowait()
+            if window.add(event):
+                events_out.append(event)
+    finally:
+        close()
+
+    if events_out:
+        last_event_id = events_out[-1]['id']
+    output = {"events": events_out, "last_event_id": last_event_id or "%020d-0" % last_ts}
+    return create_response(output, 200)
+
+
+"""
+Route to handle deleting the events older than CHANGEFEED_RETENTION seconds from the change log. Called daily
+by the App Engine cron service, which sets the 'X-Appengine-Cron' header, or by an administrator.
+"""
+@bp.route('/prune', methods=['GET'])
+def changes_prune():
+
+    # Validate JWT unless the request comes from the cron service
+    if request.headers.get('X-Appengine-Cron') != 'true':
+        verify_admin(request)
+
+    return create_response({"deleted": changefeed.prune()}, 200)
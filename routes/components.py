@@ -4,22 +4,48 @@
 # Assignment: Portfolio - Final Project
 
 
-from google.cloud import datastore
 from flask import request, Blueprint
-from validate import create_response, check_content_type
+from validate import create_response, check_content_type, check_owned
 import constants
+from idempotency import idempotent
+from db import client
+import uow
+import relations
+import changefeed
+import consistency
+import inventory
+import edgecache
+import search
+from models import Component, app_url
 
-client = datastore.Client()                                           # Create a client to access Datastore
 bp = Blueprint('components', __name__, url_prefix='/components')      # Create a blueprint for the bikes entity
 
-# app_url = "http://127.0.0.1:8080"                                     URL for Local self link
-app_url = "https://portfolio-lohrcl.uc.r.appspot.com"                 # URL for GCP self link
+
+"""
+Helper function to update the description of a component in the 'specs' of the bike it is installed on. The
+time it was installed is kept, so the bike's 'specs' keep their order.
+"""
+def _update_spec(component_id, carrier, description):
+    spec = uow.get(relations.spec_key(carrier['id'], component_id))
+    if spec is None:
+        spec = relations.new_spec(carrier['id'], component_id, description)
+    spec['description'] = description
+    uow.put(spec)
+
+
+"""
+Helper function to mark the inventory of the user renting the bike a component is installed on as changed.
+"""
+def _touch_carrier(component):
+    if component['carrier']:
+        inventory.touch_bike(uow.get(client.key(constants.BIKES, int(component['carrier']['id']))))
 
 
 """
 Route to handle creating a component entity and listing all component entities in the '/components' collection.
 """
 @bp.route('', methods=['POST', 'GET'])
+@idempotent(methods=['POST'])
 def components_get_post():
 
     # Create dictionary object for response message
@@ -46,18 +72,17 @@ def components_get_post():
             return create_response(content_error, 406)
 
         content = request.get_json()
-        # Create new component entity and update its attributes
-        new_component = datastore.entity.Entity(key=client.key(constants.COMPONENTS))
-        new_component.update({"manufacturer": content["manufacturer"], "description": content["description"],
-                              "condition": content["condition"]})
-
-        # Add 'carrier' attribute to the entity
-        new_component["carrier"] = None
-        client.put(new_component)
-
-        # Add id and self link to the response body
-        new_component["id"] = new_component.key.id
-        new_component["self"] = app_url + "/components/" + str(new_component.key.id)
+        # Create new component with its attributes and an empty 'carrier'
+        new_component = Component({"manufacturer": content["manufacturer"], "description": content["description"],
+                                   "condition": content["condition"], "carrier": None})
+        entity = new_component.to_entity(client.key(constants.COMPONENTS))
+        client.put(entity)
+        changefeed.record('create', constants.COMPONENTS, entity.key.id)
+        edgecache.purge(edgecache.COMPONENT_PAGES)
+        search.put(entity.key.id, entity)
+
+        # Add id to the response body
+        new_component.id = entity.key.id
 
         return create_response(new_component, 201)
 
@@ -70,9 +95,9 @@ def components_get_post():
         # set limit and offset to limit the records per response
         q_limit = int(request.args.get('limit', '5'))
         q_offset = int(request.args.get('offset', '0'))
-        g_iterator = query.fetch(limit=q_limit, offset=q_offset)
+        g_iterator = query.fetch(limit=q_limit, offset=q_offset, eventual=consistency.eventual())
         pages = g_iterator.pages
-        results = list(next(pages))
+        results = [Component.from_entity(e) for e in next(pages)]
 
         # Create a 'next' link by adding the limit to the current offset
         if g_iterator.next_page_token:
@@ -81,17 +106,6 @@ def components_get_post():
         else:
             next_url = None
 
-        # Add component id and self link to response body
-        for e in results:
-            e["id"] = e.key.id
-            e["self"] = app_url + "/components/" + str(e.key.id)
-
-            # Add bike id and self link to the response body
-            if e['carrier']:
-                carrier = e['carrier']
-                bike_id = carrier['id']
-                carrier['self'] = app_url + "/bikes/" + str(bike_id)
-
         # Create a dictionary object to hold the list of components
         output = {"components": results}
 
@@ -102,7 +116,10 @@ def components_get_post():
         if next_url:
             output["next"] = next_url\
 
-        return create_response(output, 200)
+        # The page is purged when any component on it changes or a component is created or deleted
+        keys = [edgecache.COMPONENT_PAGES, edgecache.page_key(q_offset, q_limit)]
+        keys += [edgecache.component_key(e.id) for e in results]
+        return edgecache.cacheable(create_response(output, 200), keys)
 
     # Invalid request method
     else:
@@ -111,6 +128,42 @@ def components_get_post():
         return create_response(message, 405)
 
 
+"""
+Route to handle searching the '/components' collection as the user types. Components are found by the start of
+the words in their 'manufacturer' and 'description', so 'shi' finds Shimano shifters, and at most 'limit' of
+them are returned, best match first.
+"""
+@bp.route('/search', methods=['GET'])
+def components_search():
+
+    # Create dictionary object for response message
+    message = {}
+
+    try:
+        q_limit = max(1, min(int(request.args.get('limit', constants.SEARCH_DEFAULT_LIMIT)),
+                             constants.SEARCH_MAX_LIMIT))
+    except ValueError:
+        message["code"] = "Bad Request"
+        message["description"] = "'limit' must be an integer"
+        return create_response(message, 400)
+
+    # Call error handler if the instance is still building its index
+    search.index.start()
+    if not search.index.ready.wait(constants.SEARCH_READY_WAIT):
+        message["code"] = "Service Unavailable"
+        message["description"] = "The component search is not ready yet, retry later"
+        return create_response(message, 503)
+
+    # Add the matching components with their id and self link to the response body
+    results = [{'id': component_id, 'manufacturer': manufacturer, 'description': description,
+                'score': score, 'self': app_url + "/components/" + str(component_id)}
+               for score, component_id, manufacturer, description
+               in search.index.search(request.args.get('q', ''), q_limit)]
+    output = {"components": results, "total_items": len(results)}
+
+    return create_response(output, 200)
+
+
 """
 Route to handle modifying, deleting, and listing an existing component entity in the '/components' collection
 given a component_id.
@@ -123,7 +176,7 @@ def components_put_delete(component_id):
 
     # Get component entity with 'component_id' from database
     component_key = client.key(constants.COMPONENTS, int(component_id))
-    component = client.get(key=component_key)
+    component = uow.get(component_key)
 
     # Call error handler if component does not exist
     if not component:
@@ -135,6 +188,10 @@ def components_put_delete(component_id):
     if request.method == 'PUT':
         content = request.get_json()
 
+        # Call error handler if the request object sets a property only the server sets
+        if check_owned(content, Component, message):
+            return create_response(message, 400)
+
         # Check if input includes required attributes
         if len(content) != 3:
             # Call error handler if request object content is invalid
@@ -153,54 +210,40 @@ def components_put_delete(component_id):
         # Update component attributes
         component.update({"manufacturer": content["manufacturer"], "description": content["description"],
                          "condition": content["condition"]})
-        client.put(component)
+        uow.put(component)
 
-        # Check if the component is currently assigned to a bike
+        # Update the component's description in the 'specs' of the bike it is assigned to
         if component['carrier']:
-            carrier = component['carrier']
-            bike_key = client.key(constants.BIKES, int(carrier['id']))
-            bike = client.get(key=bike_key)
-
-            # Iterate through all components on a bike and update component with component_id
-            for i in bike['specs']:
-                if int(i['id']) == int(component_id):
-                    bike['specs'].remove(i)
-                    component_data = {'id': int(component_id), 'description': content['description']}
-                    bike['specs'].append(component_data)
-                    client.put(bike)
+            _update_spec(component_id, component['carrier'], content['description'])
 
+        changefeed.record('update', constants.COMPONENTS, component_id,
+                          [(constants.BIKES, component['carrier']['id'])] if component['carrier'] else [])
+        _touch_carrier(component)
+        edgecache.purge(edgecache.component_key(component_id))
+        search.put(component_id, component)
         return ('', 204)
 
     elif request.method == 'PATCH':
         content = request.get_json()
 
+        # Call error handler if the request object sets a property only the server sets
+        if check_owned(content, Component, message):
+            return create_response(message, 400)
+
         # Checks if the requested attributes to modify are valid
         for key in content:
             component.update({str(key): content[str(key)]})
-        client.put(component)
+        uow.put(component)
 
-        # Check if the component is currently assigned to a bike
-        if component['carrier']:
-            carrier = component['carrier']
-            bike_key = client.key(constants.BIKES, int(carrier['id']))
-            bike = client.get(key=bike_key)
-
-            # Iterate through all components on a bike and update component with component_id
-            for i in bike['specs']:
-                if int(i['id']) == int(component_id):
-                    bike['specs'].remove(i)
-
-                    # Update description
-                    if 'description' in content:
-                        component_data = {'id': int(component_id), 'description': content['description']}
-
-                    # Don't update description
-                    else:
-                        component_data = {'id': int(component_id), 'description': component['description']}
-
-                    bike['specs'].append(component_data)
-                    client.put(bike)
+        # Update the component's description in the 'specs' of the bike it is assigned to
+        if component['carrier'] and 'description' in content:
+            _update_spec(component_id, component['carrier'], content['description'])
 
+        changefeed.record('update', constants.COMPONENTS, component_id,
+                          [(constants.BIKES, component['carrier']['id'])] if component['carrier'] else [])
+        _touch_carrier(component)
+        edgecache.purge(edgecache.component_key(component_id))
+        search.put(component_id, component)
         return ('', 204)
 
     # Delete a component entity
@@ -213,31 +256,22 @@ def components_put_delete(component_id):
             bike = component["carrier"]
             bike_id = bike['id']
 
-            # Get bike entity with 'bike_id' from database
-            bike_key = client.key(constants.BIKES, int(bike_id))
-            bike = client.get(key=bike_key)
-
-            # Iterate through the bike's components a remove the component matching component_id
-            for i in bike['specs']:
-                if int(i['id']) == int(component_id):
-                    bike['specs'].remove(i)
-                    client.put(bike)
-                    break
+            # Remove the component from the bike's 'specs'
+            uow.delete(relations.spec_key(bike_id, component_id))
 
-        client.delete(component)
+        uow.delete(component_key)
+        changefeed.record('delete', constants.COMPONENTS, component_id,
+                          [(constants.BIKES, component['carrier']['id'])] if component['carrier'] else [])
+        _touch_carrier(component)
+        edgecache.purge(edgecache.component_key(component_id), edgecache.COMPONENT_PAGES)
+        search.remove(component_id)
         return ('', 204)
 
     # Get a component entity
     elif request.method == 'GET':
 
-        # Add self link to carrier if component is on a bike
-        if component['carrier']:
-            component['carrier']['self'] = app_url + "/bikes/" + str(component['carrier']['id'])
-
-        # Add id and self link to the response body
-        component["id"] = component.key.id
-        component["self"] = app_url + "/components/" + str(component.key.id)
-        return create_response(component, 200)
+        return edgecache.cacheable(create_response(Component.from_entity(component), 200),
+                                   [edgecache.component_key(component.key.id)])
 
     # Invalid request method
     else:
@@ -0,0 +1,62 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+from flask import request, Blueprint
+from validate import verify_admin, create_response
+from importtime import timed_import
+import constants
+
+bp = Blueprint('analytics', __name__, url_prefix='/analytics')     # Create a blueprint for fleet reports
+
+
+"""
+Route to handle getting the fleet utilization report: rental hours and utilization of each bike type and
+size, utilization of the whole fleet over time, the share of idle bikes and the number of components of
+each manufacturer in each condition. The report covers the last 'days' days, with the utilization split into
+'bucket' ('hour', 'day' or 'week') periods.
+"""
+@bp.route('', methods=['GET'])
+def analytics_get():
+
+    # Create dictionary object for response message
+    message = {}
+
+    # Validate JWT
+    verify_admin(request)
+
+    bucket = request.args.get('bucket', 'day')
+    try:
+        days = int(request.args.get('days', constants.ANALYTICS_DEFAULT_DAYS))
+    except ValueError:
+        days = 0
+
+    # Call error handler if the report would be too long
+    if not 0 < days <= constants.ANALYTICS_MAX_DAYS:
+        message["code"] = "Bad Request"
+        message["description"] = "'days' must be between 1 and %d" % constants.ANALYTICS_MAX_DAYS
+        return create_response(message, 400)
+    if bucket not in constants.ANALYTICS_BUCKETS:
+        message["code"] = "Bad Request"
+        message["description"] = "'bucket' must be one of %s" % ", ".join(constants.ANALYTICS_BUCKETS)
+        return create_response(message, 400)
+    if days * 86400 // constants.ANALYTICS_BUCKETS[bucket] > constants.ANALYTICS_MAX_BUCKETS:
+        message["code"] = "Bad Request"
+        message["description"] = "A report can have at most %d buckets, use a longer 'bucket'" \
+                                 % constants.ANALYTICS_MAX_BUCKETS
+        return create_response(message, 400)
+
+    # NumPy is only imported when the first report is requested
+    analytics = timed_import('analytics')
+    result = analytics.report(days, constants.ANALYTICS_BUCKETS[bucket])
+
+    # Call error handler if the report is still being computed
+    if result is None:
+        message["code"] = "Service Unavailable"
+        message["description"] = "The report is being computed, retry later"
+        res = create_response(message, 503)
+        res.headers['Retry-After'] = str(constants.ADMISSION_RETRY_AFTER)
+        return res
+    return create_response(result, 200)
@@ -4,17 +4,25 @@
 # Assignment: Portfolio - Final Project
 
 
-from google.cloud import datastore
-from flask import request, Blueprint
+from flask import request, Blueprint, make_response
+from six.moves.urllib.parse import urlencode
 from validate import verify_jwt, create_response
 import constants
+import idempotency
+from idempotency import idempotent
+from db import client
+import availability
+import uow
+import relations
+import changefeed
+import consistency
+from expand import expand, parse
+import inventory
+import reservations
+from models import User
 
-client = datastore.Client()                                # Create a client to access Datastore
 bp = Blueprint('users', __name__, url_prefix='/users')     # Create a blueprint for the bikes entity
 
-# app_url = "http://127.0.0.1:8080"                                     URL for Local self link
-app_url = "https://portfolio-lohrcl.uc.r.appspot.com"                 # URL for GCP self link
-
 
 """
 Route to handle listing all user entities in the '/users' collection.
@@ -28,22 +36,11 @@ def users_get_all():
     # List all users
     if request.method == 'GET':
 
-        # Fetch all user entities from the '/users' collection
+        # Fetch all user entities from the '/users' collection and the bikes they rent
         query = client.query(kind=constants.USERS)
-        results = list(query.fetch())
-
-        # Iterate through all users
-        for i in results:
-
-            # Iterate through all bike rentals by the user
-            for j in i["rental"]:
-
-                # Add bike self link to response body
-                j['self'] = app_url + "/bikes/" + str(j['id'])
-
-            # Add user id and self link to the response body
-            i['id'] = i.key.id
-            i['self'] = app_url + "/users/" + str(i.key.id)
+        rentals = relations.get_rentals()
+        results = [User.from_entity(i, rental=rentals.get(i.key.id, []))
+                   for i in query.fetch(eventual=consistency.eventual())]
 
         # Create a dictionary object to hold the list of users
         output = {"users": results}
@@ -61,7 +58,8 @@ def users_get_all():
 
 
 """
-Route to handle getting a single user from the '/users' collection with user_id.
+Route to handle getting a single user from the '/users' collection with user_id. The user's rentals can be
+paged with 'limit' and 'cursor', in which case the link to the next page is returned in the 'Link' header.
 """
 @bp.route('/<user_id>', methods=['GET'])
 def user_get(user_id):
@@ -71,7 +69,7 @@ def user_get(user_id):
 
     # Get user entity with 'user_id' from database
     user_key = client.key(constants.USERS, int(user_id))
-    user = client.get(key=user_key)
+    user = uow.get(user_key)
 
     # Call error handler if user does not exist
     if not user:
@@ -79,22 +77,70 @@ def user_get(user_id):
         message['description'] = "No user with this user_id exists"
         return create_response(message, 404)
 
-    # Iterate through all bikes rented by the user
-    for i in user["rental"]:
-        # Add bike self link to response body
-        i['self'] = app_url + "/bikes/" + str(i['id'])
+    # Get a page of the bikes rented by the user, or all of them if no limit is given
+    q_limit = request.args.get('limit')
+    rental, next_cursor = relations.page_rentals(user_id, int(q_limit) if q_limit else None,
+                                                 request.args.get('cursor'))
+
+    # Add the rented bikes and the user id as it was requested to the response body
+    user = User(user, rental=rental, id=user_id)
+
+    # Inline the related resources requested with 'expand'. Rented bikes can only be expanded by the user
+    # renting them, so a JWT is required to expand 'rental'
+    if request.args.get('expand'):
+        sub = verify_jwt(request)['sub'] if 'rental' in parse(request.args['expand'], constants.USERS) else None
+        expand(constants.USERS, [user], request.args['expand'], sub)
+
+    res = create_response(user, 200)
+
+    # Add a link to the next page of rentals
+    if next_cursor:
+        res.headers['Link'] = '<%s?%s>; rel="next"' % (
+            request.base_url, urlencode({'limit': q_limit, 'cursor': next_cursor}))
+    return res
+
+
+"""
+Route to handle getting the inventory of the user with user_id: the user, every bike the user rents and
+every component installed on those bikes. The inventory is kept up to date as a single precomputed
+document so that it is served with one key lookup.
+"""
+@bp.route('/<user_id>/inventory', methods=['GET'])
+def user_inventory_get(user_id):
+
+    # Create dictionary object for response message
+    message = {}
+
+    # Validate JWT
+    payload = verify_jwt(request)
+
+    # Get the inventory document for the user with user_id
+    document, renter_id = inventory.get(user_id)
+
+    # Call error handler if user does not exist
+    if document is None:
+        message['code'] = "Not Found"
+        message['description'] = "No user with this user_id exists"
+        return create_response(message, 404)
 
-    # Add user id and self link to the response body
-    user['id'] = user_id
-    user['self'] = app_url + "/users/" + str(user_id)
+    # Call error handler if the inventory belongs to another user
+    if str(renter_id) != str(payload['sub']):
+        message['code'] = "Forbidden"
+        message['description'] = "You cannot view the inventory of another user"
+        return create_response(message, 403)
 
-    return create_response(user, 200)
+    # The document is already JSON, so it is returned without being decoded and encoded again
+    res = make_response(document)
+    res.mimetype = 'application/json'
+    res.status_code = 200
+    return res
 
 
 """
 Route to handle renting the bike with bike_id to the user with user_id.
 """
 @bp.route('/<user_id>/bikes/<bike_id>', methods=['PUT', 'DELETE'])
+@idempotent(methods=['PUT', 'DELETE'])
 def users_put_delete(user_id, bike_id):
 
     # Validate JWT
@@ -103,13 +149,10 @@ def users_put_delete(user_id, bike_id):
     # Create dictionary object for response message
     message = {}
 
-    # Get bike entity with 'bike_id' from database
+    # Get bike entity with 'bike_id' and users entity with 'users_id' from database
     bike_key = client.key(constants.BIKES, int(bike_id))
-    bike = client.get(key=bike_key)
-
-    # Get users entity with 'users_id' from database
     user_key = client.key(constants.USERS, int(user_id))
-    user = client.get(key=user_key)
+    bike, user = uow.get_multi([bike_key, user_key])
 
     # Call error handler if bike or user does not exist
     if not user or not bike:
@@ -131,23 +174,49 @@ def users_put_delete(user_id, bike_id):
             message['description'] = "You cannot modify a bike that you aren't renting"
             return create_response(message, 401)
         """
-        # Call error handler if the user is already assigned to another bike
-        if bike["rentee"]:
-            message["code"] = "Forbidden"
-            message["description"] = "This bike is currently rented out"
-            return create_response(message, 403)
-
-        # Create bike data for users entity
-        bike_data = {'id': int(bike_id)}
-
-        # Add users to bike already carrying users
-        user['rental'].append(bike_data)
-        client.put(user)
-
-        # Update 'carrier' attribute value for user with users_id
-        bike['rentee'] = int(user_id)
-        client.put(bike)
-        return ('', 204)
+        # Rent the bike in a transaction so that two users can't rent the same bike at the same time
+        with client.transaction():
+            bike = client.get(key=bike_key)
+
+            # Call error handler if the bike was deleted since it was read
+            if not bike:
+                message["code"] = "Not Found"
+                message["description"] = "The specified bike and/or user does not exist"
+                return create_response(message, 404)
+
+            # Call error handler if the user is already assigned to another bike
+            if bike["rentee"]:
+                message["code"] = "Forbidden"
+                message["description"] = "This bike is currently rented out"
+                return create_response(message, 403)
+
+            # Call error handler if another user has reserved the bike for now or later. A rental has no end, so
+            # it would overlap any upcoming reservation of another user
+            if any(str(r['renter_id']) != rentee_jwt for r in reservations.get_reservations(bike_id)):
+                message["code"] = "Forbidden"
+                message["description"] = "This bike is reserved by another user"
+                return create_response(message, 403)
+
+            # Add the bike to the user's rentals
+            client.put(relations.new_rental(user_id, bike_id))
+
+            # Update 'carrier' attribute value for user with users_id and store the user's 'sub' so that
+            # requests for the bike can be authorized without reading the user
+            bike['rentee'] = int(user_id)
+            bike['rentee_sub'] = user['renter_id']
+            bike.exclude_from_indexes.add('rentee_sub')
+            client.put(bike)
+            client.put(relations.new_rental_event('rent', bike, user_id))
+
+            # Move the bike from the available to the rented count
+            availability.adjust(bike['type'], bike['bike_size'], available=-1, rented=1)
+            changefeed.record('rent', constants.BIKES, bike_id, [(constants.USERS, user_id)])
+
+            # Complete the request's Idempotency-Key in the same commit as the rental
+            res = idempotency.complete_in_transaction(make_response(('', 204)))
+        inventory.touch(user_id)
+        reservations.touch(bike_id)
+        return res
 
     # Remove a bike from a user
     elif request.method == 'DELETE':
@@ -158,20 +227,35 @@ def users_put_delete(user_id, bike_id):
             message["description"] = "You cannot return a bike that is rented to another user"
             return create_response(message, 401)
 
-        # Check that bike is carrying a user
-        if user['rental']:
-
-            # Iterate through all users on bike and remove users with matching user_id
-            for i in user['rental']:
-                if int(i['id']) == int(bike_id):
-                    user['rental'].remove(i)
-                    client.put(user)
-
-                    # Update 'carrier' attribute value for users with user_id
-                    bike['rentee'] = None
-                    client.put(bike)
-
-                    return ('', 204)
+        # Return the bike in a transaction so that the bike, the user and the counts change together
+        with client.transaction():
+            bike = client.get(key=bike_key)
+            rental_key = relations.rental_key(user_id, bike_id)
+
+            # Call error handler if the bike was deleted since it was read
+            if not bike:
+                message["code"] = "Not Found"
+                message["description"] = "The specified bike and/or user does not exist"
+                return create_response(message, 404)
+
+            # Remove the bike from the user's rentals if the user is renting it
+            if client.get(key=rental_key):
+                client.delete(rental_key)
+
+                # Update 'carrier' attribute value for users with user_id
+                bike['rentee'] = None
+                bike.pop('rentee_sub', None)
+                client.put(bike)
+                client.put(relations.new_rental_event('return', bike, user_id))
+
+                # Move the bike from the rented to the available count
+                availability.adjust(bike['type'], bike['bike_size'], available=1, rented=-1)
+                changefeed.record('return', constants.BIKES, bike_id, [(constants.USERS, user_id)])
+                inventory.touch(user_id)
+                reservations.touch(bike_id)
+
+                # Complete the request's Idempotency-Key in the same commit as the return
+                return idempotency.complete_in_transaction(make_response(('', 204)))
 
         # Call error handler if bike with bike_id is not carrying users with users_id
         message["code"] = "Not Found"
@@ -0,0 +1,65 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import os
+import sys
+
+# The application imports its modules from lib/ and routes/ as top level modules, as it does on App Engine
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ('lib', 'routes'):
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import pytest
+from werkzeug.test import Client
+from fake_datastore import FakeClient
+
+
+"""
+Stand-in for the background rebuilds of inventories, which records the users touched instead.
+"""
+class RecordingRebuilder(object):
+
+    def __init__(self):
+        self.touched = set()
+
+    def add(self, user_ids):
+        self.touched.update(user_ids)
+
+
+"""
+Helper function to authorize requests in tests: the JWT subject is the token in the Authorization header.
+"""
+def fake_verify_jwt(request):
+    from validate import AuthError
+    if 'Authorization' not in request.headers:
+        raise AuthError({"code": "no auth header", "description": "Authorization header is missing"}, 401)
+    return {'sub': request.headers['Authorization'].split()[1]}
+
+
+@pytest.fixture
+def datastore(monkeypatch):
+    import db
+    fake = FakeClient()
+    monkeypatch.setattr(db, '_client', fake)
+    return fake
+
+
+@pytest.fixture
+def app(datastore, monkeypatch):
+    import main
+    import inventory
+    for module in ('bikes', 'users', 'bookings', 'changes', 'main'):
+        monkeypatch.setattr(__import__(module), 'verify_jwt', fake_verify_jwt)
+    monkeypatch.setattr(inventory, 'rebuilder', RecordingRebuilder())
+    monkeypatch.setattr(main.app, 'secret_key', "test")
+    return main.app
+
+
+@pytest.fixture
+def client(app):
+    return Client(app, app.response_class)
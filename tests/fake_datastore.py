@@ -0,0 +1,185 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import copy
+import itertools
+from google.cloud.datastore.entity import Entity
+from google.cloud.datastore.key import Key
+
+
+PROJECT = "test"
+
+
+"""
+Helper function to copy an entity, so the entities handed out by the fake client can be changed without
+changing the stored ones.
+"""
+def _copy(entity):
+    result = Entity(key=entity.key, exclude_from_indexes=tuple(entity.exclude_from_indexes))
+    result.update(copy.deepcopy(dict(entity)))
+    return result
+
+
+"""
+Helper function to tell if a property value matches a query filter. List properties match '=' when any of
+their values does, as they do in Datastore.
+"""
+def _matches(value, op, expected):
+    values = value if isinstance(value, list) else [value]
+    for v in values:
+        try:
+            if op == '=' and v == expected or op == 'IN' and v in expected or \
+                    op == '>' and v > expected or op == '>=' and v >= expected or \
+                    op == '<' and v < expected or op == '<=' and v <= expected:
+                return True
+        except TypeError:
+            pass
+    return False
+
+
+"""
+Transaction of the fake client. Writes are kept until the transaction ends and committed together, or
+dropped if the block raised.
+"""
+class FakeTransaction(object):
+
+    def __init__(self, client):
+        self.client = client
+        self.puts = {}
+        self.deletes = set()
+
+    def __enter__(self):
+        self.client.current_transaction = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.client.current_transaction = None
+        if exc_type is None:
+            self.client.commit(list(self.puts.values()), list(self.deletes))
+        return False
+
+
+"""
+Iterator over the results of a query, with the 'pages' and 'next_page_token' of the real iterator.
+"""
+class FakeIterator(object):
+
+    def __init__(self, results, next_page_token):
+        self._results = results
+        self.next_page_token = next_page_token
+
+    @property
+    def pages(self):
+        return iter([self._results])
+
+    def __iter__(self):
+        return iter(self._results)
+
+
+"""
+Query of the fake client. Supports equality, range and 'IN' filters, ancestors, ordering, offsets, limits and
+cursors.
+"""
+class FakeQuery(object):
+
+    def __init__(self, client, kind, ancestor=None):
+        self.client = client
+        self.kind = kind
+        self.ancestor = ancestor
+        self.filters = []
+        self.order = []
+
+    def add_filter(self, name, op, value):
+        self.filters.append((name, op, value))
+
+    def keys_only(self):
+        pass
+
+    def fetch(self, limit=None, offset=0, start_cursor=None, eventual=False):
+        self.client.queries.append(self)
+        results = [e for e in self.client.entities(self.kind)
+                   if (self.ancestor is None or e.key.flat_path[:len(self.ancestor.flat_path)] ==
+                       self.ancestor.flat_path)
+                   and all(name in e and _matches(e[name], op, value) for name, op, value in self.filters)]
+        results.sort(key=lambda e: e.key.flat_path)
+        for name in reversed(self.order):
+            results.sort(key=lambda e: e.get(name.lstrip('-')), reverse=name.startswith('-'))
+        start = int(start_cursor.decode()) if start_cursor else offset
+        end = len(results) if limit is None else start + limit
+        token = str(end).encode() if end < len(results) else None
+        return FakeIterator(results[start:end], token)
+
+
+"""
+In-memory stand-in for the Datastore client. Every write is committed through commit(), which tests can
+replace to make a commit fail.
+"""
+class FakeClient(object):
+
+    def __init__(self):
+        self.project = PROJECT
+        self.current_transaction = None
+        self.store = {}             # Stored entities, by key
+        self.queries = []           # Queries fetched, oldest first
+        self.reserved = []          # Keys whose ids were reserved
+        self._ids = itertools.count(1000)
+
+    def key(self, *path, **kwargs):
+        return Key(*path, project=PROJECT, **kwargs)
+
+    def allocate_ids(self, incomplete_key, num_ids):
+        return [incomplete_key.completed_key(next(self._ids)) for _ in range(num_ids)]
+
+    def reserve_ids_multi(self, complete_keys):
+        self.reserved.extend(complete_keys)
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+    def entities(self, kind):
+        return [_copy(e) for key, e in self.store.items() if key.kind == kind]
+
+    def commit(self, puts, deletes):
+        for key in deletes:
+            self.store.pop(key, None)
+        for entity in puts:
+            self.store[entity.key] = _copy(entity)
+
+    def get(self, key, eventual=False, **kwargs):
+        entity = self.store.get(key)
+        return _copy(entity) if entity is not None else None
+
+    def get_multi(self, keys, missing=None, eventual=False, **kwargs):
+        return [_copy(self.store[key]) for key in keys if key in self.store]
+
+    def put(self, entity):
+        self.put_multi([entity])
+
+    def put_multi(self, entities):
+        for entity in entities:
+            if entity.key.is_partial:
+                entity.key = entity.key.completed_key(next(self._ids))
+        if self.current_transaction is not None:
+            self.current_transaction.puts.update((e.key, e) for e in entities)
+        else:
+            self.commit(list(entities), [])
+
+    def delete(self, key):
+        self.delete_multi([key])
+
+    def delete_multi(self, keys):
+        if self.current_transaction is not None:
+            self.current_transaction.deletes.update(keys)
+            for key in keys:
+                self.current_transaction.puts.pop(key, None)
+        else:
+            self.commit([], list(keys))
+
+    def query(self, kind=None, ancestor=None):
+        return FakeQuery(self, kind, ancestor)
+
+    def count(self, kind):
+        return len([key for key in self.store if key.kind == kind])
@@ -0,0 +1,36 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import threading
+import pytest
+import admission
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = admission.AdaptiveLimiter(10, 1, 20, 0.1)
+    monkeypatch.setattr(admission, 'global_limiter', limiter)
+    return limiter
+
+
+def test_request_rpcs_are_observed(app, limiter):
+    with app.test_request_context('/bikes'):
+        admission._observe(0.5)
+    assert limiter.latency == 0.5
+
+
+def test_background_rpcs_are_not_observed(limiter):
+    thread = threading.Thread(target=admission._observe, args=(0.5,))
+    thread.start()
+    thread.join()
+    assert limiter.latency is None
+
+
+def test_slow_requests_cut_the_limit(limiter, monkeypatch):
+    monkeypatch.setattr(admission.constants, 'ADMISSION_ADJUST_EVERY', 2)
+    limiter.observe(0.5)
+    limiter.observe(0.5)
+    assert limiter.limit == int(10 * admission.constants.ADMISSION_BACKOFF)
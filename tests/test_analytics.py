@@ -0,0 +1,111 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import threading
+import pytest
+import analytics
+import constants
+from db import new_entity
+
+DAY = 86400
+NOW = 1000 * DAY
+
+
+@pytest.fixture
+def reports(datastore, monkeypatch):
+    monkeypatch.setattr(analytics.time, 'time', lambda: NOW)
+    analytics.reset()
+    yield datastore
+    analytics.reset()
+
+
+"""
+Helper functions to save a bike and a rental event with the fake Datastore client.
+"""
+def save_bike(datastore, bike_id, rentee=None):
+    bike = new_entity(datastore.key(constants.BIKES, bike_id))
+    bike.update({'manufacturer': "Trek", 'type': "road", 'model_year': 2020, 'bike_size': "M", 'rentee': rentee})
+    datastore.put(bike)
+
+
+def save_event(datastore, bike_id, action, ts):
+    event = new_entity(datastore.key(constants.RENTAL_EVENTS))
+    event.update({'action': action, 'bike_id': bike_id, 'user_id': 1, 'type': "road", 'bike_size': "M", 'ts': ts})
+    datastore.put(event)
+
+
+def rental_hours(report):
+    return report['rental_hours'][0]['rental_hours']
+
+
+def test_first_report_only_reads_its_own_days(reports):
+    save_bike(reports, 1)
+    analytics._compute(7, DAY)
+    ts_filters = [(op, value) for query in reports.queries if query.kind == constants.RENTAL_EVENTS
+                  for name, op, value in query.filters if name == 'ts']
+    assert ts_filters == [('>', NOW - 7 * DAY)]
+
+
+def test_rentals_that_started_before_the_report_are_counted(reports):
+    save_bike(reports, 1)
+    save_bike(reports, 2, rentee=5)
+    save_event(reports, 1, 'rent', NOW - 30 * DAY)
+    save_event(reports, 1, 'return', NOW - 6 * DAY)
+    save_event(reports, 2, 'rent', NOW - 30 * DAY)
+
+    # Bike 1 was rented for the first day of the report and bike 2 for all of it
+    assert rental_hours(analytics._compute(7, DAY)) == 8 * 24
+
+
+def test_longer_report_loads_the_earlier_events(reports):
+    save_bike(reports, 1)
+    save_event(reports, 1, 'rent', NOW - 30 * DAY)
+    save_event(reports, 1, 'return', NOW - 20 * DAY)
+    assert rental_hours(analytics._compute(7, DAY)) == 0
+    assert rental_hours(analytics._compute(31, DAY)) == 10 * 24
+
+
+def test_reset_drops_the_loaded_events(reports):
+    save_bike(reports, 1)
+    save_event(reports, 1, 'rent', NOW - 2 * DAY)
+    save_event(reports, 1, 'return', NOW - DAY)
+    assert rental_hours(analytics._compute(7, DAY)) == 24
+    for key in [key for key in reports.store if key.kind == constants.RENTAL_EVENTS]:
+        reports.delete(key)
+    analytics.reset()
+    assert rental_hours(analytics._compute(7, DAY)) == 0
+
+
+def test_report_is_computed_in_the_background(reports, monkeypatch):
+    release = threading.Event()
+    compute = analytics._compute
+
+    def blocked(days, bucket):
+        release.wait(5)
+        return compute(days, bucket)
+    monkeypatch.setattr(analytics, '_compute', blocked)
+    monkeypatch.setattr(constants, 'ANALYTICS_READY_WAIT', 0.01)
+    assert analytics.report(7, DAY) is None
+
+    release.set()
+    monkeypatch.setattr(constants, 'ANALYTICS_READY_WAIT', 5)
+    assert analytics.report(7, DAY)['days'] == 7
+
+
+def test_expired_report_is_returned_while_it_is_computed_again(reports, monkeypatch):
+    first = analytics.report(7, DAY)
+    monkeypatch.setattr(constants, 'ANALYTICS_CACHE_TTL', -1)
+    release = threading.Event()
+    monkeypatch.setattr(analytics, '_compute', lambda days, bucket: release.wait(5) and {})
+    assert analytics.report(7, DAY) is first
+    release.set()
+
+
+def test_delete_resets_the_reports(client, monkeypatch):
+    resets = []
+    monkeypatch.setattr(analytics, 'reset', lambda: resets.append(True))
+    assert client.delete('/delete').status_code == 204
+    assert resets == [True]
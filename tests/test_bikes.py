@@ -0,0 +1,26 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import json
+import constants
+from models import app_url
+
+BIKE = {'manufacturer': "Trek", 'type': "road", 'model_year': 2020, 'bike_size': "M"}
+
+
+def test_created_bike_lists_specs_before_rentee(client, datastore):
+    res = client.post('/bikes', json=BIKE, headers={'Authorization': "Bearer alice", 'Accept': "application/json"})
+    assert res.status_code == 201
+    data = json.loads(res.data)
+    assert list(data) == ['manufacturer', 'type', 'model_year', 'bike_size', 'specs', 'rentee', 'id', 'self']
+    assert data['specs'] == [] and data['rentee'] is None
+    assert data['self'] == app_url + "/bikes/" + str(data['id'])
+
+
+def test_created_bike_does_not_store_specs(client, datastore):
+    client.post('/bikes', json=BIKE, headers={'Authorization': "Bearer alice", 'Accept': "application/json"})
+    [entity] = datastore.entities(constants.BIKES)
+    assert list(entity) == ['manufacturer', 'type', 'model_year', 'bike_size', 'rentee']
@@ -0,0 +1,95 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import pytest
+import changefeed
+import constants
+from db import new_entity
+
+SECOND = 10 ** 9
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(changefeed.time, 'monotonic', lambda: now[0])
+    return now
+
+
+"""
+Helper function to write an event to the change log with the timestamp 'ts'.
+"""
+def write_event(datastore, ts, kind=constants.BIKES, entity_id=1):
+    change = new_entity(datastore.key(constants.CHANGES, "%020d-%08d" % (ts, entity_id)))
+    change.update({'ts': ts, 'action': 'update', 'kind': kind, 'entity_id': entity_id, 'kinds': [kind],
+                   'entities': ["%s:%d" % (kind, entity_id)], 'time': "", 'instance': "other"})
+    datastore.put(change)
+    return change.key.name
+
+
+"""
+Helper function to list the timestamps the change log queries read after.
+"""
+def read_after(datastore):
+    return [value for query in datastore.queries for name, op, value in query.filters if name == 'ts']
+
+
+def test_events_are_returned_once(datastore, clock):
+    window = changefeed.EventWindow(100 * SECOND)
+    first = write_event(datastore, 101 * SECOND)
+    assert [e['id'] for e in window.read()] == [first]
+    assert window.read() == []
+    clock[0] += constants.CHANGEFEED_RESCAN_INTERVAL
+    assert window.read() == []
+
+
+def test_reads_between_rescans_start_at_the_newest_event(datastore, clock):
+    window = changefeed.EventWindow(100 * SECOND)
+    write_event(datastore, 101 * SECOND)
+    window.read()
+    window.read()
+    overlap = int(constants.CHANGEFEED_OVERLAP * SECOND)
+    assert read_after(datastore) == [100 * SECOND - overlap, 101 * SECOND]
+
+
+def test_late_event_is_found_by_the_next_rescan(datastore, clock):
+    window = changefeed.EventWindow(100 * SECOND)
+    write_event(datastore, 105 * SECOND, entity_id=1)
+    window.read()
+
+    # An event with an earlier timestamp commits after the newer one was read
+    late = write_event(datastore, 103 * SECOND, entity_id=2)
+    assert window.read() == []
+    clock[0] += constants.CHANGEFEED_RESCAN_INTERVAL
+    assert [e['id'] for e in window.read()] == [late]
+
+
+def test_resumed_window_skips_the_last_event(datastore, clock):
+    last = write_event(datastore, 100 * SECOND, entity_id=1)
+    missed = write_event(datastore, 99 * SECOND, entity_id=2)
+    window = changefeed.EventWindow(100 * SECOND, seen=[last])
+    assert [e['id'] for e in window.read()] == [missed]
+
+
+def test_window_reads_only_the_subscribed_kinds(datastore, clock):
+    window = changefeed.EventWindow(100 * SECOND, [constants.BIKES, constants.USERS])
+    bike = write_event(datastore, 101 * SECOND, constants.BIKES, 1)
+    write_event(datastore, 102 * SECOND, constants.COMPONENTS, 2)
+    assert [e['id'] for e in window.read()] == [bike]
+    assert ('kinds', 'IN', [constants.BIKES, constants.USERS]) in datastore.queries[0].filters
+
+
+def test_broker_kinds():
+    broker = changefeed.Broker(changefeed.LocalBackend())
+    assert broker.kinds() == []
+    bikes = broker.subscribe(constants.BIKES)
+    broker.subscribe(constants.USERS, "users:1")
+    assert broker.kinds() == [constants.BIKES, constants.USERS]
+    everything = broker.subscribe()
+    assert broker.kinds() is None
+    broker.unsubscribe(everything)
+    broker.unsubscribe(bikes)
+    assert broker.kinds() == [constants.USERS]
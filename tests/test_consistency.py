@@ -0,0 +1,107 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import time
+import pytest
+import constants
+import consistency
+from db import new_entity
+
+BIKE = {'manufacturer': "Trek", 'type': "road", 'model_year': 2020, 'bike_size': "M"}
+
+
+"""
+Helper function to save a user with the fake Datastore client.
+"""
+def save_user(datastore, user_id=7, sub="alice"):
+    user = new_entity(datastore.key(constants.USERS, user_id))
+    user.update({'nickname': sub, 'email': sub + "@example.com", 'verified': True, 'renter_id': sub})
+    datastore.put(user)
+
+
+"""
+Helper function to record the consistency of every lookup made with the fake client.
+"""
+@pytest.fixture
+def lookups(datastore, monkeypatch):
+    lookups = []
+    get_multi = datastore.get_multi
+
+    def recording(keys, missing=None, eventual=False, **kwargs):
+        lookups.append(eventual)
+        return get_multi(keys, missing, eventual)
+    monkeypatch.setattr(datastore, 'get_multi', recording)
+    return lookups
+
+
+@pytest.fixture(autouse=True)
+def no_samples(monkeypatch):
+    monkeypatch.setattr(constants, 'STALENESS_SAMPLE_RATE', 0)
+    monkeypatch.setattr(consistency.probe, '_strong_until', 0)
+
+
+def test_write_sends_the_token_as_a_header_and_a_cookie(client):
+    res = client.post('/bikes', json=BIKE, headers={'Authorization': "Bearer alice", 'Accept': "application/json"})
+    token = res.headers[constants.READ_YOUR_WRITES_HEADER]
+    assert constants.READ_YOUR_WRITES_COOKIE + "=" + token in res.headers['Set-Cookie']
+
+
+def test_failed_write_sends_no_token(client):
+    res = client.post('/bikes', json={}, headers={'Authorization': "Bearer alice", 'Accept': "application/json"})
+    assert res.status_code == 400
+    assert constants.READ_YOUR_WRITES_HEADER not in res.headers
+
+
+def test_user_reads_are_eventual(client, datastore, lookups):
+    save_user(datastore)
+    assert client.get('/users/7').status_code == 200
+    assert lookups == [True]
+
+
+def test_reads_after_a_write_are_strong(client, datastore, lookups):
+    save_user(datastore)
+    client.post('/bikes', json=BIKE, headers={'Authorization': "Bearer alice", 'Accept': "application/json"})
+    lookups[:] = []
+    assert client.get('/users/7').status_code == 200
+    assert lookups == [False]
+
+
+def test_token_header_is_honoured_without_the_cookie(app, datastore):
+    with app.test_request_context('/users/7', method='POST'):
+        token = consistency._signer().sign('write').decode()
+    with app.test_request_context('/users/7', headers={constants.READ_YOUR_WRITES_HEADER: token}):
+        consistency._decide()
+        assert not consistency.eventual()
+    with app.test_request_context('/users/7', headers={constants.READ_YOUR_WRITES_HEADER: token + "x"}):
+        consistency._decide()
+        assert consistency.eventual()
+
+
+def test_component_reads_are_strong(app, datastore):
+    with app.test_request_context('/components/3'):
+        consistency._decide()
+        assert not consistency.eventual()
+
+
+def test_reads_in_a_transaction_are_strong(app, datastore):
+    with app.test_request_context('/users/7'):
+        consistency._decide()
+        with datastore.transaction():
+            assert not consistency.eventual()
+        assert consistency.eventual()
+
+
+def test_stale_samples_switch_to_strong_reads(app, datastore, monkeypatch):
+    monkeypatch.setattr(constants, 'STALENESS_MAX', 1)
+    consistency.probe._record(2.0)
+    assert consistency.probe.strong_only()
+    with app.test_request_context('/users/7'):
+        consistency._decide()
+        assert not consistency.eventual()
+    consistency.probe._strong_until = time.monotonic() - 1
+    with app.test_request_context('/users/7'):
+        consistency._decide()
+        assert consistency.eventual()
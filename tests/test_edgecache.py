@@ -0,0 +1,122 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import pytest
+from flask import Flask
+from werkzeug.test import Client
+import constants
+import edgecache
+from db import new_entity
+from validate import create_response
+
+JSON = {'Accept': "application/json"}
+
+
+"""
+Stand-in for the edge cache, which records the keys of each purge.
+"""
+class RecordingPurger(object):
+
+    def __init__(self):
+        self.purges = []
+
+    def purge(self, keys):
+        self.purges.append(set(keys))
+
+
+@pytest.fixture
+def purger(monkeypatch):
+    purger = RecordingPurger()
+    monkeypatch.setattr(edgecache, 'purger', purger)
+    return purger
+
+
+"""
+Helper function to save a component with the fake Datastore client.
+"""
+def save_component(datastore, component_id=5):
+    component = new_entity(datastore.key(constants.COMPONENTS, component_id))
+    component.update({'manufacturer': "Shimano", 'description': "Brake", 'condition': "new", 'carrier': None})
+    datastore.put(component)
+
+
+def test_update_purges_the_component_after_its_changes_are_written(client, datastore, purger, monkeypatch):
+    save_component(datastore)
+    commit = datastore.commit
+    purged_before_commit = []
+
+    def checking(puts, deletes):
+        purged_before_commit.append(bool(purger.purges))
+        commit(puts, deletes)
+    monkeypatch.setattr(datastore, 'commit', checking)
+    res = client.patch('/components/5', json={'condition': "worn"}, headers=JSON)
+    assert res.status_code == 204
+    assert purged_before_commit == [False]
+    assert purger.purges == [{edgecache.component_key(5)}]
+
+
+def test_purges_of_a_request_are_sent_together(app, purger):
+    with app.test_request_context('/'):
+        edgecache.purge(edgecache.component_key(5))
+        edgecache.purge(edgecache.component_key(6), edgecache.COMPONENT_PAGES)
+        assert purger.purges == []
+        app.process_response(app.response_class())
+    assert purger.purges == [{edgecache.component_key(5), edgecache.component_key(6), edgecache.COMPONENT_PAGES}]
+
+
+def test_failed_request_purges_nothing(client, datastore, purger):
+    res = client.patch('/components/5', json={'condition': "worn"}, headers=JSON)
+    assert res.status_code == 404
+    assert purger.purges == []
+
+
+def test_failed_commit_purges_nothing(client, datastore, purger, monkeypatch):
+    save_component(datastore)
+
+    def failing(puts, deletes):
+        raise RuntimeError("commit failed")
+    monkeypatch.setattr(datastore, 'commit', failing)
+    assert client.patch('/components/5', json={'condition': "worn"}, headers=JSON).status_code == 500
+    assert purger.purges == []
+
+
+def test_component_response_is_cacheable(client, datastore):
+    save_component(datastore)
+    res = client.get('/components/5', headers=JSON)
+    assert res.headers['Surrogate-Key'].split() == [edgecache.ALL_COMPONENTS, edgecache.component_key(5)]
+    assert res.headers['Surrogate-Control'] == "max-age=%d" % constants.CACHE_EDGE_MAX_AGE
+
+
+"""
+Application behind the in-memory cache, whose route counts the requests that reach it.
+"""
+@pytest.fixture
+def cached_app(monkeypatch):
+    monkeypatch.setattr(edgecache, 'purger', edgecache.MemoryCache())
+    app = Flask(__name__)
+    app.hits = 0
+    edgecache.init_app(app)
+
+    @app.route('/components/<int:component_id>')
+    def component_get(component_id):
+        app.hits += 1
+        return edgecache.cacheable(create_response({'id': component_id}, 200),
+                                   [edgecache.component_key(component_id)])
+    return app
+
+
+def test_memory_cache_serves_until_purged(cached_app):
+    client = Client(cached_app, cached_app.response_class)
+    assert client.get('/components/5').headers['X-Cache'] == "MISS"
+    res = client.get('/components/5')
+    assert res.headers['X-Cache'] == "HIT"
+    assert res.get_json() == {'id': 5}
+    assert cached_app.hits == 1
+    edgecache.purger.purge([edgecache.component_key(6)])
+    assert client.get('/components/5').headers['X-Cache'] == "HIT"
+    edgecache.purger.purge([edgecache.component_key(5)])
+    assert client.get('/components/5').headers['X-Cache'] == "MISS"
+    assert cached_app.hits == 2
@@ -0,0 +1,79 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import pytest
+import constants
+import expand
+import relations
+from db import new_entity
+
+AUTH = {'Authorization': "Bearer alice", 'Accept': "application/json"}
+
+
+"""
+Helper function to save a user renting bike 1, which carries components 5 and 6, with the fake Datastore
+client.
+"""
+def save_garage(datastore):
+    user = new_entity(datastore.key(constants.USERS, 7))
+    user.update({'nickname': "alice", 'email': "alice@example.com", 'verified': True, 'renter_id': "alice"})
+    bike = new_entity(datastore.key(constants.BIKES, 1))
+    bike.update({'manufacturer': "Trek", 'type': "road", 'model_year': 2020, 'bike_size': "M", 'rentee': 7,
+                 'rentee_sub': "alice"})
+    entities = [user, bike, relations.new_rental(7, 1)]
+    for component_id, description in ((5, "Brake"), (6, "Fork")):
+        component = new_entity(datastore.key(constants.COMPONENTS, component_id))
+        component.update({'manufacturer': "Shimano", 'description': description, 'condition': "new",
+                          'carrier': {'id': 1, 'manufacturer': "Trek"}})
+        entities += [component, relations.new_spec(1, component_id, description, added=component_id)]
+    datastore.put_multi(entities)
+
+
+def test_parse_builds_the_tree_of_related_resources():
+    assert expand.parse("specs, rentee.rental", constants.BIKES) == {'specs': {}, 'rentee': {'rental': {}}}
+    assert expand.parse(None, constants.BIKES) == {}
+
+
+@pytest.mark.parametrize('value', ["owner", "specs.carrier", "rentee.rental.specs"])
+def test_parse_rejects_invalid_paths(value):
+    with pytest.raises(expand.ExpandError) as error:
+        expand.parse(value, constants.BIKES)
+    assert error.value.status_code == 400
+
+
+def test_bike_inlines_its_components_and_rentee(client, datastore):
+    save_garage(datastore)
+    res = client.get('/bikes/1?expand=specs,rentee.rental', headers=AUTH)
+    assert res.status_code == 200
+    bike = res.get_json()
+    assert [(c['id'], c['condition']) for c in bike['specs']] == [(5, "new"), (6, "new")]
+    assert bike['rentee']['nickname'] == "alice"
+    assert bike['rentee']['rental'][0]['manufacturer'] == "Trek"
+
+
+def test_related_resources_are_read_in_one_batch_per_level(client, datastore, monkeypatch):
+    save_garage(datastore)
+    lookups = []
+    get_multi = datastore.get_multi
+    monkeypatch.setattr(datastore, 'get_multi', lambda keys, **kwargs: lookups.append(keys) or get_multi(keys))
+    client.get('/bikes/1?expand=specs', headers=AUTH)
+    assert sorted(key.id for key in lookups[-1]) == [5, 6]
+
+
+def test_rentals_are_only_inlined_for_the_renter(client, datastore):
+    save_garage(datastore)
+    res = client.get('/users/7?expand=rental', headers={'Authorization': "Bearer bob"})
+    assert res.get_json()['rental'][0] == {'id': 1, 'self': res.get_json()['rental'][0]['self']}
+    res = client.get('/users/7?expand=rental', headers={'Authorization': "Bearer alice"})
+    assert res.get_json()['rental'][0]['manufacturer'] == "Trek"
+
+
+def test_too_many_resources_are_rejected(client, datastore, monkeypatch):
+    save_garage(datastore)
+    monkeypatch.setattr(constants, 'EXPAND_MAX_ITEMS', 1)
+    res = client.get('/bikes/1?expand=specs', headers=AUTH)
+    assert res.status_code == 400
+    assert res.get_json()['code'] == "Bad Request"
@@ -0,0 +1,105 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import pytest
+import constants
+import idempotency
+import uow
+from db import new_entity
+
+BIKE = {'manufacturer': "Trek", 'type': "road", 'model_year': 2020, 'bike_size': "M"}
+
+
+@pytest.fixture(params=['datastore', 'memory'])
+def store(request, monkeypatch, datastore):
+    store = idempotency.make_store(request.param)
+    monkeypatch.setattr(idempotency, 'store', store)
+    return store
+
+
+"""
+Helper function to create a bike with an Idempotency-Key.
+"""
+def post_bike(client, key="key-1", body=BIKE):
+    return client.post('/bikes', json=body, headers={'Authorization': "Bearer alice", 'Idempotency-Key': key,
+                                                     'Accept': "application/json"})
+
+
+"""
+Helper function to make every commit that writes a completed idempotency record fail once.
+"""
+def fail_record_commit(monkeypatch, datastore):
+    commit = datastore.commit
+    failed = []
+
+    def failing(puts, deletes):
+        if not failed and any(e.key.kind == constants.IDEMPOTENCY_KEYS and e.get('state') == 'done' for e in puts):
+            failed.append(True)
+            raise RuntimeError("commit failed")
+        commit(puts, deletes)
+    monkeypatch.setattr(datastore, 'commit', failing)
+
+
+def test_retry_replays_the_first_response(client, datastore, store):
+    first = post_bike(client)
+    second = post_bike(client)
+    assert first.status_code == second.status_code == 201
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert second.get_json()['id'] == first.get_json()['id']
+    assert datastore.count(constants.BIKES) == 1
+
+
+def test_key_reused_for_another_request_is_rejected(client, datastore, store):
+    post_bike(client)
+    assert post_bike(client, body=dict(BIKE, bike_size="L")).status_code == 422
+    assert datastore.count(constants.BIKES) == 1
+
+
+def test_failed_record_write_does_not_duplicate_the_bike(client, datastore, monkeypatch):
+    monkeypatch.setattr(idempotency, 'store', idempotency.DatastoreIdempotencyStore())
+    fail_record_commit(monkeypatch, datastore)
+
+    # The record is written in the bike's transaction, so the bike is not saved without it
+    assert post_bike(client).status_code == 500
+    assert datastore.count(constants.BIKES) == 0
+
+    assert post_bike(client).status_code == 201
+    assert post_bike(client).headers['Idempotent-Replayed'] == 'true'
+    assert datastore.count(constants.BIKES) == 1
+
+
+def test_failed_flush_after_the_handler_committed_replays_on_retry(client, datastore, store, monkeypatch):
+    flush = uow.UnitOfWork.flush
+
+    def failing(self):
+        flush(self)
+        raise RuntimeError("flush failed")
+    monkeypatch.setattr(uow.UnitOfWork, 'flush', failing)
+    assert post_bike(client).status_code == 500
+
+    monkeypatch.setattr(uow.UnitOfWork, 'flush', flush)
+    retry = post_bike(client)
+    assert retry.status_code == 201
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert datastore.count(constants.BIKES) == 1
+
+
+def test_failed_rental_record_write_does_not_rent_twice(client, datastore, monkeypatch):
+    monkeypatch.setattr(idempotency, 'store', idempotency.DatastoreIdempotencyStore())
+    bike_id = post_bike(client, key="create").get_json()['id']
+    user = datastore.key(constants.USERS, 7)
+    entity = new_entity(user)
+    entity.update({'nickname': "alice", 'email': "a@example.com", 'verified': True, 'renter_id': "alice"})
+    datastore.put(entity)
+    fail_record_commit(monkeypatch, datastore)
+
+    path = '/users/7/bikes/%d' % bike_id
+    headers = {'Authorization': "Bearer alice", 'Idempotency-Key': "rent"}
+    assert client.put(path, headers=headers).status_code == 500
+    assert datastore.count(constants.RENTALS) == 0
+    assert client.put(path, headers=headers).status_code == 204
+    assert client.put(path, headers=headers).headers['Idempotent-Replayed'] == 'true'
+    assert datastore.count(constants.RENTALS) == 1
@@ -0,0 +1,77 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import json
+from datetime import datetime, timedelta, timezone
+import constants
+import inventory
+import relations
+from db import new_entity
+
+AUTH = {'Authorization': "Bearer alice"}
+
+
+"""
+Helper function to save a user renting bike 1, which carries component 5, with the fake Datastore client.
+"""
+def save_garage(datastore):
+    user = new_entity(datastore.key(constants.USERS, 7))
+    user.update({'nickname': "alice", 'email': "alice@example.com", 'verified': True, 'renter_id': "alice"})
+    bike = new_entity(datastore.key(constants.BIKES, 1))
+    bike.update({'manufacturer': "Trek", 'type': "road", 'model_year': 2020, 'bike_size': "M", 'rentee': 7})
+    component = new_entity(datastore.key(constants.COMPONENTS, 5))
+    component.update({'manufacturer': "Shimano", 'description': "Brake", 'condition': "new",
+                      'carrier': {'id': 1, 'manufacturer': "Trek"}})
+    datastore.put_multi([user, bike, component, relations.new_spec(1, 5, "Brake"), relations.new_rental(7, 1)])
+
+
+def test_rebuild_saves_the_user_with_the_bikes_and_components(datastore):
+    save_garage(datastore)
+    document = json.loads(inventory.rebuild([7])[7])
+    assert document['user']['id'] == 7
+    assert [i['id'] for i in document['user']['rental']] == [1]
+    assert [b['id'] for b in document['bikes']] == [1]
+    assert [c['id'] for c in document['bikes'][0]['components']] == [5]
+    saved = datastore.get(datastore.key(constants.INVENTORIES, 7))
+    assert json.loads(saved['data']) == document
+    assert saved['renter_id'] == "alice"
+
+
+def test_rebuild_skips_users_that_do_not_exist(datastore):
+    assert inventory.rebuild([8]) == {}
+    assert datastore.count(constants.INVENTORIES) == 0
+
+
+def test_older_document_does_not_replace_a_newer_one(datastore):
+    save_garage(datastore)
+    inventory.rebuild([7])
+    older = new_entity(datastore.key(constants.INVENTORIES, 7))
+    older.update({'renter_id': "alice", 'data': "{}",
+                  'updated': datetime.now(timezone.utc) - timedelta(seconds=1)})
+    inventory._save([older])
+    assert datastore.get(datastore.key(constants.INVENTORIES, 7))['data'] != "{}"
+
+
+def test_inventory_is_built_on_first_read(client, datastore):
+    save_garage(datastore)
+    res = client.get('/users/7/inventory', headers=AUTH)
+    assert res.status_code == 200
+    assert [b['id'] for b in res.get_json()['bikes']] == [1]
+    assert datastore.count(constants.INVENTORIES) == 1
+    assert client.get('/users/7/inventory', headers={'Authorization': "Bearer bob"}).status_code == 403
+    assert client.get('/users/8/inventory', headers=AUTH).status_code == 404
+
+
+def test_return_queues_the_renter_for_a_rebuild(client, datastore):
+    save_garage(datastore)
+    assert client.delete('/users/7/bikes/1', headers=AUTH).status_code == 204
+    assert inventory.rebuilder.touched == {7}
+
+
+def test_failed_return_queues_nothing(client, datastore):
+    save_garage(datastore)
+    assert client.delete('/users/7/bikes/2', headers=AUTH).status_code == 404
+    assert inventory.rebuilder.touched == set()
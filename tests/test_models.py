@@ -0,0 +1,99 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import json
+import types
+import pytest
+import models
+from models import Bike, Component, Rental, Spec, User, app_url
+
+
+"""
+Stand-in for a Datastore entity: a dict of its properties with a key.
+"""
+class FakeEntity(dict):
+
+    def __init__(self, entity_id, properties):
+        dict.__init__(self, properties)
+        self.key = types.SimpleNamespace(id=entity_id)
+
+
+def bike_entity(**extra):
+    properties = {'manufacturer': "Trek", 'type': "road", 'model_year': 2020, 'bike_size': "M",
+                  'rentee': 7, 'rentee_sub': "auth0|7"}
+    properties.update(extra)
+    return FakeEntity(3, properties)
+
+
+def test_bike_keeps_stored_order_and_hides_rentee_sub():
+    bike = Bike.from_entity(bike_entity(), specs=[Spec(5, "Fork")])
+    data = json.loads(json.dumps(bike, default=models.to_json))
+    assert list(data) == ['manufacturer', 'type', 'model_year', 'bike_size', 'rentee', 'specs', 'id', 'self']
+    assert data['specs'] == [{'id': 5, 'description': "Fork", 'self': app_url + "/components/5"}]
+    assert data['id'] == 3
+    assert data['self'] == app_url + "/bikes/3"
+
+
+def test_listing_tail_order():
+    bike = Bike.from_entity(bike_entity(), Bike.LIST_TAIL, specs=[])
+    assert list(bike.to_json())[-3:] == ['id', 'self', 'specs']
+
+
+def test_properties_added_with_patch_are_kept_in_order():
+    bike = Bike.from_entity(bike_entity(color="red"), specs=[])
+    assert bike.get('color') == "red"
+    assert bike.get('missing', 1) == 1
+    assert list(bike.to_json()) == ['manufacturer', 'type', 'model_year', 'bike_size', 'rentee', 'color',
+                                    'specs', 'id', 'self']
+
+
+def test_models_share_property_orders():
+    first = Bike.from_entity(bike_entity(), specs=[])
+    second = Bike.from_entity(bike_entity(), specs=[])
+    assert first._order is second._order
+
+
+def test_response_only_fields_are_not_stored():
+    bike = Bike.from_entity(bike_entity(), specs=[Spec(5, "Fork")])
+    assert bike.properties() == dict(bike_entity())
+
+
+def test_stored_property_named_like_a_response_field_keeps_its_place_not_its_value():
+    user = User(FakeEntity(9, {'nickname': "sam", 'id': 1}), rental=[], id=9)
+    data = user.to_json()
+    assert list(data) == ['nickname', 'id', 'rental', 'self']
+    assert data['id'] == 9
+
+
+def test_component_carrier_is_a_model():
+    component = Component.from_entity(FakeEntity(5, {'manufacturer': "Fox", 'description': "Fork",
+                                                      'condition': "new",
+                                                      'carrier': {'id': 3, 'manufacturer': "Trek"}}))
+    assert isinstance(component.carrier, models.Carrier)
+    data = json.loads(json.dumps(component, default=models.to_json))
+    assert data['carrier'] == {'id': 3, 'manufacturer': "Trek", 'self': app_url + "/bikes/3"}
+    assert data['self'] == app_url + "/components/5"
+    assert component.properties()['carrier'] == {'id': 3, 'manufacturer': "Trek"}
+
+
+def test_component_without_carrier():
+    component = Component.from_entity(FakeEntity(5, {'manufacturer': "Fox", 'description': "Fork",
+                                                      'condition': "new", 'carrier': None}))
+    assert component.to_json()['carrier'] is None
+
+
+def test_rental_to_json():
+    assert Rental(3).to_json() == {'id': 3, 'self': app_url + "/bikes/3"}
+
+
+def test_owned_properties():
+    assert 'rentee' in Bike.owned and 'rentee_sub' in Bike.owned
+    assert 'carrier' in Component.owned
+
+
+def test_to_json_rejects_other_objects():
+    with pytest.raises(TypeError):
+        json.dumps(object(), default=models.to_json)
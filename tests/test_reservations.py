@@ -0,0 +1,124 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import time
+import constants
+import reservations
+from db import new_entity
+from reservations import Schedule
+
+
+def period(start, end):
+    return {'start': start, 'end': end}
+
+
+def bike(bike_type='road', bike_size='M', rentee=None):
+    return {'type': bike_type, 'bike_size': bike_size, 'rentee': rentee}
+
+
+def test_empty_schedule_never_overlaps():
+    assert not Schedule().overlaps(0, 100)
+
+
+def test_schedule_sorts_reservations():
+    schedule = Schedule([period(50, 60), period(10, 20), period(30, 40)])
+    assert schedule.starts == [10, 30, 50]
+    assert schedule.ends == [20, 40, 60]
+
+
+def test_schedule_overlaps():
+    schedule = Schedule([period(10, 20), period(30, 40)])
+    assert schedule.overlaps(15, 16)
+    assert schedule.overlaps(5, 11)
+    assert schedule.overlaps(19, 31)
+    assert schedule.overlaps(0, 100)
+
+
+def test_schedule_periods_are_half_open():
+    schedule = Schedule([period(10, 20), period(30, 40)])
+    assert not schedule.overlaps(0, 10)
+    assert not schedule.overlaps(20, 30)
+    assert not schedule.overlaps(40, 50)
+
+
+def test_fleet_free_by_type_and_size():
+    fleet = reservations._Fleet()
+    fleet.set_bike(1, bike(), None)
+    fleet.set_bike(2, bike(), [period(10, 20)])
+    fleet.set_bike(3, bike(bike_size='L'), None)
+    assert fleet.free('road', 'M', 15, 25, now=0) == [1]
+    assert fleet.free('road', 'M', 20, 30, now=0) == [1, 2]
+    assert fleet.free('road', 'L', 15, 25, now=0) == [3]
+    assert fleet.free('gravel', 'M', 15, 25, now=0) == []
+
+
+def test_fleet_rented_bike_is_only_free_later():
+    fleet = reservations._Fleet()
+    fleet.set_bike(1, bike(rentee=7), None)
+    assert fleet.free('road', 'M', 100, 200, now=150) == []
+    assert fleet.free('road', 'M', 200, 300, now=150) == [1]
+
+
+def test_fleet_set_bike_moves_and_removes():
+    fleet = reservations._Fleet()
+    fleet.set_bike(1, bike(), [period(10, 20)])
+    fleet.set_bike(1, bike(bike_size='L'), None)
+    assert fleet.free('road', 'M', 0, 100, now=0) == []
+    assert fleet.free('road', 'L', 0, 100, now=0) == [1]
+    fleet.set_bike(1, None, None)
+    assert fleet.free('road', 'L', 0, 100, now=0) == []
+    assert 1 not in fleet.bikes and 1 not in fleet.schedules
+
+
+"""
+Helper function to save a bike with the fake Datastore client.
+"""
+def save_bike(datastore, bike_id, **properties):
+    entity = new_entity(datastore.key(constants.BIKES, bike_id))
+    entity.update(dict(bike(), manufacturer="Trek", model_year=2020, **properties))
+    datastore.put(entity)
+    return entity
+
+
+def test_fleet_index_reads_changed_bikes_again(datastore, monkeypatch):
+    save_bike(datastore, 1)
+    index = reservations.FleetIndex()
+    index._load()
+    assert index.free('road', 'M', 0, 100) == [1]
+
+    # The index is only changed by bikes marked as changed on this instance
+    save_bike(datastore, 1, bike_size='L')
+    monkeypatch.setattr(constants, 'RESERVATION_INDEX_TTL', 0.01)
+    index._follow()
+    assert index.free('road', 'M', 0, 100) == [1]
+
+    monkeypatch.setattr(index, '_thread', object())
+    index.invalidate([1])
+    index._follow()
+    assert index.free('road', 'M', 0, 100) == []
+    assert index.free('road', 'L', 0, 100) == [1]
+
+
+def test_fleet_index_ignores_changes_until_started(datastore):
+    index = reservations.FleetIndex()
+    index.invalidate([1])
+    assert index._changed == set()
+
+
+def test_fleet_index_reload_ends_follow(datastore):
+    index = reservations.FleetIndex()
+    index.reload()
+    started = time.monotonic()
+    index._follow()
+    assert time.monotonic() - started < 1
+
+
+def test_requests_mark_the_bikes_they_change(client, monkeypatch):
+    invalidated = []
+    monkeypatch.setattr(reservations.fleet, 'invalidate', invalidated.extend)
+    res = client.post('/bikes', json={'manufacturer': "Trek", 'type': "road", 'model_year': 2020, 'bike_size': "M"},
+                      headers={'Authorization': "Bearer alice", 'Accept': "application/json"})
+    assert invalidated == [res.get_json()['id']]
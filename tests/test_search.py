@@ -0,0 +1,123 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import types
+import pytest
+import search
+
+
+"""
+Stand-in for the Datastore client that returns the given components from a scan of the collection, and calls
+'during' while the scan is running.
+"""
+class FakeClient(object):
+
+    def __init__(self, components, during=None):
+        self.components = components
+        self.during = during
+
+    def query(self, kind):
+        return self
+
+    def fetch(self):
+        for component_id, manufacturer, description in self.components:
+            if self.during:
+                self.during()
+                self.during = None
+            entity = {'manufacturer': manufacturer, 'description': description}
+            yield types.SimpleNamespace(key=types.SimpleNamespace(id=component_id), get=entity.get)
+
+
+@pytest.fixture
+def index():
+    index = search.SearchIndex()
+    index.put(1, "Shimano", "Deore rear derailleur")
+    index.put(2, "SRAM", "GX shifter")
+    index.put(3, "Shimano", "XT shifter")
+    index.put(4, "Fox", "Shimano compatible shock")
+    return index
+
+
+def ids(results):
+    return [result[1] for result in results]
+
+
+def test_tokenize():
+    assert search.tokenize("Shimano XT-8100, 12-speed") == ['shimano', 'xt', '8100', '12', 'speed']
+    assert search.tokenize(None) == []
+
+
+def test_prefixes_score_manufacturer_and_whole_words_higher():
+    scores = search._prefixes("Fox", "fork")
+    assert scores['fox'] == 3
+    assert scores['fo'] == 2
+    assert scores['for'] == 1
+    assert scores['fork'] == 2
+
+
+def test_search_matches_word_prefixes(index):
+    assert sorted(ids(index.search("shi", 10))) == [1, 2, 3, 4]
+    assert ids(index.search("deore", 10)) == [1]
+    assert index.search("campagnolo", 10) == []
+    assert index.search("  ", 10) == []
+
+
+def test_search_ranks_manufacturer_and_whole_words_first(index):
+    assert ids(index.search("shimano", 10)) == [1, 3, 4]
+    assert ids(index.search("shimano shifter", 10)) == [3]
+
+
+def test_search_limit(index):
+    assert len(index.search("shi", 2)) == 2
+
+
+def test_search_returns_the_text(index):
+    assert index.search("deore", 10) == [(2, 1, "Shimano", "Deore rear derailleur")]
+
+
+def test_search_checks_words_longer_than_the_prefixes():
+    index = search.SearchIndex()
+    index.put(1, "Acme", "suspensionfork")
+    index.put(2, "Acme", "suspensionframe")
+    assert ids(index.search("suspensionfo", 10)) == [1]
+
+
+def test_put_replaces_and_remove_deletes(index):
+    index.put(1, "Campagnolo", "Record derailleur")
+    assert ids(index.search("deore", 10)) == []
+    assert ids(index.search("campa", 10)) == [1]
+    index.remove(1)
+    assert ids(index.search("campa", 10)) == []
+    assert 'campa' not in index._tables.prefixes
+    index.remove(1)
+
+
+def test_clear(index):
+    index.clear()
+    assert index.search("shi", 10) == []
+
+
+def test_rebuild_replays_changes_made_during_the_scan(monkeypatch):
+    index = search.SearchIndex()
+    client = FakeClient([(1, "Shimano", "Deore"), (2, "SRAM", "GX")],
+                        during=lambda: (index.put(3, "Fox", "Fork"), index.remove(2)))
+    monkeypatch.setattr(search, 'client', client)
+    index.rebuild()
+    assert index.ready.is_set()
+    assert ids(index.search("shimano", 10)) == [1]
+    assert ids(index.search("fox", 10)) == [3]
+    assert index.search("sram", 10) == []
+    assert index._pending is None
+
+
+def test_clear_during_a_rebuild_discards_it(monkeypatch):
+    index = search.SearchIndex()
+    client = FakeClient([(1, "Shimano", "Deore"), (2, "SRAM", "GX")],
+                        during=lambda: (index.clear(), index.put(3, "Fox", "Fork")))
+    monkeypatch.setattr(search, 'client', client)
+    index.rebuild()
+    assert index.search("shimano", 10) == []
+    assert ids(index.search("fox", 10)) == [3]
@@ -0,0 +1,75 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import time
+import pytest
+from flask import Flask, session, jsonify
+from werkzeug.test import Client
+import sessions
+
+
+@pytest.fixture(params=['memory', 'datastore'])
+def session_app(request, datastore):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.session_interface = sessions.make_session_interface(request.param)
+
+    @app.route('/login/<int:expires_in>')
+    def login(expires_in):
+        session['user'] = {'name': "alice", 'expires_at': time.time() + expires_in}
+        return ''
+
+    @app.route('/user')
+    def user():
+        return jsonify(session.get('user', {}).get('name'))
+
+    @app.route('/logout')
+    def logout():
+        session.clear()
+        return ''
+    return app
+
+
+"""
+Helper function to get the value of the session cookie set by a response.
+"""
+def session_cookie(res):
+    return res.headers['Set-Cookie'].split(';')[0].split('=', 1)[1]
+
+
+def test_session_is_kept_on_the_server(session_app):
+    client = Client(session_app, session_app.response_class)
+    cookie = session_cookie(client.get('/login/3600'))
+    assert "alice" not in cookie
+    sid = cookie.rsplit('.', 1)[0]
+    assert session_app.session_interface.store.get(sid)['user']['name'] == "alice"
+    assert client.get('/user').get_json() == "alice"
+
+
+def test_logout_deletes_the_stored_session(session_app):
+    client = Client(session_app, session_app.response_class)
+    sid = session_cookie(client.get('/login/3600')).rsplit('.', 1)[0]
+    client.get('/logout')
+    assert session_app.session_interface.store.get(sid) is None
+    assert client.get('/user').get_json() is None
+
+
+def test_session_expires_with_its_token(session_app):
+    client = Client(session_app, session_app.response_class)
+    client.get('/login/-1')
+    assert client.get('/user').get_json() is None
+
+
+def test_forged_session_id_is_ignored(session_app):
+    client = Client(session_app, session_app.response_class)
+    sid = session_cookie(client.get('/login/3600')).rsplit('.', 1)[0]
+    other = Client(session_app, session_app.response_class)
+    other.set_cookie(session_app.config['SESSION_COOKIE_NAME'], sid + ".forged")
+    assert other.get('/user').get_json() is None
+
+
+def test_cookie_sessions_are_kept_without_a_backend():
+    assert sessions.make_session_interface(None) is None
@@ -0,0 +1,113 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import threading
+import time
+import pytest
+import singleflight
+
+
+class FakeClient(object):
+    current_transaction = None
+
+
+@pytest.fixture
+def group(monkeypatch):
+    monkeypatch.setattr(singleflight, 'client', FakeClient())
+    return singleflight.Group()
+
+
+"""
+Helper function to run group.do() on a thread with a function that blocks until 'release' is set.
+"""
+def start_blocked(group, flight_key, release, result):
+    out = {}
+
+    def fn():
+        release.wait(5)
+        return result
+
+    thread = threading.Thread(target=lambda: out.setdefault('result', group.do(flight_key, fn)))
+    thread.start()
+    return thread, out
+
+
+def test_do_returns_result(group):
+    assert group.do('a', lambda: {'x': 1}) == {'x': 1}
+    assert group.stats['calls'] == 1
+
+
+def test_do_shares_a_call_in_flight(group, monkeypatch):
+    monkeypatch.setattr(singleflight.consistency, 'request_started', lambda: 0)
+    release = threading.Event()
+    thread, out = start_blocked(group, 'a', release, {'x': 1})
+    while not group._calls:
+        time.sleep(0.001)
+
+    calls = []
+    follower = threading.Thread(target=lambda: calls.append(group.do('a', lambda: calls.append('ran'))))
+    follower.start()
+    while not any(call.waiters for call in group._calls.values()):
+        time.sleep(0.001)
+    release.set()
+    thread.join()
+    follower.join()
+    assert out['result'] == {'x': 1}
+    assert calls == [{'x': 1}]
+    assert group.stats['shared'] == 1
+
+
+def test_shared_results_are_copies(group, monkeypatch):
+    monkeypatch.setattr(singleflight.consistency, 'request_started', lambda: 0)
+    release = threading.Event()
+    thread, out = start_blocked(group, 'a', release, {'x': [1]})
+    while not group._calls:
+        time.sleep(0.001)
+    shared = []
+    follower = threading.Thread(target=lambda: shared.append(group.do('a', lambda: None)))
+    follower.start()
+    while not any(call.waiters for call in group._calls.values()):
+        time.sleep(0.001)
+    release.set()
+    thread.join()
+    follower.join()
+    shared[0]['x'].append(2)
+    assert out['result'] == {'x': [1]}
+
+
+def test_calls_started_before_the_request_are_not_shared(group, monkeypatch):
+    release = threading.Event()
+    thread, out = start_blocked(group, 'a', release, 'old')
+    while not group._calls:
+        time.sleep(0.001)
+
+    # A request that starts after the call in flight makes its own read
+    monkeypatch.setattr(singleflight.consistency, 'request_started', lambda: time.monotonic())
+    assert group.do('a', lambda: 'new') == 'new'
+    assert group.stats['shared'] == 0
+    release.set()
+    thread.join()
+    assert out['result'] == 'old'
+    assert not group._calls
+
+
+def test_errors_are_raised_and_the_call_is_removed(group):
+    def fail():
+        raise ValueError("failed")
+
+    with pytest.raises(ValueError):
+        group.do('a', fail)
+    assert not group._calls
+    assert group.do('a', lambda: 'ok') == 'ok'
+
+
+def test_reads_in_a_transaction_are_not_shared(group):
+    singleflight.client.current_transaction = object()
+    try:
+        group.do('a', lambda: 'ok')
+        assert group.stats['calls'] == 0
+    finally:
+        singleflight.client.current_transaction = None
@@ -0,0 +1,78 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import gzip
+from datetime import datetime, timezone
+import constants
+import relations
+import snapshot
+from db import new_entity
+from fake_datastore import FakeClient
+
+
+"""
+Helper function to save a user renting bike 1, which carries component 5, with the fake Datastore client.
+"""
+def save_garage(datastore):
+    user = new_entity(datastore.key(constants.USERS, 7))
+    user.update({'nickname': "alice", 'email': "alice@example.com", 'verified': True, 'renter_id': "alice"})
+    bike = new_entity(datastore.key(constants.BIKES, 1))
+    bike.update({'manufacturer': "Trek", 'type': "road", 'model_year': 2020, 'bike_size': "M", 'rentee': 7,
+                 'rentee_sub': "alice"})
+    component = new_entity(datastore.key(constants.COMPONENTS, 5))
+    component.exclude_from_indexes.add('description')
+    component.update({'manufacturer': "Shimano", 'description': "Brake", 'condition': "new",
+                      'carrier': {'id': 1, 'manufacturer': "Trek"}})
+    event = new_entity(datastore.key(constants.RENTAL_EVENTS, 9))
+    event.update({'action': 'rent', 'bike_id': 1, 'at': datetime(2023, 5, 30, 12, tzinfo=timezone.utc)})
+    datastore.put_multi([user, bike, component, event, relations.new_spec(1, 5, "Brake", added=1.0),
+                         relations.new_rental(7, 1, added=2.0)])
+
+
+"""
+Helper function to replace the fake Datastore client with an empty one to import into.
+"""
+def import_into(monkeypatch):
+    import db
+    target = FakeClient()
+    monkeypatch.setattr(db, '_client', target)
+    return target
+
+
+def test_snapshot_restores_every_entity(datastore, monkeypatch):
+    save_garage(datastore)
+    for user_id in (8, 9):
+        user = new_entity(datastore.key(constants.USERS, user_id))
+        user.update({'nickname': "bob", 'email': "bob@example.com", 'verified': False, 'renter_id': "bob"})
+        datastore.put(user)
+    monkeypatch.setattr(constants, 'SNAPSHOT_PAGE_SIZE', 2)
+    lines = list(snapshot.export())
+    assert len(lines) == 8
+
+    target = import_into(monkeypatch)
+    counts = snapshot.load(lines)
+    assert counts[constants.BIKES] == 1 and counts[constants.SPECS] == 1
+    for key, entity in datastore.store.items():
+        assert dict(target.store[key]) == dict(entity)
+    assert target.get(datastore.key(constants.COMPONENTS, 5)).exclude_from_indexes == {'description'}
+    assert set(target.reserved) >= set(datastore.store)
+    assert target.count(constants.INVENTORIES) == 3
+
+
+def test_compressed_snapshot_is_gzip(datastore):
+    save_garage(datastore)
+    lines = list(snapshot.export())
+    assert gzip.decompress(b"".join(snapshot.compress(lines))).decode('utf-8') == "".join(lines)
+
+
+def test_snapshot_with_embedded_specs_is_migrated(datastore, monkeypatch):
+    target = import_into(monkeypatch)
+    line = ('{"key": ["bikes", 1], "exclude": [], "properties": {"manufacturer": "Trek", "type": "road", '
+            '"model_year": 2020, "bike_size": "M", "specs": [{"id": 5, "description": "Brake"}], '
+            '"rentee": null}}\n')
+    snapshot.load([line, "\n"])
+    assert 'specs' not in target.get(target.key(constants.BIKES, 1))
+    assert [i.id for i in relations.get_specs([1])[1]] == [5]
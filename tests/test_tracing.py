@@ -0,0 +1,60 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import pytest
+import constants
+import tracing
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    exporter = tracing.MemoryExporter()
+    monkeypatch.setattr(tracing, 'exporter', exporter)
+    return exporter
+
+
+def test_request_continues_the_callers_trace(client, exporter):
+    res = client.get('/components/5', headers={'traceparent': "00-%s-%s-01" % (TRACE_ID, PARENT_ID),
+                                               'Accept': "application/json"})
+    assert res.headers['traceparent'].startswith("00-" + TRACE_ID + "-")
+    assert res.headers['traceparent'].endswith("-01")
+    [trace] = exporter.traces
+    [root] = [s for s in trace['resourceSpans'][0]['scopeSpans'][0]['spans'] if s['kind'] == tracing.SERVER]
+    assert root['traceId'] == TRACE_ID
+    assert root['parentSpanId'] == PARENT_ID
+    assert root['name'] == "GET /components/<component_id>"
+    assert {'key': 'http.status_code', 'value': {'intValue': '404'}} in root['attributes']
+
+
+def test_unsampled_request_is_not_exported(client, exporter, monkeypatch):
+    monkeypatch.setattr(constants, 'TRACE_SAMPLE_RATE', 0)
+    res = client.get('/components/5', headers={'Accept': "application/json"})
+    assert res.headers['traceparent'].endswith("-00")
+    assert exporter.traces == []
+
+
+def test_spans_are_nested_in_the_running_span():
+    trace = tracing.Trace(TRACE_ID, True)
+    with tracing.Span(trace, "request", None, tracing.SERVER):
+        with tracing.span('datastore.lookup', tracing.CLIENT, keys=2):
+            assert tracing.headers()['traceparent'].startswith("00-" + TRACE_ID)
+        with pytest.raises(RuntimeError):
+            with tracing.span('render'):
+                raise RuntimeError("failed")
+    tree = tracing.to_tree(trace)
+    assert tree['name'] == "request"
+    assert [c['name'] for c in tree['children']] == ['datastore.lookup', 'render']
+    assert tree['children'][0]['attributes'] == {'keys': 2}
+    assert 'error' in tree['children'][1]
+
+
+def test_nothing_is_recorded_outside_a_trace():
+    with tracing.span('datastore.lookup') as recorded:
+        assert recorded is None
+    assert tracing.headers() == {}
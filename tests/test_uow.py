@@ -0,0 +1,137 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import pytest
+from flask import Flask, abort
+from werkzeug.test import Client
+import constants
+import uow
+from db import new_entity
+from validate import create_response
+
+
+"""
+Helper function to create a bike entity with the fake client.
+"""
+def bike_entity(datastore, bike_id, **properties):
+    entity = new_entity(datastore.key(constants.BIKES, bike_id))
+    entity.update(dict({'manufacturer': "Trek"}, **properties))
+    return entity
+
+
+"""
+Application whose route saves two bikes through the unit of work and answers with the status in its URL.
+The 'flushed' list of the application records the requests whose changes were written.
+"""
+@pytest.fixture
+def uow_app(datastore):
+    app = Flask(__name__)
+    app.flushed = []
+    uow.init_app(app)
+
+    @app.route('/save/<int:status>')
+    def save(status):
+        uow.put(bike_entity(datastore, 1))
+        uow.put(bike_entity(datastore, 2))
+        uow.after_flush(lambda: app.flushed.append(status))
+        if status >= 500:
+            abort(status)
+        return create_response({}, status)
+    return app
+
+
+@pytest.fixture
+def transactions(datastore, monkeypatch):
+    transactions = []
+    transaction = datastore.transaction
+    monkeypatch.setattr(datastore, 'transaction', lambda: transactions.append(True) or transaction())
+    return transactions
+
+
+@pytest.fixture
+def commits(datastore, monkeypatch):
+    commits = []
+    commit = datastore.commit
+
+    def recording(puts, deletes):
+        commits.append((puts, deletes))
+        commit(puts, deletes)
+    monkeypatch.setattr(datastore, 'commit', recording)
+    return commits
+
+
+def test_successful_request_writes_its_changes_in_one_commit(uow_app, datastore, commits, transactions):
+    res = Client(uow_app, uow_app.response_class).get('/save/201')
+    assert res.status_code == 201
+    assert len(commits) == len(transactions) == 1
+    assert datastore.count(constants.BIKES) == 2
+    assert uow_app.flushed == [201]
+
+
+@pytest.mark.parametrize('status', [400, 500])
+def test_error_response_drops_the_changes(uow_app, datastore, commits, status):
+    res = Client(uow_app, uow_app.response_class).get('/save/%d' % status)
+    assert res.status_code == status
+    assert commits == []
+    assert uow_app.flushed == []
+
+
+def test_failed_commit_replaces_the_response_with_an_error(uow_app, datastore, monkeypatch):
+    def failing(puts, deletes):
+        raise RuntimeError("commit failed")
+    monkeypatch.setattr(datastore, 'commit', failing)
+    res = Client(uow_app, uow_app.response_class).get('/save/200')
+    assert res.status_code == 500
+    assert res.get_json()['code'] == "Internal Server Error"
+    assert uow_app.flushed == []
+
+
+def test_entity_read_twice_costs_one_rpc(app, datastore, monkeypatch):
+    datastore.put(bike_entity(datastore, 1))
+    calls = []
+    get_multi = datastore.get_multi
+    monkeypatch.setattr(datastore, 'get_multi', lambda keys, **kwargs: calls.append(keys) or get_multi(keys))
+    with app.test_request_context('/'):
+        key = datastore.key(constants.BIKES, 1)
+        uow.prefetch([key, datastore.key(constants.BIKES, 2)])
+        assert uow.get(key)['manufacturer'] == "Trek"
+        assert uow.get(datastore.key(constants.BIKES, 2)) is None
+        assert uow.get(key) is uow.get(key)
+    assert len(calls) == 1
+
+
+def test_last_change_to_an_entity_wins(app, datastore):
+    datastore.put(bike_entity(datastore, 1))
+    with app.test_request_context('/'):
+        uow.delete(datastore.key(constants.BIKES, 1))
+        uow.put(bike_entity(datastore, 1, manufacturer="Giant"))
+        uow.put(bike_entity(datastore, 2))
+        uow.delete(datastore.key(constants.BIKES, 2))
+        uow.flush()
+    assert [e['manufacturer'] for e in datastore.entities(constants.BIKES)] == ["Giant"]
+
+
+def test_changes_to_too_many_entity_groups_are_written_outside_a_transaction(app, datastore, transactions):
+    with app.test_request_context('/'):
+        for bike_id in range(1, constants.TRANSACTION_MAX_GROUPS + 2):
+            uow.put(bike_entity(datastore, bike_id))
+        uow.flush()
+    assert datastore.count(constants.BIKES) == constants.TRANSACTION_MAX_GROUPS + 1
+    assert transactions == []
+
+
+def test_failed_callback_does_not_fail_the_flush(app, datastore):
+    flushed = []
+
+    def failing():
+        raise RuntimeError("callback failed")
+    with app.test_request_context('/'):
+        uow.put(bike_entity(datastore, 1))
+        uow.after_flush(failing)
+        uow.after_flush(lambda: flushed.append(True))
+        uow.flush()
+    assert datastore.count(constants.BIKES) == 1
+    assert flushed == [True]
@@ -0,0 +1,93 @@
+# Author    : Clinton Lohr
+# Date      : 05/30/2023
+# Course    : CS 493 - Cloud Application Development
+# Assignment: Portfolio - Final Project
+
+
+import time
+import constants
+import relations
+import reservations
+from db import new_entity
+
+AUTH = {'Authorization': "Bearer alice"}
+
+
+"""
+Helper functions to save a user and a bike with the fake Datastore client.
+"""
+def save_user(datastore, user_id=7, sub="alice"):
+    user = new_entity(datastore.key(constants.USERS, user_id))
+    user.update({'nickname': sub, 'email': sub + "@example.com", 'verified': True, 'renter_id': sub})
+    datastore.put(user)
+    return user
+
+
+def save_bike(datastore, bike_id=1, rentee=None):
+    bike = new_entity(datastore.key(constants.BIKES, bike_id))
+    bike.update({'manufacturer': "Trek", 'type': "road", 'model_year': 2020, 'bike_size': "M", 'rentee': rentee})
+    datastore.put(bike)
+    return bike
+
+
+"""
+Helper function to delete the bike as soon as the request's transaction starts, as if another request
+deleted it after the bike was first read.
+"""
+def delete_bike_in_transaction(datastore, monkeypatch):
+    transaction = datastore.transaction
+
+    def deleting():
+        datastore.store.pop(datastore.key(constants.BIKES, 1), None)
+        return transaction()
+    monkeypatch.setattr(datastore, 'transaction', deleting)
+
+
+def test_rent_and_return(client, datastore):
+    save_user(datastore)
+    save_bike(datastore)
+    assert client.put('/users/7/bikes/1', headers=AUTH).status_code == 204
+    assert datastore.get(datastore.key(constants.BIKES, 1))['rentee'] == 7
+    assert client.delete('/users/7/bikes/1', headers=AUTH).status_code == 204
+    assert datastore.get(datastore.key(constants.BIKES, 1))['rentee'] is None
+    assert datastore.count(constants.RENTALS) == 0
+
+
+def test_rent_of_a_bike_deleted_meanwhile_is_not_found(client, datastore, monkeypatch):
+    save_user(datastore)
+    save_bike(datastore)
+    delete_bike_in_transaction(datastore, monkeypatch)
+    assert client.put('/users/7/bikes/1', headers=AUTH).status_code == 404
+    assert datastore.count(constants.RENTALS) == 0
+
+
+def test_return_of_a_bike_deleted_meanwhile_is_not_found(client, datastore, monkeypatch):
+    save_user(datastore)
+    save_bike(datastore, rentee=7)
+    datastore.put(relations.new_rental(7, 1))
+    delete_bike_in_transaction(datastore, monkeypatch)
+    assert client.delete('/users/7/bikes/1', headers=AUTH).status_code == 404
+
+
+"""
+Helper function to save a reservation of bike 1 by the user with 'sub', starting 'start' seconds from now.
+"""
+def save_reservation(datastore, sub, start):
+    now = time.time()
+    bike = datastore.get(datastore.key(constants.BIKES, 1))
+    datastore.put(reservations.new_reservation(bike, sub, now + start, now + start + 3600))
+
+
+def test_bike_reserved_later_by_another_user_cannot_be_rented(client, datastore):
+    save_user(datastore)
+    save_bike(datastore)
+    save_reservation(datastore, "bob", 7 * 86400)
+    assert client.put('/users/7/bikes/1', headers=AUTH).status_code == 403
+    assert datastore.get(datastore.key(constants.BIKES, 1))['rentee'] is None
+
+
+def test_bike_reserved_by_the_renter_can_be_rented(client, datastore):
+    save_user(datastore)
+    save_bike(datastore)
+    save_reservation(datastore, "alice", 7 * 86400)
+    assert client.put('/users/7/bikes/1', headers=AUTH).status_code == 204